@@ -0,0 +1,110 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+# ==============================
+# CONFIG
+# ==============================
+
+MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH", "64"))
+MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_WAIT_MS", "5"))
+
+
+def build_input_matrix(rows, n_features):
+    """
+    Ghép nhiều tập chỉ số triệu chứng thành 1 ma trận CSR (n_rows x n_features).
+    Chỉ số trùng trong cùng 1 dòng chỉ được tính 1 lần.
+    """
+    rows = [sorted(set(r)) for r in rows]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(r) for r in rows])
+    indices = np.fromiter((i for r in rows for i in r), dtype=np.int32, count=int(indptr[-1]))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), n_features))
+
+
+class BatchInferenceEngine:
+    """
+    Micro-batching cho predict_proba: các request đồng thời trong vài ms được
+    gom thành 1 ma trận CSR, gọi model 1 lần rồi trả kết quả về từng request.
+    """
+
+    def __init__(self, get_model, n_features, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        # get_model() trả về model đã load (qua model registry) → import module không cần load model
+        self.get_model = get_model
+        self.n_features = n_features
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # 1 thread duy nhất gọi model → predict_proba không bao giờ chạy trên event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict-batch")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    # ---------- sync path ----------
+    def predict_proba_sync(self, rows):
+        return self.get_model().predict_proba(build_input_matrix(rows, self.n_features))
+
+    # ---------- async path ----------
+    async def predict_proba(self, row):
+        """Xác suất cho 1 tập chỉ số triệu chứng, được gom batch với các request khác."""
+        self._ensure_worker()
+        fut = self._loop.create_future()
+        await self._queue.put((row, fut))
+        return await fut
+
+    async def predict_proba_many(self, rows):
+        """Nhiều dòng của cùng 1 request: đã đủ 1 ma trận → gọi model 1 lần, không qua hàng đợi micro-batch."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.predict_proba_sync, list(rows))
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Lấy nốt các request đã nằm sẵn trong queue mà không chờ thêm
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Bỏ qua request mà client đã huỷ
+            batch = [(row, fut) for row, fut in batch if not fut.done()]
+            if not batch:
+                continue
+
+            try:
+                probs = await self._loop.run_in_executor(
+                    self._executor, self.predict_proba_sync, [row for row, _ in batch]
+                )
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), p in zip(batch, probs):
+                if not fut.done():
+                    fut.set_result(p)
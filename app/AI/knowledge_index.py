@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+
+DEFAULT_SPECIALIST = "Khoa Nội tổng hợp"
+DEFAULT_DESCRIPTION = "Hiện chưa có mô tả cho bệnh này."
+
+
+# ==============================
+# DISEASE INFO (theo label index)
+# ==============================
+
+@dataclass(frozen=True)
+class DiseaseInfo:
+    name: str
+    specialist: str
+    description: str
+    symptoms: tuple
+    symptom_set: frozenset
+
+
+def build_disease_index(classes, knowledge_base, specialist_map, descriptions):
+    """
+    Bảng tra cứu bất biến, phần tử thứ i ứng với label i của LabelEncoder.
+    Dựng 1 lần lúc khởi động → mỗi dự đoán chỉ còn tra tuple O(1), không đụng pandas.
+    """
+    index = []
+    for name in classes:
+        name = str(name)
+        symptoms = tuple(knowledge_base.get(name, []))
+        index.append(DiseaseInfo(
+            name=name,
+            specialist=specialist_map.get(name, DEFAULT_SPECIALIST),
+            description=descriptions.get(name.strip(), DEFAULT_DESCRIPTION),
+            symptoms=symptoms,
+            symptom_set=frozenset(symptoms),
+        ))
+    return tuple(index)
+
+
+# ==============================
+# INVERTED INDEX (bitset)
+# ==============================
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class SymptomIndex:
+    """
+    Chỉ mục ngược dựng lúc load, dùng Python int làm bitset:
+      - symptom → bitset các bệnh có triệu chứng đó
+      - bệnh    → bitset các triệu chứng của bệnh
+    Truy vấn subset / giao chỉ còn vài phép AND/OR.
+    """
+
+    def __init__(self, knowledge_base):
+        self.diseases = list(knowledge_base)
+        self.symptoms = sorted({s for syms in knowledge_base.values() for s in syms})
+        self.symptom_pos = {s: i for i, s in enumerate(self.symptoms)}
+
+        self.all_diseases = (1 << len(self.diseases)) - 1
+        self.diseases_by_symptom = {s: 0 for s in self.symptoms}
+        self.symptoms_by_disease = []
+
+        for d_pos, syms in enumerate(knowledge_base.values()):
+            mask = 0
+            for s in syms:
+                mask |= 1 << self.symptom_pos[s]
+                self.diseases_by_symptom[s] |= 1 << d_pos
+            self.symptoms_by_disease.append(mask)
+
+    def diseases_with_any(self, symptoms):
+        mask = 0
+        for s in symptoms:
+            mask |= self.diseases_by_symptom.get(s, 0)
+        return mask
+
+    def diseases_with_all(self, symptoms):
+        mask = self.all_diseases
+        for s in symptoms:
+            mask &= self.diseases_by_symptom.get(s, 0)
+            if not mask:
+                break
+        return mask
+
+    def rank_co_occurring(self, disease_mask, exclude=()):
+        """
+        Các triệu chứng xuất hiện trong nhóm bệnh `disease_mask`, sắp theo số bệnh
+        chứa triệu chứng đó (giảm dần), hoà thì theo tên.
+        """
+        candidates = 0
+        for d_pos in iter_bits(disease_mask):
+            candidates |= self.symptoms_by_disease[d_pos]
+
+        for s in exclude:
+            pos = self.symptom_pos.get(s)
+            if pos is not None:
+                candidates &= ~(1 << pos)
+
+        scored = []
+        for pos in iter_bits(candidates):
+            s = self.symptoms[pos]
+            scored.append((-(self.diseases_by_symptom[s] & disease_mask).bit_count(), s))
+        scored.sort()
+        return [s for _, s in scored]
@@ -0,0 +1,135 @@
+import os
+import pickle
+import threading
+import time
+
+from app.services.metrics import metrics
+
+# ==============================
+# PATH
+# ==============================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODEL_PATH = os.path.join(BASE_DIR, "disease_model.pkl")
+LE_PATH = os.path.join(BASE_DIR, "label_encoder.pkl")
+VECTOR_DB_PATH = os.path.join(BASE_DIR, "vector_db")
+
+EMBED_MODEL_NAME = "BAAI/bge-small-en"
+RAG_COLLECTION = "medical_rag"
+
+
+class ModelRegistry:
+    """
+    Nơi giữ các model nặng của process (RandomForest, LabelEncoder, embedding model,
+    Chroma collection). Mỗi model load đúng 1 lần, an toàn đa luồng; có thể warm-up
+    lúc startup (đồng bộ hoặc ở thread nền) thay vì để request đầu tiên chịu trễ.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warmers = {}
+        self._models = {}
+        self._locks = {}
+        self._ready = threading.Event()
+        self._warmup_thread = None
+        self.warmup_error = None
+
+    def register(self, name, loader, warm=None):
+        """warm(model) (tuỳ chọn) chạy 1 lần sau khi load, vd. 1 lần inference giả."""
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        if warm is not None:
+            self._warmers[name] = warm
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            if name not in self._models:
+                started = time.perf_counter()
+                model = self._loaders[name]()
+                warm = self._warmers.get(name)
+                if warm is not None:
+                    warm(model)
+                self._models[name] = model
+                metrics.observe("model_load_seconds", time.perf_counter() - started, model=name)
+                print(f"✅ Model '{name}' loaded in {time.perf_counter() - started:.2f}s")
+        return self._models[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    # ---------- warm-up ----------
+    def warm_up(self, names=None):
+        try:
+            for name in names if names is not None else list(self._loaders):
+                self.get(name)
+        except Exception as e:
+            self.warmup_error = repr(e)
+            print(f"❌ Warm-up lỗi: {e}")
+            raise
+        self._ready.set()
+
+    def start_background_warm_up(self, names=None, before=None):
+        """before() (tuỳ chọn) chạy trong cùng thread trước khi load model."""
+        def run():
+            try:
+                if before is not None:
+                    before()
+                self.warm_up(names)
+            except Exception as e:
+                self.warmup_error = self.warmup_error or repr(e)
+
+        self._warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def mark_ready(self):
+        self._ready.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "error": self.warmup_error,
+            "models": {name: self.is_loaded(name) for name in self._loaders},
+        }
+
+
+registry = ModelRegistry()
+
+
+# ==============================
+# LOADERS (import thư viện nặng bên trong loader)
+# ==============================
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _load_embed_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+
+def _load_rag_collection():
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+    return chroma_client.get_collection(RAG_COLLECTION)
+
+
+def _warm_disease_model(model):
+    import numpy as np
+    model.predict_proba(np.zeros((1, model.n_features_in_), dtype=np.float32))
+
+
+registry.register("label_encoder", lambda: _load_pickle(LE_PATH))
+registry.register("disease_model", lambda: _load_pickle(MODEL_PATH), warm=_warm_disease_model)
+registry.register("embed_model", _load_embed_model, warm=lambda m: m.encode(["warm-up"]))
+registry.register("rag_collection", _load_rag_collection)
@@ -3,9 +3,14 @@ from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import numpy as np
 import json
-import pickle
 import os
 import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+from app.AI.inference_engine import BatchInferenceEngine
+from app.AI.model_registry import registry
+from app.responses import FastJSONResponse
+from app.AI.knowledge_index import build_disease_index, SymptomIndex
 
 router = APIRouter(prefix="/api/predict-disease", tags=["Predict Disease"])
 
@@ -15,8 +20,6 @@ router = APIRouter(prefix="/api/predict-disease", tags=["Predict Disease"])
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-MODEL_PATH = os.path.join(BASE_DIR, "disease_model.pkl")
-LE_PATH = os.path.join(BASE_DIR, "label_encoder.pkl")
 SYMPTOM_PATH = os.path.join(BASE_DIR, "symptom_list.json")
 DISEASE_MAP_PATH = os.path.join(BASE_DIR, "disease_symptom_map.json")
 
@@ -26,11 +29,8 @@ DATA_DESC = os.path.join(BASE_DIR, "disease_descriptionsAI.csv")
 # LOAD FILES
 # ==============================
 
-with open(MODEL_PATH, "rb") as f:
-    model = pickle.load(f)
-
-with open(LE_PATH, "rb") as f:
-    le = pickle.load(f)
+# RandomForest được load qua model registry (warm-up lúc startup hoặc lần dùng đầu)
+le = registry.get("label_encoder")
 
 with open(SYMPTOM_PATH, "r", encoding="utf-8") as f:
     all_symptoms_list = json.load(f)
@@ -44,6 +44,10 @@ desc_df['Disease'] = desc_df['Disease'].str.strip()
 
 symptom_to_index = {s: i for i, s in enumerate(all_symptoms_list)}
 
+inference_engine = BatchInferenceEngine(lambda: registry.get("disease_model"), len(all_symptoms_list))
+
+MAX_BATCH_ITEMS = int(os.getenv("PREDICT_MAX_BATCH_ITEMS", "256"))
+
 # ====== Specialist map (tiếng Việt) ======
 specialist_map = {
     'Tiểu đường': 'Khoa Nội tiết', 
@@ -88,81 +92,79 @@ specialist_map = {
     'Lao': 'Khoa Hô hấp'
 }
 
+# ====== Bảng tra cứu dựng sẵn lúc khởi động ======
+disease_descriptions = (
+    desc_df.dropna(subset=['Description'])
+    .drop_duplicates(subset='Disease')
+    .set_index('Disease')['Description']
+    .to_dict()
+)
 
-# ==============================
-# UTILS
-# ==============================
-
-def get_disease_info(disease_name):
-    spec = specialist_map.get(disease_name, "Khoa Nội tổng hợp")
-
-    try:
-        desc_rows = desc_df[desc_df['Disease'].str.strip() == disease_name.strip()]
-        if not desc_rows.empty:
-            desc = desc_rows.iloc[0]['Description']
-        else:
-            desc = "Hiện chưa có mô tả cho bệnh này."
-    except:
-        desc = "Lỗi mô tả."
-
-    return spec, desc
+# disease_index[label] → DiseaseInfo (tên, chuyên khoa, mô tả, triệu chứng)
+disease_index = build_disease_index(le.classes_, disease_knowledge_base, specialist_map, disease_descriptions)
 
+# symptom ↔ disease dạng bitset cho gợi ý triệu chứng
+symptom_index = SymptomIndex(disease_knowledge_base)
 
 
+# ==============================
+# UTILS
+# ==============================
 
 def get_related_symptoms_from_map(selected_symptoms, top_n=7):
-    related = []
-
-    for symptoms in disease_knowledge_base.values():
-        if any(sym in symptoms for sym in selected_symptoms):
-            related += symptoms
-
-    related = list(set(related) - set(selected_symptoms))
-    return related[:top_n]
+    # Bệnh có ít nhất 1 triệu chứng đã chọn → gợi ý theo tần suất đồng xuất hiện
+    diseases = symptom_index.diseases_with_any(selected_symptoms)
+    return symptom_index.rank_co_occurring(diseases, exclude=selected_symptoms)[:top_n]
 
 
 # ==============================
 # CORE AI ENGINE
 # ==============================
 
-def hybrid_prediction_engine(selected_symptoms):
+def encode_symptoms(selected_symptoms):
+    return [symptom_to_index[s] for s in selected_symptoms if s in symptom_to_index]
 
-    input_vec = np.zeros((1, len(all_symptoms_list)), dtype=int)
 
-    for s in selected_symptoms:
-        if s in symptom_to_index:
-            input_vec[0, symptom_to_index[s]] = 1
+def rank_predictions(probs, selected_symptoms):
 
-    probs = model.predict_proba(input_vec)[0]
     top_indices = np.argsort(probs)[::-1][:3]
 
     final_results = []
 
+    selected = set(selected_symptoms)
+
     for idx in top_indices:
-        disease = le.inverse_transform([idx])[0]
+        info = disease_index[idx]
         confidence = float(probs[idx] * 100)
 
-        true_symptoms = set(disease_knowledge_base.get(disease, []))
-
         # ✅ HALLUCINATION FILTER
-        #if not set(selected_symptoms).issubset(true_symptoms):
+        #if not selected.issubset(info.symptom_set):
             #continue
 
-        missing = list(true_symptoms - set(selected_symptoms))
-
-        spec, desc = get_disease_info(disease)
+        missing = [s for s in info.symptoms if s not in selected]
 
         final_results.append({
-            "Disease": disease,
+            "Disease": info.name,
             "Confidence": round(confidence, 2),
-            "Specialist": spec,
-            "Description": desc,
+            "Specialist": info.specialist,
+            "Description": info.description,
             "Missing": missing[:7]
         })
 
     return final_results
 
 
+def build_prediction(probs, selected_symptoms):
+    return {
+        "results": rank_predictions(probs, selected_symptoms),
+        "related": get_related_symptoms_from_map(selected_symptoms)
+    }
+
+
+def build_predictions(all_probs, symptom_sets):
+    return [build_prediction(probs, symptoms) for symptoms, probs in zip(symptom_sets, all_probs)]
+
+
 # ==============================
 # REQUEST MODEL
 # ==============================
@@ -171,6 +173,10 @@ class SymptomsRequest(BaseModel):
     symptoms: list[str]
 
 
+class BatchSymptomsRequest(BaseModel):
+    symptom_sets: list[list[str]]
+
+
 # ==============================
 # ROUTES (KHỚP FE)
 # ==============================
@@ -180,35 +186,47 @@ def root():
     return {"status": "Disease AI running"}
 
 @router.post("/predict")
-def predict_disease(data: SymptomsRequest):
+async def predict_disease(data: SymptomsRequest):
 
     if not data.symptoms:
         raise HTTPException(status_code=400, detail="No symptoms provided")
 
     user_symptoms = [s.strip() for s in data.symptoms]
 
-    results = hybrid_prediction_engine(user_symptoms)
+    # Gom batch với các request đồng thời khác → 1 lần predict_proba
+    probs = await inference_engine.predict_proba(encode_symptoms(user_symptoms))
 
-    return {
-        "results": results,
-        "related": get_related_symptoms_from_map(user_symptoms)
-    }
+    # Xếp hạng + gợi ý triệu chứng là việc CPU → threadpool, không chặn event loop
+    return await run_in_threadpool(build_prediction, probs, user_symptoms)
+
+
+@router.post("/predict/batch")
+async def predict_disease_batch(data: BatchSymptomsRequest):
+
+    if not data.symptom_sets or any(not symptoms for symptoms in data.symptom_sets):
+        raise HTTPException(status_code=400, detail="No symptoms provided")
+
+    if len(data.symptom_sets) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many symptom sets (max {MAX_BATCH_ITEMS})")
+
+    symptom_sets = [[s.strip() for s in symptoms] for symptoms in data.symptom_sets]
+
+    # Cả lô đã là 1 ma trận CSR → 1 lần predict_proba
+    all_probs = await inference_engine.predict_proba_many(
+        [encode_symptoms(symptoms) for symptoms in symptom_sets]
+    )
+
+    return {"results": await run_in_threadpool(build_predictions, all_probs, symptom_sets)}
 
 
 @router.post("/related")
 def get_related(data: dict):
     input_symptoms = set([s.strip().lower() for s in data["symptoms"]])
 
-    possible_diseases = [
-        d for d, s in disease_knowledge_base.items()
-        if input_symptoms.issubset(set(s))
-    ]
-
-    valid_next_symptoms = set()
-    for d in possible_diseases:
-        valid_next_symptoms.update(disease_knowledge_base[d])
+    # Bệnh chứa TẤT CẢ triệu chứng đã nhập
+    possible_diseases = symptom_index.diseases_with_all(input_symptoms)
 
-    suggestions = sorted(list(valid_next_symptoms - input_symptoms))
+    suggestions = symptom_index.rank_co_occurring(possible_diseases, exclude=input_symptoms)
 
     return {
         "count": len(suggestions),
@@ -218,6 +236,7 @@ def get_related(data: dict):
 
 @router.get("/all")
 def get_all_symptoms():
-    return {
+    # ~550 triệu chứng: trả thẳng response orjson, bỏ qua jsonable_encoder
+    return FastJSONResponse({
         "related": sorted(all_symptoms_list)
-    }
+    })
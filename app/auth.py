@@ -2,12 +2,15 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event, inspect as sa_inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
-from .database import get_db
+from .database import get_db, get_async_db
+from .services.principal_cache import Principal, principal_cache
+from .services.password_hasher import pwd_context
 
 SECRET_KEY = os.getenv("SESSION_SECRET")
 if not SECRET_KEY:
@@ -17,7 +20,6 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 MAX_BCRYPT_LENGTH = 72
 
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password, hashed_password):
@@ -36,26 +38,127 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token_subject(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
+        raise _credentials_exception()
+    return username
+
+def load_current_user(token: str, db: Session, *options):
+    """User của token, kèm `options` load (joinedload...) trong cùng 1 câu SELECT."""
+    username = decode_token_subject(token)
+
+    user = db.query(models.User).options(*options).filter(models.User.username == username).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return load_current_user(token, db)
+
 def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     if current_user.is_active is False:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+# ----------------------------
+# Principal (async, có cache) cho các router dùng AsyncSession
+# ----------------------------
+async def resolve_principal(username: str, db: AsyncSession):
+    """Principal từ cache; cache miss → 1 query duy nhất (user + patient_id + doctor_id)."""
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return principal
+
+    row = (await db.execute(
+        select(
+            models.User.id,
+            models.User.username,
+            models.User.role,
+            models.User.is_active,
+            models.Patient.id.label("patient_id"),
+            models.Doctor.id.label("doctor_id"),
+        )
+        .outerjoin(models.Patient, models.Patient.user_id == models.User.id)
+        .outerjoin(models.Doctor, models.Doctor.user_id == models.User.id)
+        .where(models.User.username == username)
+    )).first()
+    if row is None:
+        return None
+
+    principal = Principal(
+        id=row.id,
+        username=row.username,
+        role=row.role,
+        is_active=row.is_active is not False,
+        patient_id=row.patient_id,
+        doctor_id=row.doctor_id,
+    )
+    principal_cache.put(principal)
+    return principal
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    username = decode_token_subject(token)
+
+    principal = await resolve_principal(username, db)
+    if principal is None:
+        raise _credentials_exception()
+    return principal
+
+async def get_current_active_principal(current_user: Principal = Depends(get_current_principal)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+# Đổi role / khoá tài khoản ở bất kỳ đâu → xoá principal khỏi cache.
+# Ghi tạm vào session.info lúc flush, chỉ xoá khi commit xong: xoá trước commit thì request
+# khác có thể đọc lại dòng cũ (chưa commit) và đưa vào cache thêm trọn 1 TTL.
+_EVICT_KEY = "principal_cache_evictions"
+
+
+def _stage_eviction(target, key):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_EVICT_KEY, set()).add(key)
+
+
+@event.listens_for(models.User, "after_update")
+def _invalidate_principal_on_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.is_active.history.has_changes():
+        _stage_eviction(target, ("username", target.username))
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal_on_delete(mapper, connection, target):
+    _stage_eviction(target, ("username", target.username))
+
+# Tạo / xoá hồ sơ Doctor, Patient → patient_id / doctor_id trong principal đổi theo
+for _profile_model in (models.Doctor, models.Patient):
+    for _event_name in ("after_insert", "after_delete"):
+        @event.listens_for(_profile_model, _event_name)
+        def _invalidate_principal_on_profile_change(mapper, connection, target):
+            if target.user_id is not None:
+                _stage_eviction(target, ("user_id", target.user_id))
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_principals(session):
+    for kind, value in session.info.pop(_EVICT_KEY, ()):
+        if kind == "username":
+            principal_cache.invalidate(value)
+        else:
+            principal_cache.invalidate_user(value)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_evictions(session):
+    session.info.pop(_EVICT_KEY, None)
@@ -1,22 +1,103 @@
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.services.metrics import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
 
+# ----------------------------
+# Pool config
+# ----------------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+
+# ----------------------------
+# Pool có đo thời gian chờ checkout
+# ----------------------------
+def _timed_checkout(pool, do_get):
+    started = time.perf_counter()
+    try:
+        return do_get()
+    except PoolTimeoutError:
+        metrics.inc("db_pool_timeouts_total", pool=pool.metrics_name)
+        raise
+    finally:
+        metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - started, pool=pool.metrics_name)
+
+class InstrumentedQueuePool(QueuePool):
+    metrics_name = "sync"
+
+    def _do_get(self):
+        return _timed_checkout(self, super()._do_get)
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+    def _do_get(self):
+        return _timed_checkout(self, super()._do_get)
+
+def _pool_options(url, poolclass):
+    # SQLite (test/local) giữ pool mặc định của SQLAlchemy
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+def to_async_url(url: str):
+    """postgresql(+psycopg2):// → postgresql+asyncpg://, sqlite:// → sqlite+aiosqlite://"""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend in ("postgresql", "postgres"):
+        query = dict(u.query)
+        # asyncpg dùng ssl=... thay cho sslmode=...
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        u = u.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    return u
+
+# ----------------------------
+# Sync engine
+# ----------------------------
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_recycle=300,
+    pool_recycle=DB_POOL_RECYCLE,
+    **_pool_options(DATABASE_URL, InstrumentedQueuePool),
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# ----------------------------
+# Async engine (asyncpg / aiosqlite)
+# ----------------------------
+async_engine = create_async_engine(
+    to_async_url(DATABASE_URL),
+    pool_pre_ping=True,
+    pool_recycle=DB_POOL_RECYCLE,
+    **_pool_options(DATABASE_URL, InstrumentedAsyncQueuePool),
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +106,69 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# ----------------------------
+# Nâng cấp schema khi khởi động: create_all không thêm cột / index mới vào bảng đã có
+# ----------------------------
+def upgrade_schema(bind=None, metadata=None):
+    """
+    Thêm cột nullable còn thiếu và tạo index còn thiếu (checkfirst). Không xoá / đổi kiểu cột.
+    Mỗi index tạo trong transaction riêng: index unique không tạo được (dữ liệu cũ bị trùng)
+    chỉ in cảnh báo, không chặn app khởi động.
+    """
+    bind = bind or engine
+    metadata = metadata or Base.metadata
+    existing_tables = set(inspect(bind).get_table_names())
+    preparer = bind.dialect.identifier_preparer
+
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # create_all đã tạo đủ
+
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    print(f"⚠️ Bỏ qua cột NOT NULL {table.name}.{column.name}: cần migration thủ công")
+                    continue
+                ddl = (
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=bind.dialect)}"
+                )
+                conn.execute(text(ddl))
+                print(f"🛠️ Thêm cột {table.name}.{column.name}")
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            try:
+                with bind.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ Không tạo được index {index.name}: {e}")
+
+# ----------------------------
+# Pool metrics
+# ----------------------------
+def _pool_stats(pool):
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
+metrics.register_gauge("db_pool", lambda: {
+    "sync": _pool_stats(engine.pool),
+    "async": _pool_stats(async_engine.sync_engine.pool),
+})
@@ -0,0 +1,81 @@
+"""
+Báo cáo thời gian import (dựa trên `python -X importtime`) để phát hiện cold start chậm.
+
+    python -m app.importtime                       # profile `import app.main`
+    python -m app.importtime --module app.routers.auth --top 15
+    APP_ROLE=core python -m app.importtime --max-total-ms 1500   # exit 1 nếu vượt ngưỡng
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def run_importtime(module: str):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"import {module} failed (exit {proc.returncode})")
+    return parse_importtime(proc.stderr)
+
+
+def parse_importtime(output: str):
+    """Trả về list (tên module, self_us, cumulative_us, level)."""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # dòng tiêu đề
+        raw_name = parts[2]
+        name = raw_name.strip()
+        level = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        entries.append((name, int(parts[0]), int(parts[1]), level))
+    return entries
+
+
+def summarize(entries, top: int):
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"Tổng thời gian import: {total_us / 1000:.1f} ms ({len(entries)} module)\n")
+
+    print(f"{'package':<40} {'self (ms)':>10} {'%':>6}")
+    print("-" * 58)
+    for pkg, us in sorted(by_package.items(), key=lambda x: -x[1])[:top]:
+        print(f"{pkg:<40} {us / 1000:>10.1f} {us * 100 / (total_us or 1):>5.1f}%")
+
+    print(f"\n{'module (cumulative)':<50} {'cum (ms)':>10}")
+    print("-" * 62)
+    for name, _, cum_us, _ in sorted(entries, key=lambda e: -e[2])[:top]:
+        print(f"{name:<50} {cum_us / 1000:>10.1f}")
+
+    return total_us / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--max-total-ms", type=float, default=None,
+                        help="exit 1 nếu tổng thời gian import vượt ngưỡng (dùng trong CI)")
+    args = parser.parse_args(argv)
+
+    total_ms = summarize(run_importtime(args.module), args.top)
+
+    if args.max_total_ms is not None and total_ms > args.max_total_ms:
+        print(f"\n❌ Import time {total_ms:.1f} ms vượt ngưỡng {args.max_total_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+import importlib
+import threading
+
+from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import BaseRoute, Match, NoMatchFound
+
+
+class LazyRouterRoute(BaseRoute):
+    """
+    Giữ chỗ cho 1 router nặng (AI) trong bảng route của app: module chỉ được import
+    khi có request đầu tiên vào `prefix` (hoặc khi gọi load() lúc warm-up).
+    Vị trí trong app.routes giữ nguyên như include_router bình thường.
+    """
+
+    def __init__(self, app, module: str, prefix: str, **include_kwargs):
+        self.app_ref = app
+        self.module = module
+        self.prefix = prefix.rstrip("/")
+        self.include_kwargs = include_kwargs
+        self.include_in_schema = False
+        self._router = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._router is not None
+
+    def load(self):
+        if self._router is not None:
+            return self._router
+        with self._lock:
+            if self._router is None:
+                mod = importlib.import_module(self.module)
+                # dependency_overrides_provider=app → dependency_overrides vẫn áp dụng;
+                # default_response_class của app → route lazy render giống route thường
+                router = APIRouter(dependency_overrides_provider=self.app_ref,
+                                   default_response_class=self.app_ref.router.default_response_class)
+                router.include_router(mod.router, **self.include_kwargs)
+                self._router = router
+                print(f"📦 Lazy router loaded: {self.module}")
+        return self._router
+
+    # ---------- starlette route API ----------
+    def matches(self, scope):
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+        path = scope["path"]
+        if path == self.prefix or path.startswith(self.prefix + "/"):
+            return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name, /, **path_params):
+        if self._router is None:
+            raise NoMatchFound(name, path_params)
+        return self._router.url_path_for(name, **path_params)
+
+    async def handle(self, scope, receive, send):
+        router = self._router
+        if router is None:
+            # Import module nặng ngoài event loop
+            router = await run_in_threadpool(self.load)
+        await router(scope, receive, send)
@@ -1,21 +1,91 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from importlib import import_module
 from pathlib import Path
+import asyncio
 import os
 
-from app.database import engine, Base
-from app.routers import auth, doctors, hospitals, chatbot, users, appointments, profile
-from app.AI import predict_disease
+from app.database import engine, async_engine, Base, SessionLocal, upgrade_schema
+from app.lazy_routers import LazyRouterRoute
+from app.responses import FastJSONResponse
+from app.AI.model_registry import registry
+from app.services.metrics import metrics
+from app.services.password_hasher import password_hasher
+from app.services.osm_jobs import osm_job_runner
+from app.services.email_outbox import email_outbox_worker
+from app.services.search_index import backfill_search_text
+from app.services.query_counter import SQL_QUERY_BUDGET, QueryBudgetMiddleware, install as install_query_counter
 
 # ----------------------------
 # FastAPI app
 # ----------------------------
-app = FastAPI(title="Smart Healthcare API", version="1.0.0")
+# orjson cho mọi response JSON (xem app/responses.py)
+app = FastAPI(title="Smart Healthcare API", version="1.0.0", default_response_class=FastJSONResponse)
+
+# eager: load model trước khi nhận request | background: load ở thread nền | off: load khi dùng lần đầu
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "background").lower()
+
+# Vai trò deployment: all | core (auth, bác sĩ, bệnh viện, lịch hẹn...) | ai (chatbot, dự đoán bệnh)
+APP_ROLE = os.environ.get("APP_ROLE", "all").lower()
+
+# 1 → router AI (sentence_transformers, chromadb, sklearn...) chỉ import khi có request đầu tiên
+# (hoặc lúc warm-up). Route lazy không xuất hiện trong /docs.
+LAZY_AI_ROUTERS = os.environ.get("LAZY_AI_ROUTERS", "0") == "1"
+
+AI_ENABLED = APP_ROLE in ("all", "ai")
+
+# 0 → không chạy job đồng bộ OSM trong process này (chỉ nhận request, job do process khác chạy)
+OSM_JOB_RUNNER = os.environ.get("OSM_JOB_RUNNER", "1") == "1"
+
+# 0 → không gửi email từ outbox trong process này (chạy worker gửi email ở process khác)
+EMAIL_OUTBOX_WORKER = os.environ.get("EMAIL_OUTBOX_WORKER", "1") == "1"
+
+lazy_routes = []
+
+def load_lazy_routers():
+    for route in lazy_routes:
+        route.load()
 
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    if not AI_ENABLED or MODEL_WARMUP == "off":
+        registry.mark_ready()
+    elif MODEL_WARMUP == "eager":
+        load_lazy_routers()
+        registry.warm_up()
+    else:
+        registry.start_background_warm_up(before=load_lazy_routers)
+
+    if APP_ROLE in ("all", "core"):
+        # Spawn sẵn worker hash mật khẩu cho register/login
+        password_hasher.warm_up()
+        # Cột search_text cho dữ liệu tạo trước khi có tìm kiếm không dấu
+        db = SessionLocal()
+        try:
+            backfill_search_text(db)
+        finally:
+            db.close()
+        # Chạy tiếp các job OSM đang dở (process trước bị tắt / crash)
+        if OSM_JOB_RUNNER:
+            osm_job_runner.start()
+        # Gửi các email còn trong outbox (kể cả email chưa gửi xong khi process trước tắt)
+        if EMAIL_OUTBOX_WORKER:
+            email_outbox_worker.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Dừng runner nền trước (đợi chúng dọn dẹp: đóng SMTP, ghi kết quả) rồi mới đóng pool DB
+    stopped = [task for task in (osm_job_runner.stop(), email_outbox_worker.stop()) if task is not None]
+    await asyncio.gather(*stopped, return_exceptions=True)
+    password_hasher.shutdown()
+    # aiosqlite: thread kết nối còn mở làm process không thoát; asyncpg: đóng kết nối đàng hoàng
+    await async_engine.dispose()
+    engine.dispose()
 
 # ----------------------------
 # CORS
@@ -26,19 +96,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count", "X-SQL-Queries"],
 )
 
+# ----------------------------
+# Ngân sách số câu SQL mỗi request (bật khi test: SQL_QUERY_BUDGET=N)
+# ----------------------------
+if SQL_QUERY_BUDGET > 0:
+    install_query_counter(engine, async_engine.sync_engine)
+    app.add_middleware(QueryBudgetMiddleware)
+
 # ----------------------------
 # Include routers
 # ----------------------------
-app.include_router(auth.router)
-app.include_router(doctors.router)
-app.include_router(hospitals.router)
-app.include_router(chatbot.router)
-app.include_router(predict_disease.router)
-app.include_router(users.router)
-app.include_router(appointments.router, prefix="/api/appointments")
-app.include_router(profile.router)
+ROUTERS = [
+    # (module, prefix của router, nhóm, kwargs cho include_router)
+    ("app.routers.auth", "/api/auth", "core", {}),
+    ("app.routers.doctors", "/api/doctors", "core", {}),
+    ("app.routers.hospitals", "/api/hospitals", "core", {}),
+    ("app.routers.chatbot", "/api/chatbot", "ai", {}),
+    ("app.AI.predict_disease", "/api/predict-disease", "ai", {}),
+    ("app.routers.users", "/users", "core", {}),
+    ("app.routers.appointments", "/api/appointments", "core", {"prefix": "/api/appointments"}),
+    ("app.routers.profile", "/api/profile", "core", {}),
+]
+
+for module, prefix, group, kwargs in ROUTERS:
+    if APP_ROLE not in ("all", group):
+        continue
+    if group == "ai" and LAZY_AI_ROUTERS:
+        route = LazyRouterRoute(app, module, prefix, **kwargs)
+        app.router.routes.append(route)
+        lazy_routes.append(route)
+    else:
+        app.include_router(import_module(module).router, **kwargs)
 
 print("Routers included:", app.routes)
 
@@ -49,6 +140,23 @@ print("Routers included:", app.routes)
 def health_check():
     return {"status": "healthy"}
 
+# ----------------------------
+# Readiness: 503 cho tới khi warm-up model xong
+# ----------------------------
+@app.get("/ready")
+def readiness_check():
+    status = registry.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **status})
+    return {"status": "ready", **status}
+
+# ----------------------------
+# Metrics (in-process)
+# ----------------------------
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
 # ----------------------------
 # Mount frontend (nếu có)
 # ----------------------------
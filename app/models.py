@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, ForeignKey, DateTime, Float, TIMESTAMP, Date, Time
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, Text, ForeignKey, DateTime, Float, TIMESTAMP, Date, Time, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -16,6 +16,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # full_name + username + email (phần trước @) đã bỏ dấu, chữ thường — xem services/search_index.py
+    search_text = Column(String, nullable=True)
 
     doctor = relationship("Doctor", back_populates="user", uselist=False)  # 1-1 với doctor
     patient = relationship("Patient", back_populates="user", uselist=False)
@@ -34,6 +36,8 @@ class Doctor(Base):
     education = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    # full_name + specialty đã bỏ dấu, chữ thường — xem services/search_index.py
+    search_text = Column(String, nullable=True)
     
     hospital = relationship("Hospital", back_populates="doctors")
     user = relationship("User", back_populates="doctor")
@@ -44,7 +48,7 @@ class Hospital(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
     address = Column(String, nullable=False)
-    city = Column(String)
+    city = Column(String, index=True)
     phone = Column(String)
     email = Column(String)
     specialties = Column(String)
@@ -52,6 +56,13 @@ class Hospital(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+
+    # Định danh element OSM (node / way / relation) để đồng bộ incremental
+    osm_type = Column(String(10), nullable=True)
+    osm_id = Column(BigInteger, nullable=True)
+    osm_version = Column(Integer, nullable=True)
+
+    __table_args__ = (Index("ix_hospitals_osm", "osm_type", "osm_id"),)
     
     doctors = relationship("Doctor", back_populates="hospital")
 
@@ -91,6 +102,98 @@ class Appointment(Base):
 
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        # Tra cứu lịch bận / slot trống theo bác sĩ + khoảng ngày
+        Index("ix_appointments_doctor_slot", "doctor_id", "appointment_date", "appointment_time"),
+        # Danh sách lịch hẹn của bệnh nhân: lọc + phân trang keyset theo (ngày, giờ, id)
+        Index("ix_appointments_patient_slot", "patient_id", "appointment_date", "appointment_time", "id"),
+        # Mỗi slot của bác sĩ chỉ có 1 lịch hẹn chưa huỷ — DB chặn đặt trùng khi nhiều request đồng thời
+        Index(
+            "uq_appointments_active_slot", "doctor_id", "appointment_date", "appointment_time",
+            unique=True,
+            postgresql_where=text("status <> 'cancelled'"),
+            sqlite_where=text("status <> 'cancelled'"),
+        ),
+    )
+
     # optional relations (không bắt buộc)
     patient = relationship("Patient", backref="appointments")
-    doctor = relationship("Doctor", backref="appointments")
\ No newline at end of file
+    doctor = relationship("Doctor", backref="appointments")
+
+class DoctorSchedule(Base):
+    """Khung giờ làm việc lặp lại hằng tuần của bác sĩ (1 dòng = 1 ca trong 1 thứ)."""
+    __tablename__ = "doctor_schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)        # 0 = thứ 2 ... 6 = chủ nhật
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, default=30, nullable=False)
+
+# =========================================================
+# Job đồng bộ OSM chạy nền
+# =========================================================
+class OsmSyncJob(Base):
+    __tablename__ = "osm_sync_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mode = Column(String(20), nullable=False)                      # all | sequence | province
+    status = Column(String(20), default="queued", index=True)      # queued | running | done | failed
+    concurrency = Column(Integer, default=1)
+    full_sync = Column(Boolean, default=False)   # True → bỏ qua checkpoint, tải lại toàn bộ
+    worker_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)   # hết hạn lease → worker khác chạy tiếp
+    finished_at = Column(DateTime, nullable=True)
+
+    provinces = relationship("OsmSyncJobProvince", back_populates="job", cascade="all, delete-orphan")
+
+class OsmSyncJobProvince(Base):
+    __tablename__ = "osm_sync_job_provinces"
+    __table_args__ = (UniqueConstraint("job_id", "province", name="uq_osm_job_province"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("osm_sync_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    province = Column(String, nullable=False)
+    status = Column(String(20), default="pending")   # pending | done | failed
+    added = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    errors = Column(Text, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    job = relationship("OsmSyncJob", back_populates="provinces")
+
+class OsmSyncCheckpoint(Base):
+    """Mốc dữ liệu OSM (timestamp_osm_base của Overpass) đã đồng bộ xong cho từng tỉnh."""
+    __tablename__ = "osm_sync_checkpoints"
+
+    province = Column(String, primary_key=True)
+    synced_until = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class EmailOutbox(Base):
+    """
+    Email chờ gửi (transactional outbox): ghi cùng commit với thay đổi nghiệp vụ,
+    worker nền gửi qua SMTP và thử lại khi lỗi.
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)   # pending | sending | sent | failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String)
+    locked_until = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    # Worker lấy email đến hạn gửi theo (status, next_attempt_at)
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
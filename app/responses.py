@@ -0,0 +1,30 @@
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    # Model Pydantic (schemas.py): pydantic-core serialize thẳng ra JSON bytes, nhúng nguyên vào output
+    if isinstance(obj, BaseModel):
+        return orjson.Fragment(obj.__pydantic_serializer__.to_json(obj))
+    # Kiểu orjson không biết (ORM object, Decimal, set...): đi đường cũ của FastAPI
+    return jsonable_encoder(obj)
+
+
+def dumps(content) -> bytes:
+    """dict / list / datetime / numpy / model Pydantic → JSON bytes bằng orjson (không qua jsonable_encoder)."""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Response class mặc định của app: render bằng orjson thay cho json stdlib.
+    Route trả dict / model bình thường thì FastAPI vẫn chạy jsonable_encoder trước khi render;
+    endpoint payload lớn trả thẳng FastJSONResponse(content) để bỏ qua bước đó.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,131 +1,229 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy.orm import Session
-
-from ..database import get_db
-from ..models import Appointment, Patient, Doctor
-from ..schemas import AppointmentCreate
-from ..auth import get_current_user
-from ..services.email_service import send_appointment_email
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..models import Appointment, Patient, Doctor, User, DoctorSchedule
+from ..schemas import AppointmentCreate, DayAvailability, DoctorScheduleCreate
+from ..schemas import DoctorSchedule as DoctorScheduleOut
+from ..auth import get_current_principal
+from ..services.email_service import render_appointment_email
+from ..services.email_outbox import email_outbox_worker, enqueue_email
+from ..services.metrics import metrics
+from ..services.availability import AVAILABILITY_MAX_DAYS, get_availability, invalidate_doctor_grid
 from typing import List
-from datetime import date
+from datetime import date, time
+import os
 
 router = APIRouter(tags=["Appointments"])
 
+def is_slot_conflict(error: IntegrityError):
+    message = str(error.orig)
+    # Postgres báo tên constraint, SQLite báo danh sách cột
+    return "uq_appointments_active_slot" in message or (
+        "UNIQUE constraint failed" in message and "appointments.appointment_time" in message
+    )
+
 @router.post("/")
-def book_appointment(
+async def book_appointment(
     data: AppointmentCreate,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
 ):
     print("CURRENT USER:", current_user.id, current_user.role)
 
     if current_user.role != 0:
         raise HTTPException(status_code=403, detail="Only patients can book appointments")
 
-    patient = current_user.patient
-    if not patient:
+    patient_id = current_user.patient_id
+    if not patient_id:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    # Check slot bị trùng
-    exist = db.query(Appointment).filter(
-        Appointment.doctor_id == data.doctor_id,
-        Appointment.appointment_date == data.appointment_date,
-        Appointment.appointment_time == data.appointment_time
-    ).first()
-
-    if exist:
-        raise HTTPException(status_code=400, detail="Bác sĩ đang bận vào thời gian này")
-
     appointment = Appointment(
-        patient_id=patient.id,
+        patient_id=patient_id,
         doctor_id=data.doctor_id,
         appointment_date=data.appointment_date,
         appointment_time=data.appointment_time,
         note=data.note
     )
 
+    # 1 INSERT duy nhất; slot trùng bị chặn bởi unique index uq_appointments_active_slot
     db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if is_slot_conflict(e):
+            metrics.inc("appointment_slot_conflicts_total")
+            raise HTTPException(status_code=400, detail="Bác sĩ đang bận vào thời gian này")
+        raise HTTPException(status_code=400, detail="Invalid appointment data")
 
     return {
         "message": "Đặt lịch thành công",
         "appointment_id": appointment.id
     }
 
+# =========================================================
+# 📋 Danh sách lịch hẹn: lọc theo khoảng ngày / trạng thái, phân trang keyset
+# =========================================================
+APPOINTMENTS_MAX_PAGE = int(os.getenv("APPOINTMENTS_MAX_PAGE", "200"))
+APPOINTMENT_STATUSES = {"pending", "confirmed", "cancelled"}
+
+def parse_statuses(status: str | None):
+    if not status:
+        return None
+    names = [s.strip() for s in status.split(",") if s.strip()]
+    unknown = [s for s in names if s not in APPOINTMENT_STATUSES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {', '.join(unknown)}")
+    return names
+
+def parse_cursor(after: str):
+    """Cursor dạng "YYYY-MM-DD,HH:MM:SS,id" (giá trị X-Next-Cursor của trang trước)."""
+    try:
+        d, t, i = after.split(",")
+        return date.fromisoformat(d), time.fromisoformat(t), int(i)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def format_cursor(row):
+    return f"{row.appointment_date.isoformat()},{row.appointment_time.isoformat()},{row.id}"
+
+def filter_appointments(query, date_from, date_to, status, after, descending):
+    """Áp dụng filter + keyset cursor, sắp xếp theo (ngày, giờ, id)."""
+    if date_from is not None:
+        query = query.where(Appointment.appointment_date >= date_from)
+    if date_to is not None:
+        query = query.where(Appointment.appointment_date <= date_to)
+
+    statuses = parse_statuses(status)
+    if statuses:
+        query = query.where(Appointment.status.in_(statuses))
+
+    if after:
+        d, t, i = parse_cursor(after)
+        # (ngày, giờ, id) > cursor (hoặc < khi giảm dần), viết dạng OR để chạy được
+        # trên mọi DB và vẫn dùng được index theo appointment_date
+        if descending:
+            query = query.where(Appointment.appointment_date <= d, or_(
+                Appointment.appointment_date < d,
+                Appointment.appointment_time < t,
+                and_(Appointment.appointment_time == t, Appointment.id < i),
+            ))
+        else:
+            query = query.where(Appointment.appointment_date >= d, or_(
+                Appointment.appointment_date > d,
+                Appointment.appointment_time > t,
+                and_(Appointment.appointment_time == t, Appointment.id > i),
+            ))
+
+    order = [Appointment.appointment_date, Appointment.appointment_time, Appointment.id]
+    return query.order_by(*[c.desc() for c in order] if descending else order)
+
+def appointment_page(rows, limit, response: Response):
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = format_cursor(rows[-1])
+
 @router.get("/me")
-def get_my_appointments(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+async def get_my_appointments(
+    response: Response,
+    date_from: date | None = Query(None, alias="from"),
+    date_to: date | None = Query(None, alias="to"),
+    status: str | None = None,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=APPOINTMENTS_MAX_PAGE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
 ):
+    """
+    Lịch hẹn của bệnh nhân, mới nhất trước.
+    - from / to: khoảng ngày khám, status=pending,confirmed: lọc trạng thái
+    - limit bỏ trống → trả toàn bộ (tương thích client cũ)
+    - header X-Next-Cursor: truyền lại vào after để lấy trang sau
+    """
     if current_user.role != 0:
         raise HTTPException(status_code=403, detail="Only patients")
 
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
-    if not patient:
+    # patient_id đã có sẵn trong principal (cache) → không cần query Patient theo user_id
+    patient_id = current_user.patient_id
+    if not patient_id:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    data = db.query(
-    Appointment.id,
-    Appointment.appointment_date,
-    Appointment.appointment_time,
-    Appointment.status,
-    Appointment.note,
-    Doctor.full_name.label("doctor_name")
+    query = select(
+        Appointment.id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.status,
+        Appointment.note,
+        Doctor.full_name.label("doctor_name")
     ).join(
         Doctor, Appointment.doctor_id == Doctor.id
-    ).filter(
-        Appointment.patient_id == patient.id
-    ).order_by(
-        Appointment.appointment_date.desc()
-    ).all()
-
-    # Convert tuple -> dict
-    result = [
+    ).where(
+        Appointment.patient_id == patient_id
+    )
+    query = filter_appointments(query, date_from, date_to, status, after, descending=True)
+    if limit is not None:
+        query = query.limit(limit)
+
+    data = (await db.execute(query)).all()
+    appointment_page(data, limit, response)
+
+    return [
         {
-            "id": d[0],
-            "appointment_date": d[1],
-            "appointment_time": d[2],
-            "status": d[3],
-            "note": d[4],
-            "doctor_name": d[5],
+            "id": a.id,
+            "appointment_date": a.appointment_date,
+            "appointment_time": a.appointment_time,
+            "status": a.status,
+            "note": a.note,
+            "doctor_name": a.doctor_name,
         }
-        for d in data
+        for a in data
     ]
 
-    return result
-
 
 @router.get("/doctor")
-def get_doctor_appointments(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+async def get_doctor_appointments(
+    response: Response,
+    date_from: date | None = Query(None, alias="from"),
+    date_to: date | None = Query(None, alias="to"),
+    status: str | None = None,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=APPOINTMENTS_MAX_PAGE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
 ):
+    """
+    Lịch hẹn của bác sĩ, sớm nhất trước. Tham số giống /me.
+    """
     if current_user.role != 1:
         raise HTTPException(status_code=403, detail="Only doctors")
 
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
+    doctor_id = current_user.doctor_id
+    if not doctor_id:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
     # Join Patient để lấy tên bệnh nhân
-    data = db.query(
-    Appointment.id,
-    Appointment.appointment_date,
-    Appointment.appointment_time,
-    Appointment.status,
-    Appointment.note,
-    Patient.full_name.label("patient_name")
+    query = select(
+        Appointment.id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.status,
+        Appointment.note,
+        Patient.full_name.label("patient_name")
     ).join(
         Patient, Appointment.patient_id == Patient.id
-    ).filter(
-        Appointment.doctor_id == doctor.id
-    ).order_by(
-        Appointment.appointment_date.asc()
-    ).all()
-
-    # Chuyển tuple / Row thành dict
-    result = [
+    ).where(
+        Appointment.doctor_id == doctor_id
+    )
+    query = filter_appointments(query, date_from, date_to, status, after, descending=False)
+    if limit is not None:
+        query = query.limit(limit)
+
+    data = (await db.execute(query)).all()
+    appointment_page(data, limit, response)
+
+    return [
         {
             "id": a.id,
             "appointment_date": a.appointment_date,
@@ -137,16 +235,12 @@ def get_doctor_appointments(
         for a in data
     ]
 
-    return result
-
-
 @router.put("/{appointment_id}/status")
 async def update_status(
     appointment_id: int,
     status: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
 ):
     if current_user.role != 1:
         raise HTTPException(status_code=403, detail="Only doctors")
@@ -154,12 +248,13 @@ async def update_status(
     if status not in ["confirmed", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
+    if not current_user.doctor_id:
+        raise HTTPException(status_code=404, detail="Doctor not found")
 
-    appointment = db.query(Appointment).filter(
+    appointment = await db.scalar(select(Appointment).where(
         Appointment.id == appointment_id,
-        Appointment.doctor_id == doctor.id
-    ).first()
+        Appointment.doctor_id == current_user.doctor_id
+    ))
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -167,72 +262,134 @@ async def update_status(
     old_status = appointment.status
 
     if old_status != status:
-        appointment.status = status
-        db.commit()
-        db.refresh(appointment)
-
-        patient = db.query(Patient).filter(
-            Patient.id == appointment.patient_id
-        ).first()
-
-        background_tasks.add_task(
-            send_appointment_email,
-            patient.user.email,
+        # Lấy tên + email bệnh nhân và tên bác sĩ trong 1 query (không lazy-load patient.user)
+        patient = (await db.execute(
+            select(Patient.full_name, User.email, Doctor.full_name.label("doctor_name"))
+            .join(User, Patient.user_id == User.id)
+            .join(Doctor, Doctor.id == appointment.doctor_id)
+            .where(Patient.id == appointment.patient_id)
+        )).one()
+
+        subject, body = render_appointment_email(
             patient.full_name,
-            doctor.full_name,
+            patient.doctor_name,
             appointment.appointment_date,
             appointment.appointment_time,
             status,
             appointment.note
         )
 
+        # Đổi trạng thái + ghi email vào outbox trong cùng 1 commit: không mất email khi process chết
+        appointment.status = status
+        enqueue_email(db, patient.email, subject, body)
+        try:
+            await db.commit()
+        except IntegrityError as e:
+            # Xác nhận lại lịch đã huỷ trong khi khung giờ đã có người khác đặt → vi phạm uq_appointments_active_slot
+            await db.rollback()
+            if is_slot_conflict(e):
+                metrics.inc("appointment_slot_conflicts_total")
+                raise HTTPException(status_code=400, detail="Bác sĩ đang bận vào thời gian này")
+            raise
+        email_outbox_worker.notify()
+
     return {"message": f"Appointment {status}"}
 
 @router.delete("/{appointment_id}")
-def cancel_appointment(
+async def cancel_appointment(
     appointment_id: int,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
 ):
     if current_user.role != 0:
         raise HTTPException(status_code=403, detail="Only patients")
 
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
+    patient_id = current_user.patient_id
 
-    appointment = db.query(Appointment).filter(
+    appointment = await db.scalar(select(Appointment).where(
         Appointment.id == appointment_id,
-        Appointment.patient_id == patient.id
-    ).first()
+        Appointment.patient_id == patient_id
+    ))
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
-    db.delete(appointment)
-    db.commit()
+    await db.delete(appointment)
+    await db.commit()
 
     return {"message": "Appointment cancelled"}
 
 @router.get("/busy-times", response_model=List[str])
-def get_busy_times(
+async def get_busy_times(
     doctor_id: int = Query(...),
     date: date = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lấy các giờ đã được đặt của 1 bác sĩ trong 1 ngày cụ thể
     """
 
-    appointments = db.query(Appointment).filter(
+    times = (await db.scalars(select(Appointment.appointment_time).where(
         Appointment.doctor_id == doctor_id,
         Appointment.appointment_date == date,
         Appointment.status != "cancelled"
-    ).all()
+    ))).all()
 
     # Chuyển TIME -> "HH:MM"
-    busy_times = [
-        appt.appointment_time.strftime("%H:%M") 
-        for appt in appointments
-        if appt.appointment_time
-    ]
+    busy_times = [t.strftime("%H:%M") for t in times if t]
+
+    return busy_times
+
+# =========================================================
+# 📅 Slot trống của bác sĩ trong khoảng ngày
+# =========================================================
+@router.get("/availability", response_model=List[DayAvailability])
+async def get_doctor_availability(
+    doctor_id: int = Query(...),
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days + 1 > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must not exceed {AVAILABILITY_MAX_DAYS} days")
+
+    days = await get_availability(db, doctor_id, date_from, date_to)
+    if days is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return days
+
+# =========================================================
+# 🗓️ Lịch làm việc hằng tuần của bác sĩ
+# =========================================================
+@router.get("/schedule/{doctor_id}", response_model=List[DoctorScheduleOut])
+async def get_doctor_schedule(doctor_id: int, db: AsyncSession = Depends(get_async_db)):
+    rows = await db.scalars(
+        select(DoctorSchedule)
+        .where(DoctorSchedule.doctor_id == doctor_id)
+        .order_by(DoctorSchedule.weekday, DoctorSchedule.start_time)
+    )
+    return rows.all()
+
+@router.put("/schedule", response_model=List[DoctorScheduleOut])
+async def replace_my_schedule(
+    shifts: List[DoctorScheduleCreate],
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_principal)
+):
+    """Bác sĩ thay toàn bộ lịch làm việc của mình. Danh sách rỗng → dùng khung giờ mặc định."""
+    if current_user.role != 1 or not current_user.doctor_id:
+        raise HTTPException(status_code=403, detail="Only doctors")
+
+    for shift in shifts:
+        if shift.end_time <= shift.start_time:
+            raise HTTPException(status_code=400, detail="end_time must be after start_time")
+
+    await db.execute(delete(DoctorSchedule).where(DoctorSchedule.doctor_id == current_user.doctor_id))
+    rows = [DoctorSchedule(doctor_id=current_user.doctor_id, **shift.model_dump()) for shift in shifts]
+    db.add_all(rows)
+    await db.commit()
 
-    return busy_times
\ No newline at end of file
+    invalidate_doctor_grid(current_user.doctor_id)
+    return rows
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import Optional
 
 from .. import models, schemas, auth
-from ..database import get_db
+from ..database import get_async_db
+from ..services.principal_cache import Principal
+from ..services.password_hasher import password_hasher
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
@@ -12,17 +15,18 @@ router = APIRouter(prefix="/api/auth", tags=["authentication"])
 # 🟢 API đăng ký
 # -----------------------------
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     if len(user.password.encode("utf-8")) > 72:
         raise HTTPException(status_code=400, detail="Password too long")
 
-    if db.query(models.User).filter(models.User.email == user.email).first():
+    if await db.scalar(select(models.User.id).where(models.User.email == user.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    if db.query(models.User).filter(models.User.username == user.username).first():
+
+    if await db.scalar(select(models.User.id).where(models.User.username == user.username)):
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed_password = auth.get_password_hash(user.password)
+    # argon2 nặng CPU → chạy trong hashing pool riêng (503 khi quá tải)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
@@ -31,15 +35,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         role=0
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     new_patient = models.Patient(
         user_id=db_user.id,
         full_name=db_user.full_name
     )
     db.add(new_patient)
-    db.commit()
+    await db.commit()
 
     return db_user
 
@@ -47,20 +51,29 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 # 🟠 API đăng nhập → trả về access token
 # -----------------------------
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
 
-    if not user or not auth.verify_password(password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Hash cũ dùng bcrypt (deprecated) → lưu lại bằng argon2
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.username},
@@ -72,7 +85,7 @@ def login(
 # -----------------------------
 # 🟣 Lấy thông tin user đang đăng nhập
 # -----------------------------
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
+async def get_current_user(authorization: str = Header(...), db: AsyncSession = Depends(get_async_db)):
     """
     Parse header Authorization: Bearer <token>
     """
@@ -91,16 +104,20 @@ def get_current_user(authorization: str = Header(...), db: Session = Depends(get
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    principal = await auth.resolve_principal(username, db)
+    if principal is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    return principal
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_active_user)):
-    return current_user
+async def read_users_me(
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # /me cần đủ thông tin user → load theo khoá chính
+    return await db.get(models.User, current_user.id)
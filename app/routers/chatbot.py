@@ -1,26 +1,61 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import chromadb
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import httpx
+import json
+import time
 import os
 
+from app.services.metrics import metrics
+from app.services.semantic_cache import SemanticCache
+from app.AI.model_registry import registry
+
 # ----------------------------
-# OpenAI client
+# OpenAI client (async, pool kết nối dùng chung)
 # ----------------------------
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("Missing OPENAI_API_KEY environment variable!")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+LLM_MAX_CONNECTIONS = int(os.environ.get("CHATBOT_LLM_MAX_CONNECTIONS", "100"))
+LLM_TIMEOUT = float(os.environ.get("CHATBOT_LLM_TIMEOUT", "60"))
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS // 5 or 1,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=5.0),
+    ),
+)
+
+# ----------------------------
+# Thread pool giới hạn cho embedding + Chroma (code sync, nặng CPU)
+# ----------------------------
+RAG_WORKERS = int(os.environ.get("CHATBOT_RAG_WORKERS", "4"))
+rag_executor = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+
+# ----------------------------
+# Semantic cache cho câu trả lời
+# ----------------------------
+response_cache = SemanticCache(
+    "chatbot",
+    max_size=int(os.environ.get("CHATBOT_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("CHATBOT_CACHE_TTL", "3600")),
+    threshold=float(os.environ.get("CHATBOT_CACHE_THRESHOLD", "0.92")),
+)
 
 # ----------------------------
 router = APIRouter(prefix="/api/chatbot", tags=["Chatbot"])
 
 # ----------------------------
-# Lazy globals
+# RAG globals (lấy từ model registry)
 # ----------------------------
-chroma_client = None
 collection = None
 embed_model = None
 
@@ -28,13 +63,11 @@ embed_model = None
 # Init RAG
 # ----------------------------
 def init_rag():
-    global chroma_client, collection, embed_model
-    if chroma_client is None:
-        chroma_client = chromadb.PersistentClient(path="app/AI/vector_db")
-    if collection is None:
-        collection = chroma_client.get_collection("medical_rag")
+    # Registry đảm bảo mỗi model chỉ load 1 lần, kể cả khi nhiều thread gọi cùng lúc
+    global collection, embed_model
     if embed_model is None:
-        embed_model = SentenceTransformer("BAAI/bge-small-en")
+        collection = registry.get("rag_collection")
+        embed_model = registry.get("embed_model")
 
 # ----------------------------
 # System prompt
@@ -52,44 +85,163 @@ QUY TẮC:
 - Nếu triệu chứng nguy hiểm -> yêu cầu đến bệnh viện.
 """
 
+REFUSAL_REPLY = "Tôi chỉ hỗ trợ các câu hỏi liên quan đến sức khỏe và y tế."
+CHAT_MODEL = "gpt-4o-mini"
+
 class UserMessage(BaseModel):
     message: str
 
 # ----------------------------
 # RAG retrieval
 # ----------------------------
-def retrieve_context(query: str):
+def embed_query(query: str):
     init_rag()
-    query_vec = embed_model.encode([query]).tolist()
-    result = collection.query(query_embeddings=query_vec, n_results=3)
+    return embed_model.encode([query])[0]
+
+def query_context(query_vec):
+    init_rag()
+    result = collection.query(query_embeddings=[query_vec.tolist()], n_results=3)
     docs = result.get("documents", [[]])[0]
     return "\n\n".join(docs)
 
+def retrieve_context(query: str):
+    return query_context(embed_query(query))
+
+async def run_rag(fn, *args):
+    # Chạy trên rag_executor để không chặn event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(rag_executor, fn, *args)
+
+async def lookup_or_retrieve(query: str):
+    """
+    Trả về (cached_reply, None, None) nếu trúng cache,
+    ngược lại (None, context, query_vec). Embedding chỉ tính 1 lần cho cả cache lẫn Chroma.
+    """
+    cached = response_cache.get_exact(query)
+    if cached is not None:
+        return cached, None, None
+
+    query_vec = await run_rag(embed_query, query)
+    cached = response_cache.get_similar(query_vec)
+    if cached is not None:
+        return cached, None, None
+
+    context = await run_rag(query_context, query_vec)
+    return None, context, query_vec
+
+def build_prompt(context: str, user_input: str):
+    return f"""
+{SYSTEM_PROMPT}
+
+Dữ liệu RAG:
+{context}
+
+Câu hỏi:
+{user_input}
+"""
+
 # ----------------------------
 # Chatbot API
 # ----------------------------
 @router.post("")
 async def chatbot(msg: UserMessage):
     user_input = msg.message
-    context = retrieve_context(user_input)
+    cached, context, query_vec = await lookup_or_retrieve(user_input)
+
+    if cached is not None:
+        return {"reply": cached}
 
     if context.strip() == "":
-        return {"reply": "Tôi chỉ hỗ trợ các câu hỏi liên quan đến sức khỏe và y tế."}
+        return {"reply": REFUSAL_REPLY}
 
-    prompt = f"""
-{SYSTEM_PROMPT}
+    started = time.perf_counter()
+    response = await client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[{"role": "user", "content": build_prompt(context, user_input)}],
+        temperature=0.2
+    )
+    metrics.observe("chatbot_completion_seconds", time.perf_counter() - started, mode="json")
 
-Dữ liệu RAG:
-{context}
+    reply = response.choices[0].message.content
+    if reply:
+        response_cache.put(user_input, query_vec, reply)
 
-Câu hỏi:
-{user_input}
-"""
+    return {"reply": reply}
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
+# ----------------------------
+# Chatbot API (streaming, Server-Sent Events)
+# ----------------------------
+def sse_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def chatbot_stream(msg: UserMessage):
+    """
+    Sự kiện trả về theo thứ tự: context → token (nhiều lần) → done.
+    Lỗi giữa chừng được gửi dưới dạng sự kiện error.
+    """
+    user_input = msg.message
 
-    return {"reply": response.choices[0].message.content}
+    async def events():
+        started = time.perf_counter()
+        cached, context, query_vec = await lookup_or_retrieve(user_input)
+
+        if cached is not None:
+            yield sse_event("context", {"cached": True})
+            yield sse_event("token", {"content": cached})
+            yield sse_event("done", {"cached": True})
+            return
+
+        yield sse_event("context", {
+            "context": context,
+            "retrieval_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+        if context.strip() == "":
+            yield sse_event("token", {"content": REFUSAL_REPLY})
+            yield sse_event("done", {})
+            return
+
+        ttft = None
+        stream = None
+        parts = []
+        try:
+            stream = await client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[{"role": "user", "content": build_prompt(context, user_input)}],
+                temperature=0.2,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    metrics.observe("chatbot_time_to_first_token_seconds", ttft)
+                parts.append(delta)
+                yield sse_event("token", {"content": delta})
+        except Exception as e:
+            metrics.inc("chatbot_stream_errors_total")
+            yield sse_event("error", {"detail": str(e)})
+            return
+        finally:
+            if stream is not None:
+                await stream.close()
+
+        total = time.perf_counter() - started
+        metrics.observe("chatbot_completion_seconds", total, mode="stream")
+        if parts:
+            response_cache.put(user_input, query_vec, "".join(parts))
+        yield sse_event("done", {
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "total_ms": round(total * 1000, 1),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,89 +1,145 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from .. import models, schemas, auth
-from ..database import get_db
+from ..database import get_async_db
+from ..responses import FastJSONResponse
+from ..services.cache import catalog_cache
+from ..services.load_options import DOCTOR_CARD
+from ..services.principal_cache import Principal
+from ..services.search_index import SEARCH_MAX_LIMIT, search_doctors as search_doctor_index
 
 router = APIRouter(prefix="/api/doctors", tags=["doctors"])
 
 @router.get("/", response_model=List[schemas.Doctor])
-def get_doctors(
+async def get_doctors(
     skip: int = 0,
     limit: int = 100,
     specialty: str | None = None,
     hospital_id: int | None = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Doctor)
-    
-    if specialty:
-        query = query.filter(models.Doctor.specialty.contains(specialty))
-    if hospital_id:
-        query = query.filter(models.Doctor.hospital_id == hospital_id)
-    
-    doctors = query.offset(skip).limit(limit).all()
-    return doctors
+    async def load():
+        query = select(models.Doctor).options(*DOCTOR_CARD)
+
+        if specialty:
+            query = query.where(models.Doctor.specialty.contains(specialty))
+        if hospital_id:
+            query = query.where(models.Doctor.hospital_id == hospital_id)
+
+        doctors = (await db.scalars(query.offset(skip).limit(limit))).all()
+        return [schemas.Doctor.model_validate(d) for d in doctors]
+
+    return await catalog_cache.response(
+        "doctors.list", "doctors", f"list:{skip}:{limit}:{specialty}:{hospital_id}", load
+    )
 
 
 # =========================================================
 # 📊 Endpoint: Đếm tổng số bác sĩ
 # =========================================================
 @router.get("/count-all")
-def get_doctors_count(db: Session = Depends(get_db)):
-    count = db.query(models.Doctor).count()
-    return {"total_doctors": count}
+async def get_doctors_count(db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        count = await db.scalar(select(func.count()).select_from(models.Doctor))
+        return {"total_doctors": count}
+
+    return await catalog_cache.response("doctors.count", "doctors", "count", load)
+
+# =========================================================
+# 🔎 Endpoint: Tìm bác sĩ (không dấu, gần đúng) theo tên, chuyên khoa, tên bệnh viện
+# =========================================================
+@router.get("/search", response_model=schemas.DoctorSearchPage)
+async def search_doctors(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    specialty: str | None = None,
+    hospital_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Dựng index / chấm điểm tốn CPU → chạy trong threadpool, không chặn event loop
+    total, hits = await run_in_threadpool(search_doctor_index, q, limit, offset, specialty, hospital_id)
+    ids = [payload["id"] for _, payload in hits]
+
+    rows = {}
+    if ids:
+        result = await db.execute(
+            select(models.Doctor, models.Hospital.name)
+            .outerjoin(models.Hospital, models.Hospital.id == models.Doctor.hospital_id)
+            .where(models.Doctor.id.in_(ids))
+            .options(*DOCTOR_CARD)
+        )
+        rows = {doctor.id: (doctor, hospital_name) for doctor, hospital_name in result.all()}
+
+    items = []
+    for score, payload in hits:
+        if payload["id"] not in rows:
+            continue  # đã bị xoá ở process khác, index chưa refresh
+        doctor, hospital_name = rows[payload["id"]]
+        items.append(schemas.DoctorSearchHit(
+            **schemas.Doctor.model_validate(doctor).model_dump(), hospital_name=hospital_name, score=score
+        ))
+    return FastJSONResponse({"total": total, "items": items})
 
 @router.get("/{doctor_id}", response_model=schemas.Doctor)
-def get_doctor(doctor_id: int, db: Session = Depends(get_db)):
-    doctor = db.query(models.Doctor).filter(models.Doctor.id == doctor_id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found")
-    return doctor
+async def get_doctor(doctor_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        doctor = await db.get(models.Doctor, doctor_id, options=DOCTOR_CARD)
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        return schemas.Doctor.model_validate(doctor)
+
+    return await catalog_cache.response("doctors.detail", "doctors", f"detail:{doctor_id}", load)
 
 @router.post("/", response_model=schemas.Doctor)
-def create_doctor(
+async def create_doctor(
     doctor: schemas.DoctorCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(auth.get_current_active_principal)
 ):
     db_doctor = models.Doctor(**doctor.dict())
     db.add(db_doctor)
-    db.commit()
-    db.refresh(db_doctor)
+    await db.commit()
+    await catalog_cache.invalidate("doctors")
+    await db.refresh(db_doctor)
     return db_doctor
 
 @router.put("/{doctor_id}", response_model=schemas.Doctor)
-def update_doctor(
+async def update_doctor(
     doctor_id: int,
     doctor: schemas.DoctorCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(auth.get_current_active_principal)
 ):
-    db_doctor = db.query(models.Doctor).filter(models.Doctor.id == doctor_id).first()
+    db_doctor = await db.get(models.Doctor, doctor_id)
     if not db_doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
-    
+
     for key, value in doctor.dict().items():
         setattr(db_doctor, key, value)
-    
-    db.commit()
-    db.refresh(db_doctor)
+
+    await db.commit()
+    await catalog_cache.invalidate("doctors")
+    await db.refresh(db_doctor)
     return db_doctor
 
 @router.delete("/{doctor_id}")
-def delete_doctor(
+async def delete_doctor(
     doctor_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(auth.get_current_active_principal)
 ):
-    db_doctor = db.query(models.Doctor).filter(models.Doctor.id == doctor_id).first()
+    db_doctor = await db.get(models.Doctor, doctor_id)
     if not db_doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
-    
-    db.delete(db_doctor)
-    db.commit()
+
+    await db.delete(db_doctor)
+    await db.commit()
+    await catalog_cache.invalidate("doctors")
     return {"message": "Doctor deleted successfully"}
 
 
 
- 
\ No newline at end of file
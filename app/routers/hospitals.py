@@ -1,224 +1,204 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
-import time
-from requests.exceptions import RequestException
+from starlette.concurrency import run_in_threadpool
+import hashlib
+import os
 from app import models
 from app.database import get_db
+from app.responses import FastJSONResponse
+from app.services.cache import catalog_cache
+from app.services.geo_index import hospital_geo_index
+from app.services.hospital_ingest import GEO_PAYLOAD_FIELDS
+from app.services.osm_jobs import job_status, osm_job_runner
+from app.services.osm_provinces import provinces
 
 router = APIRouter(prefix="/api/hospitals", tags=["Hospitals"])
 
 # =========================================================
-# 🗺️ Danh sách 34 tỉnh/thành sau sáp nhập
+# 📍 Geo index cho /nearby
 # =========================================================
-provinces = [
-    "TP Hà Nội", "TP Huế", "Quảng Ninh", "Cao Bằng", "Lạng Sơn", "Lai Châu", "Điện Biên", "Sơn La",
-    "Thanh Hóa", "Nghệ An", "Hà Tĩnh", "Tuyên Quang", "Lào Cai", "Thái Nguyên", "Phú Thọ", "Bắc Ninh",
-    "Hưng Yên", "TP Hải Phòng", "Ninh Bình", "Quảng Trị", "TP Đà Nẵng", "Quảng Ngãi", "Gia Lai",
-    "Khánh Hòa", "Lâm Đồng", "Đắk Lắk", "TPHCM", "Đồng Nai", "Tây Ninh", "TP Cần Thơ",
-    "Vĩnh Long", "Đồng Tháp", "Cà Mau", "An Giang"
-]
+def geo_row(h):
+    """(id, lat, lon, payload) — gọi sau flush/refresh để đã có id."""
+    return h.id, h.latitude, h.longitude, {f: getattr(h, f) for f in GEO_PAYLOAD_FIELDS}
+
+def index_hospitals(rows):
+    for id, lat, lon, payload in rows:
+        hospital_geo_index.upsert(id, lat, lon, payload)
+
+def load_geo_rows(db: Session):
+    columns = [getattr(models.Hospital, f) for f in GEO_PAYLOAD_FIELDS]
+    rows = db.query(*columns).filter(
+        models.Hospital.latitude.isnot(None),
+        models.Hospital.longitude.isnot(None)
+    ).all()
+    return [(r.id, r.latitude, r.longitude, dict(zip(GEO_PAYLOAD_FIELDS, r))) for r in rows]
 
 # =========================================================
-# 🌐 Biến thể tên để tìm dữ liệu OSM chính xác hơn
+# 🛰️ Đồng bộ OSM chạy nền: các endpoint chỉ tạo job và trả 202 + job_id,
+#    theo dõi tiến độ qua /osm/jobs/{job_id}.
+#    Mặc định incremental (chỉ tải thay đổi từ lần đồng bộ trước), ?full=true để tải lại toàn bộ.
 # =========================================================
-provinces_variants = {
-    "TP Hà Nội": ["Hà Nội", "Ha Noi"],
-    "TP Huế": ["Huế", "Thừa Thiên Huế", "Hue", "Thua Thien Hue"],
-    "Quảng Ninh": ["Quảng Ninh", "Quang Ninh"],
-    "Cao Bằng": ["Cao Bằng", "Cao Bang"],
-    "Lạng Sơn": ["Lạng Sơn", "Lang Son"],
-    "Lai Châu": ["Lai Châu", "Lai Chau"],
-    "Điện Biên": ["Điện Biên", "Dien Bien"],
-    "Sơn La": ["Sơn La", "Son La"],
-    "Thanh Hóa": ["Thanh Hóa", "Thanh Hoa"],
-    "Nghệ An": ["Nghệ An", "Nghe An"],
-    "Hà Tĩnh": ["Hà Tĩnh", "Ha Tinh"],
-    "Tuyên Quang": ["Tuyên Quang", "Hà Giang", "Ha Giang", "Tuyen Quang"],
-    "Lào Cai": ["Lào Cai", "Yên Bái", "Lao Cai", "Yen Bai"],
-    "Thái Nguyên": ["Thái Nguyên", "Bắc Kạn", "Thai Nguyen", "Bac Kan"],
-    "Phú Thọ": ["Phú Thọ", "Hòa Bình", "Vĩnh Phúc", "Phu Tho", "Hoa Binh", "Vinh Phuc"],
-    "Bắc Ninh": ["Bắc Ninh", "Bắc Giang", "Bac Ninh", "Bac Giang"],
-    "Hưng Yên": ["Hưng Yên", "Thái Bình", "Hung Yen", "Thai Binh"],
-    "TP Hải Phòng": ["Hải Phòng", "Hải Dương", "Hai Phong", "Hai Duong"],
-    "Ninh Bình": ["Ninh Bình", "Hà Nam", "Nam Định", "Ninh Binh", "Ha Nam", "Nam Dinh"],
-    "Quảng Trị": ["Quảng Trị", "Quảng Bình", "Quang Tri", "Quang Binh"],
-    "TP Đà Nẵng": ["Đà Nẵng", "Quảng Nam", "Da Nang", "Quang Nam"],
-    "Quảng Ngãi": ["Quảng Ngãi", "Kon Tum", "Quang Ngai", "Kon Tum"],
-    "Gia Lai": ["Gia Lai", "Bình Định", "Gia Lai", "Binh Dinh"],
-    "Khánh Hòa": ["Khánh Hòa", "Ninh Thuận", "Khanh Hoa", "Ninh Thuan"],
-    "Lâm Đồng": ["Lâm Đồng", "Đắk Nông", "Bình Thuận", "Lam Dong", "Dak Nong", "Binh Thuan"],
-    "Đắk Lắk": ["Đắk Lắk", "Phú Yên", "Dak Lak", "Phu Yen"],
-    "TPHCM": ["TP Hồ Chí Minh", "Thành phố Hồ Chí Minh", "Ho Chi Minh City", "Bình Dương", "Bà Rịa - Vũng Tàu", "Ba Ria - Vung Tau", "Binh Duong"],
-    "Đồng Nai": ["Đồng Nai", "Bình Phước", "Dong Nai", "Binh Phuoc"],
-    "Tây Ninh": ["Tây Ninh", "Long An", "Tay Ninh", "Long An"],
-    "TP Cần Thơ": ["Cần Thơ", "Hậu Giang", "Sóc Trăng", "Can Tho", "Hau Giang", "Soc Trang"],
-    "Vĩnh Long": ["Vĩnh Long", "Bến Tre", "Trà Vinh", "Vinh Long", "Ben Tre", "Tra Vinh"],
-    "Đồng Tháp": ["Đồng Tháp", "Tiền Giang", "Dong Thap", "Tien Giang"],
-    "Cà Mau": ["Cà Mau", "Bạc Liêu", "Ca Mau", "Bac Lieu"],
-    "An Giang": ["An Giang", "Kiên Giang", "An Giang", "Kien Giang"],
-}
-
-# =========================================================
-# 🔗 Các server Overpass API dự phòng
-# =========================================================
-# 🔗 Các server Overpass API nhanh và ổn định hơn
-overpass_urls = [
-    "https://z.overpass-api.de/api/interpreter",
-    "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
-    "https://overpass.nchc.org.tw/api/interpreter",
-    "https://overpass.openstreetmap.fr/api/interpreter",
-]
-
-# =========================================================
-# 🧩 Hàm đồng bộ 1 tỉnh — tối ưu tốc độ & retry
-# =========================================================
-def sync_one_province(province: str, db: Session, max_retries: int = 2):
-    variants = provinces_variants.get(province, [province])
-    total_added = 0
-    print(f"\n🛰️ Bắt đầu đồng bộ {province}...")
-
-    for variant in variants:
-        for overpass_url in overpass_urls:
-            for attempt in range(1, max_retries + 1):
-                try:
-                    query = f"""
-                    [out:json][timeout:25];
-                    (
-                        node["amenity"="hospital"]["addr:country"="VN"]["addr:city"~"{variant}", i];
-                        way["amenity"="hospital"]["addr:city"~"{variant}", i];
-                        relation["amenity"="hospital"]["addr:city"~"{variant}", i];
-                    );
-                    out center;
-                    """
-                    resp = requests.get(overpass_url, params={"data": query}, timeout=30)
-                    if resp.status_code != 200:
-                        raise RequestException(f"HTTP {resp.status_code}")
-
-                    data = resp.json()
-                    elements = data.get("elements", [])
-                    if not elements:
-                        print(f"⚠️ Không có dữ liệu cho {province} ({variant}) tại {overpass_url}")
-                        continue
-
-                    hospitals_to_add = []
-                    for el in elements:
-                        tags = el.get("tags", {})
-                        name = tags.get("name")
-                        if not name:
-                            continue
-
-                        lat = el.get("lat") or el.get("center", {}).get("lat")
-                        lon = el.get("lon") or el.get("center", {}).get("lon")
-                        if not lat or not lon:
-                            continue
-
-                        exists = db.query(models.Hospital).filter(
-                            models.Hospital.name == name,
-                            models.Hospital.city == province
-                        ).first()
-                        if exists:
-                            continue
-
-                        hospitals_to_add.append(models.Hospital(
-                            name=name,
-                            address=tags.get("addr:full") or tags.get("addr:street") or "Không rõ địa chỉ",
-                            city=province,
-                            phone=tags.get("phone") or tags.get("contact:phone") or "",
-                            email=tags.get("email") or tags.get("contact:email") or "",
-                            specialties=tags.get("healthcare:speciality") or "",
-                            latitude=lat,
-                            longitude=lon
-                        ))
-
-                    if hospitals_to_add:
-                        db.add_all(hospitals_to_add)
-                        db.commit()
-                        total_added = len(hospitals_to_add)
-                        print(f"✅ {province}: +{total_added} bệnh viện ({variant}) từ {overpass_url}")
-                        return province, total_added
-
-                except Exception as e:
-                    print(f"❌ Lỗi {province} ({variant}) tại {overpass_url}: {e}")
-                    time.sleep(2 ** attempt)
-
-    print(f"🚫 Không thể lấy dữ liệu cho {province}")
-    return province, total_added
-
+def job_accepted(job_id: int):
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"{router.prefix}/osm/jobs/{job_id}"},
+        headers={"Location": f"{router.prefix}/osm/jobs/{job_id}"},
+    )
 
 # =========================================================
-# 🌏 Endpoint: Đồng bộ toàn bộ 34 tỉnh (song song 10 tỉnh)
+# 🌏 Endpoint: Đồng bộ toàn bộ 34 tỉnh (song song, xem OSM_SYNC_CONCURRENCY)
 # =========================================================
-@router.get("/osm/all")
-def sync_all_vietnam_hospitals(db: Session = Depends(get_db)):
-    results = []
-    total_added = 0
-    print("🚀 Bắt đầu đồng bộ toàn quốc...\n")
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(sync_one_province, p, db): p for p in provinces}
-        for future in as_completed(futures):
-            province, added = future.result()
-            results.append({"province": province, "added": added})
-            total_added += added
-
-    print(f"\n🎉 Hoàn tất! Tổng cộng thêm mới {total_added} bệnh viện.")
-    return {"message": "Đồng bộ toàn quốc hoàn tất", "total_added": total_added, "details": results}
+@router.get("/osm/all", status_code=202)
+async def sync_all_vietnam_hospitals(full: bool = False):
+    job_id = await osm_job_runner.enqueue("all", provinces, full_sync=full)
+    return job_accepted(job_id)
 
 
 # -------------------------------
 # 🚶 Endpoint: Đồng bộ tuần tự (34 tỉnh)
 # -------------------------------
-@router.get("/osm/sequence")
-def sync_all_vietnam_sequentially(db: Session = Depends(get_db)):
+@router.get("/osm/sequence", status_code=202)
+async def sync_all_vietnam_sequentially(full: bool = False):
     """
     Chạy đồng bộ tuần tự từng tỉnh — tránh timeout hoặc lỗi mạng
     """
-    results = []
-    total_added = 0
-    print("🚀 Bắt đầu đồng bộ tuần tự toàn quốc...\n")
-
-    for province in provinces:
-        print(f"\n==============================")
-        print(f"📍 Đang xử lý: {province}")
-        print(f"==============================")
-
-        province_name, added = sync_one_province(province, db)
-        results.append({"province": province_name, "added": added})
-        total_added += added
+    job_id = await osm_job_runner.enqueue("sequence", provinces, concurrency=1, full_sync=full)
+    return job_accepted(job_id)
 
-        # Nghỉ 1s giữa các tỉnh để tránh bị chặn IP (Overpass có giới hạn request)
-        time.sleep(1)
 
-    print(f"\n🎯 Hoàn tất đồng bộ toàn quốc tuần tự — Tổng cộng thêm {total_added} bệnh viện.")
-    return {
-        "message": "Đồng bộ tuần tự toàn quốc hoàn tất",
-        "total_added": total_added,
-        "details": results
-    }
+# =========================================================
+# 📋 Endpoint: Tiến độ 1 job đồng bộ
+# =========================================================
+@router.get("/osm/jobs/{job_id}")
+async def get_sync_job(job_id: int):
+    job = await run_in_threadpool(job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 # =========================================================
 # 🧭 Endpoint: Đồng bộ 1 tỉnh riêng lẻ
 # =========================================================
-@router.get("/osm/{province}")
-def sync_one(province: str, db: Session = Depends(get_db)):
+@router.get("/osm/{province}", status_code=202)
+async def sync_one(province: str, full: bool = False):
     province = province.strip()
     if province not in provinces:
-        return {"error": f"Tỉnh/thành '{province}' không tồn tại trong danh sách chuẩn."}
+        raise HTTPException(status_code=404, detail=f"Tỉnh/thành '{province}' không tồn tại trong danh sách chuẩn.")
 
-    _, added = sync_one_province(province, db)
-    return {"message": f"Đã đồng bộ {province}", "added": added}
+    job_id = await osm_job_runner.enqueue("province", [province], full_sync=full)
+    return job_accepted(job_id)
 
 # =========================================================
 # 🏥 Endpoint: Lấy toàn bộ bệnh viện từ DB
 # =========================================================
+HOSPITALS_MAX_PAGE = int(os.getenv("HOSPITALS_MAX_PAGE", "1000"))
+
+# Các cột client được phép chọn qua ?fields=
+HOSPITAL_FIELDS = {
+    "id": models.Hospital.id,
+    "name": models.Hospital.name,
+    "address": models.Hospital.address,
+    "city": models.Hospital.city,
+    "phone": models.Hospital.phone,
+    "email": models.Hospital.email,
+    "specialties": models.Hospital.specialties,
+    "description": models.Hospital.description,
+    "created_at": models.Hospital.created_at,
+    "latitude": models.Hospital.latitude,
+    "longitude": models.Hospital.longitude,
+}
+
+def parse_fields(fields: str | None):
+    if not fields:
+        return list(HOSPITAL_FIELDS)
+
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in HOSPITAL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # id luôn có để client làm cursor
+    return ["id"] + [f for f in dict.fromkeys(names) if f != "id"]
+
+def etag_for(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
 @router.get("/")
-def get_all_hospitals(db: Session = Depends(get_db)):
-    hospitals = db.query(models.Hospital).all()
-    return hospitals
+async def get_all_hospitals(
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=HOSPITALS_MAX_PAGE),
+    city: str | None = None,
+    specialty: str | None = None,
+    fields: str | None = None,
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Danh sách bệnh viện, phân trang keyset theo id.
+    - limit bỏ trống → trả toàn bộ (tương thích client cũ)
+    - fields=id,name,latitude,longitude → chỉ lấy các cột cần cho bản đồ
+    - header X-Next-Cursor: truyền lại vào after_id để lấy trang sau
+    """
+    names = parse_fields(fields)
+
+    def load_rows():
+        query = db.query(*[HOSPITAL_FIELDS[n] for n in names])
+
+        if after_id is not None:
+            query = query.filter(models.Hospital.id > after_id)
+        if city:
+            query = query.filter(models.Hospital.city == city)
+        if specialty:
+            query = query.filter(models.Hospital.specialties.contains(specialty))
+
+        query = query.order_by(models.Hospital.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    async def load():
+        rows = await run_in_threadpool(load_rows)
+        return [dict(zip(names, row)) for row in rows]
+
+    def headers_for(content, body):
+        headers = {"ETag": etag_for(body)}
+        if limit is not None and len(content) == limit:
+            headers["X-Next-Cursor"] = str(content[-1]["id"])
+        return headers
+
+    body, headers = await catalog_cache.get_or_load(
+        "hospitals.list", "hospitals", f"list:{after_id}:{limit}:{city}:{specialty}:{','.join(names)}",
+        load, headers_for=headers_for,
+    )
+
+    if if_none_match and headers["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# =========================================================
+# 📍 Endpoint: Bệnh viện gần vị trí (lat, lon) trong bán kính radius km
+# =========================================================
+HOSPITALS_NEARBY_MAX_RADIUS = float(os.getenv("HOSPITALS_NEARBY_MAX_RADIUS", "100"))
+
+@router.get("/nearby")
+def get_nearby_hospitals(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5, gt=0, le=HOSPITALS_NEARBY_MAX_RADIUS),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    hospital_geo_index.ensure_fresh(lambda: load_geo_rows(db))
+
+    return FastJSONResponse([
+        {**payload, "distance_km": round(distance, 3)}
+        for distance, payload in hospital_geo_index.nearby(lat, lon, radius, limit)
+    ])
 
 
 # =========================================================
@@ -232,6 +212,8 @@ def delete_hospital(hospital_id: int, db: Session = Depends(get_db)):
 
     db.delete(hospital)
     db.commit()
+    hospital_geo_index.remove(hospital_id)
+    catalog_cache.invalidate_from_thread("hospitals")
     return {"message": f"Đã xóa bệnh viện ID {hospital_id} thành công."}
 
 # =========================================================
@@ -276,6 +258,8 @@ def create_hospital(hospital: HospitalCreate, db: Session = Depends(get_db)):
     db.add(new_hospital)
     db.commit()
     db.refresh(new_hospital)
+    index_hospitals([geo_row(new_hospital)])
+    catalog_cache.invalidate_from_thread("hospitals")
 
     return {"message": "Tạo mới bệnh viện thành công.", "data": new_hospital}
 
@@ -283,9 +267,12 @@ def create_hospital(hospital: HospitalCreate, db: Session = Depends(get_db)):
 # 📊 Endpoint: Đếm tổng số bệnh viện
 # =========================================================
 @router.get("/count")
-def get_hospital_count(db: Session = Depends(get_db)):
+async def get_hospital_count(db: Session = Depends(get_db)):
     """
     Đếm tổng số bệnh viện trong cơ sở dữ liệu
     """
-    count = db.query(models.Hospital).count()
-    return {"total_hospitals": count}
+    async def load():
+        count = await run_in_threadpool(db.query(models.Hospital).count)
+        return {"total_hospitals": count}
+
+    return await catalog_cache.response("hospitals.count", "hospitals", "count", load)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
+from app import schemas
 from app.database import get_db
-from app.models import User, Doctor, Patient
-from app.auth import get_current_user
+from app.auth import load_current_user, oauth2_scheme
+from app.services.cache import catalog_cache
+from app.services.load_options import PROFILE
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/profile", tags=["Profile"])
@@ -13,37 +15,35 @@ class ProfileUpdate(BaseModel):
     address: str | None = None
     specialty: str | None = None
 
-@router.get("")
-def get_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    return {
-        "user": current_user,
-        "patient": db.query(Patient).filter_by(user_id=current_user.id).first(),
-        "doctor": db.query(Doctor).filter_by(user_id=current_user.id).first(),
-    }
+@router.get("", response_model=schemas.Profile)
+def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # user + patient + doctor trong 1 câu SELECT; serialize qua schema (không lộ hashed_password)
+    current_user = load_current_user(token, db, *PROFILE)
+    return {"user": current_user, "patient": current_user.patient, "doctor": current_user.doctor}
 
 @router.put("")
 def update_profile(
     payload: ProfileUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
+    current_user = load_current_user(token, db, *PROFILE)
     if payload.full_name:
         current_user.full_name = payload.full_name
     if payload.email:
         current_user.email = payload.email
 
     if current_user.role == 0:
-        patient = db.query(Patient).filter_by(user_id=current_user.id).first()
+        patient = current_user.patient
         if patient and payload.address:
             patient.address = payload.address
 
     if current_user.role == 1:
-        doctor = db.query(Doctor).filter_by(user_id=current_user.id).first()
+        doctor = current_user.doctor
         if doctor and payload.specialty:
             doctor.specialty = payload.specialty
 
     db.commit()
+    if current_user.role == 1:
+        catalog_cache.invalidate_from_thread("doctors")
     return {"message": "Profile updated"}
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from datetime import datetime
 from app.database import get_db
 from app.models import User, Doctor, Patient, Appointment
+from app.services.cache import catalog_cache
+from app.services.principal_cache import principal_cache
+from app.services.search_index import SEARCH_MAX_LIMIT, search_users
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -74,14 +77,31 @@ def migrate_role(user_id: int, new_role: int, db: Session):
 # ==== Kết thúc migrate ====
 
 @router.get("/")
-def get_users(search: str = "", db: Session = Depends(get_db)):
-    query = db.query(User)
-    if search:
-        query = query.filter(
-            User.full_name.ilike(f"%{search}%") |
-            User.email.ilike(f"%{search}%")
-        )
-    return query.all()
+def get_users(
+    response: Response,
+    search: str = "",
+    limit: int | None = Query(None, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """
+    - không có search: danh sách theo id; limit bỏ trống → trả toàn bộ (tương thích client cũ),
+      có limit → phân trang, header X-Total-Count là tổng số user
+    - có search: tìm không dấu, gần đúng; mặc định 50 kết quả, X-Total-Count là tổng số khớp
+    """
+    if not search:
+        query = db.query(User).order_by(User.id).offset(offset)
+        if limit is None:
+            return query.all()
+        response.headers["X-Total-Count"] = str(db.query(User).count())
+        return query.limit(limit).all()
+
+    # Tìm không dấu, gần đúng trên tên / username / email; kết quả xếp theo độ khớp
+    total, hits = search_users(search, limit or 50, offset)
+    ids = [payload["id"] for _, payload in hits]
+    users = {u.id: u for u in db.query(User).filter(User.id.in_(ids)).all()} if ids else {}
+    response.headers["X-Total-Count"] = str(total)
+    return [users[i] for i in ids if i in users]
 
 @router.get("/count")
 def get_user_count(db: Session = Depends(get_db)):
@@ -103,6 +123,10 @@ def update_role(user_id: int, payload: RoleUpdate = Body(...), db: Session = Dep
     user.role = payload.role
     db.commit()
     db.refresh(user)
+    # role + doctor_id/patient_id đã đổi → bỏ principal cũ trong cache
+    principal_cache.invalidate(user.username)
+    # đổi role có thể tạo / xoá hồ sơ bác sĩ
+    catalog_cache.invalidate_from_thread("doctors")
     return {"message": f"User role updated to {payload.role}"}
 
 @router.delete("/{user_id}")
@@ -121,7 +145,11 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
         db.delete(patient)
 
     # Cuối cùng mới xóa user
+    username = user.username
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(username)
+    if doctor:
+        catalog_cache.invalidate_from_thread("doctors")
     return {"message": "User deleted"}
 
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 from datetime import datetime, date, time
 
 class UserBase(BaseModel):
@@ -48,6 +48,14 @@ class Doctor(DoctorBase):
     class Config:
         from_attributes = True
 
+class DoctorSearchHit(Doctor):
+    hospital_name: Optional[str] = None
+    score: float
+
+class DoctorSearchPage(BaseModel):
+    total: int
+    items: List[DoctorSearchHit]
+
 class HospitalBase(BaseModel):
     name: str
     address: str
@@ -90,8 +98,33 @@ class Patient(PatientBase):
     class Config:
         from_attributes = True
 
+class Profile(BaseModel):
+    user: User
+    patient: Optional[Patient] = None
+    doctor: Optional[Doctor] = None
+
 class AppointmentCreate(BaseModel):
     doctor_id: int
     appointment_date: date
     appointment_time: time
-    note: Optional[str] = None
\ No newline at end of file
+    note: Optional[str] = None
+
+class DoctorScheduleBase(BaseModel):
+    weekday: int = Field(..., ge=0, le=6)   # 0 = thứ 2 ... 6 = chủ nhật
+    start_time: time
+    end_time: time
+    slot_minutes: int = Field(30, ge=5, le=240)
+
+class DoctorScheduleCreate(DoctorScheduleBase):
+    pass
+
+class DoctorSchedule(DoctorScheduleBase):
+    id: int
+    doctor_id: int
+
+    class Config:
+        from_attributes = True
+
+class DayAvailability(BaseModel):
+    date: date
+    slots: list[str]
@@ -0,0 +1,137 @@
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# Khung giờ mặc định cho bác sĩ chưa cấu hình lịch làm việc
+DEFAULT_WORKING_HOURS = os.getenv("DEFAULT_WORKING_HOURS", "08:00-12:00,13:30-17:00")
+DEFAULT_WORKING_DAYS = os.getenv("DEFAULT_WORKING_DAYS", "0,1,2,3,4,5")   # thứ 2 → thứ 7
+DEFAULT_SLOT_MINUTES = int(os.getenv("DEFAULT_SLOT_MINUTES", "30"))
+AVAILABILITY_MAX_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "31"))
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "300"))
+
+
+def _parse_hours(value: str):
+    shifts = []
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        start, end = part.strip().split("-")
+        shifts.append((time.fromisoformat(start), time.fromisoformat(end)))
+    return shifts
+
+
+def default_templates():
+    days = [int(d) for d in DEFAULT_WORKING_DAYS.split(",") if d.strip()]
+    return [
+        (weekday, start, end, DEFAULT_SLOT_MINUTES)
+        for weekday in days
+        for start, end in _parse_hours(DEFAULT_WORKING_HOURS)
+    ]
+
+
+def build_slot_grid(templates):
+    """
+    templates: iterable (weekday, start_time, end_time, slot_minutes)
+    → tuple 7 phần tử, mỗi phần tử là tuple các giờ bắt đầu slot (đã sắp xếp) của thứ đó.
+    """
+    grid = [set() for _ in range(7)]
+    anchor = date(2000, 1, 1)
+    for weekday, start, end, slot_minutes in templates:
+        step = timedelta(minutes=slot_minutes)
+        current = datetime.combine(anchor, start)
+        stop = datetime.combine(anchor, end)
+        while current + step <= stop:
+            grid[weekday].add(current.time())
+            current += step
+    return tuple(tuple(sorted(slots)) for slots in grid)
+
+
+# ----------------------------
+# Lịch làm việc đã dựng sẵn theo bác sĩ (cache trong process)
+# ----------------------------
+_grid_cache = TTLCache(maxsize=4096, ttl=AVAILABILITY_CACHE_TTL)
+_grid_lock = threading.Lock()
+_default_grid = build_slot_grid(default_templates())
+
+
+def invalidate_doctor_grid(doctor_id: int):
+    with _grid_lock:
+        _grid_cache.pop(doctor_id, None)
+
+
+async def get_slot_grid(db: AsyncSession, doctor_id: int):
+    """Slot grid của bác sĩ; None nếu bác sĩ không tồn tại."""
+    with _grid_lock:
+        grid = _grid_cache.get(doctor_id)
+    if grid is not None:
+        metrics.inc("availability_grid_cache_hits_total")
+        return grid
+    metrics.inc("availability_grid_cache_misses_total")
+
+    # 1 query: bác sĩ + các ca làm việc (outer join để bác sĩ chưa có lịch vẫn ra 1 dòng)
+    rows = (await db.execute(
+        select(
+            models.Doctor.id,
+            models.DoctorSchedule.weekday,
+            models.DoctorSchedule.start_time,
+            models.DoctorSchedule.end_time,
+            models.DoctorSchedule.slot_minutes,
+        )
+        .outerjoin(models.DoctorSchedule, models.DoctorSchedule.doctor_id == models.Doctor.id)
+        .where(models.Doctor.id == doctor_id)
+    )).all()
+    if not rows:
+        return None
+
+    templates = [(r.weekday, r.start_time, r.end_time, r.slot_minutes) for r in rows if r.weekday is not None]
+    grid = build_slot_grid(templates) if templates else _default_grid
+
+    with _grid_lock:
+        _grid_cache[doctor_id] = grid
+    return grid
+
+
+async def get_availability(db: AsyncSession, doctor_id: int, date_from: date, date_to: date, now: datetime = None):
+    """
+    Slot trống của bác sĩ từ date_from đến date_to (gồm cả 2 đầu):
+    slot grid theo thứ trong tuần trừ lịch hẹn chưa huỷ (1 query theo index
+    doctor_id + appointment_date + appointment_time) và các slot đã qua.
+    Trả về None nếu bác sĩ không tồn tại.
+    """
+    grid = await get_slot_grid(db, doctor_id)
+    if grid is None:
+        return None
+
+    booked = set(tuple(r) for r in (await db.execute(
+        select(models.Appointment.appointment_date, models.Appointment.appointment_time).where(
+            models.Appointment.doctor_id == doctor_id,
+            models.Appointment.appointment_date >= date_from,
+            models.Appointment.appointment_date <= date_to,
+            models.Appointment.status != "cancelled",
+        )
+    )).all())
+
+    now = now or datetime.now()
+    days = []
+    day = date_from
+    while day <= date_to:
+        slots = []
+        if day >= now.date():
+            slots = [
+                t.strftime("%H:%M")
+                for t in grid[day.weekday()]
+                if (day, t) not in booked and (day > now.date() or t > now.time())
+            ]
+        days.append({"date": day, "slots": slots})
+        day += timedelta(days=1)
+    return days
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+
+import anyio.from_thread
+from cachetools import TLRUCache
+from fastapi.responses import Response
+
+from app.responses import dumps
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# memory: LRU + TTL trong từng process | redis: dùng chung giữa các process (CACHE_URL) | off: tắt
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "2000"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "300"))
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "smarthealth:")
+
+
+# ----------------------------
+# Backend: get / set bytes có TTL + bộ đếm version theo namespace
+# ----------------------------
+class MemoryBackend:
+    """LRU + TTL (TTL riêng cho từng key) trong process."""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        self._lock = threading.Lock()
+        # value = (expires_at, payload)
+        self._entries = TLRUCache(maxsize=max_size, ttu=lambda key, value, now: value[0], timer=time.monotonic)
+        self._versions = {}
+
+    async def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    async def get_version(self, namespace: str):
+        return self._versions.get(namespace, 0)
+
+    async def bump_version(self, namespace: str):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self._entries.maxsize, "versions": dict(self._versions)}
+
+
+class RedisBackend:
+    """
+    Redis (hoặc server nói giao thức Redis) qua redis.asyncio — cần `pip install redis`.
+    Version namespace là 1 key INCR nên mọi process thấy invalidation ngay lập tức.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_URL, client=None):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def get_version(self, namespace: str):
+        value = await self.client.get(f"{CACHE_PREFIX}version:{namespace}")
+        return int(value) if value else 0
+
+    async def bump_version(self, namespace: str):
+        await self.client.incr(f"{CACHE_PREFIX}version:{namespace}")
+
+    def stats(self):
+        return {}
+
+
+def make_backend(kind: str = CACHE_BACKEND):
+    if kind == "off":
+        return None
+    if kind == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+# ----------------------------
+# Cache response JSON theo namespace có version
+# ----------------------------
+class ResponseCache:
+    """
+    Read-through cache cho endpoint đọc nhiều, ít đổi (danh mục bác sĩ / bệnh viện).
+    Key = prefix + namespace + version + key; ghi dữ liệu → tăng version của namespace
+    (invalidate), entry cũ không còn được đọc và tự hết hạn theo TTL / LRU.
+    Backend lỗi → coi như miss, request vẫn đi thẳng xuống DB.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        metrics.register_gauge("response_cache", self.stats)
+
+    async def _versioned_key(self, namespace: str, key: str):
+        version = await self.backend.get_version(namespace)
+        return f"{CACHE_PREFIX}{namespace}:v{version}:{key}"
+
+    async def get_or_load(self, route: str, namespace: str, key: str, loader, ttl: float = CACHE_DEFAULT_TTL,
+                          headers_for=None):
+        """
+        Trả về (body bytes, headers dict). `loader()` (async) trả về dữ liệu JSON-able khi miss;
+        `headers_for(content, body)` (tuỳ chọn) tính header lưu kèm (ETag, cursor...).
+        """
+        if self.backend is None:
+            return self._render(await loader(), headers_for)
+
+        cache_key = None
+        try:
+            cache_key = await self._versioned_key(namespace, key)
+            cached = await self.backend.get(cache_key)
+        except Exception as e:
+            metrics.inc("response_cache_errors_total", route=route)
+            print(f"⚠️ Cache {self.backend.name}: {e!r}")
+            cached = None
+
+        if cached is not None:
+            metrics.inc("response_cache_requests_total", route=route, result="hit")
+            raw_headers, _, body = cached.partition(b"\n")
+            return body, json.loads(raw_headers)
+
+        metrics.inc("response_cache_requests_total", route=route, result="miss")
+        body, headers = self._render(await loader(), headers_for)
+        if cache_key is not None:
+            try:
+                # JSON không chứa newline thô → dòng đầu là header, phần còn lại là body
+                await self.backend.set(cache_key, json.dumps(headers).encode() + b"\n" + body, ttl)
+            except Exception as e:
+                metrics.inc("response_cache_errors_total", route=route)
+                print(f"⚠️ Cache {self.backend.name}: {e!r}")
+        return body, headers
+
+    async def response(self, route: str, namespace: str, key: str, loader, ttl: float = CACHE_DEFAULT_TTL):
+        body, headers = await self.get_or_load(route, namespace, key, loader, ttl)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *namespaces: str):
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            try:
+                await self.backend.bump_version(namespace)
+            except Exception as e:
+                metrics.inc("response_cache_errors_total", route="invalidate")
+                print(f"⚠️ Cache {self.backend.name}: không invalidate được {namespace}: {e!r}")
+
+    def invalidate_from_thread(self, *namespaces: str):
+        """Cho route sync (chạy trong threadpool của anyio)."""
+        anyio.from_thread.run(self.invalidate, *namespaces)
+
+    def stats(self):
+        if self.backend is None:
+            return {"backend": "off"}
+        return {"backend": self.backend.name, **self.backend.stats()}
+
+    @staticmethod
+    def _render(content, headers_for):
+        body = dumps(content)
+        return body, (headers_for(content, body) if headers_for else {})
+
+
+catalog_cache = ResponseCache(make_backend())
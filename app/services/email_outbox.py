@@ -0,0 +1,277 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+
+import aiosmtplib
+from sqlalchemy import or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.database import SessionLocal
+from app.services.email_service import (
+    MAIL_CONFIGURED, MAIL_FROM, MAIL_FROM_NAME, MAIL_PASSWORD, MAIL_PORT, MAIL_SERVER, MAIL_SSL_TLS,
+    MAIL_STARTTLS, MAIL_USERNAME, USE_CREDENTIALS,
+)
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "10"))
+# Email "sending" quá hạn lease (worker chết giữa chừng) → được nhận gửi lại
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "120"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", "30"))
+# Đóng kết nối SMTP khi không có email nào để gửi quá lâu (server thường tự ngắt ~5 phút)
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+
+
+def enqueue_email(db, recipient: str, subject: str, body: str):
+    """Thêm email vào outbox trong transaction hiện tại của `db` (Session / AsyncSession); caller commit."""
+    email = models.EmailOutbox(recipient=recipient, subject=subject, body=body, status="pending",
+                               attempts=0, next_attempt_at=datetime.utcnow())
+    db.add(email)
+    return email
+
+
+def retry_delay(attempts: int):
+    return min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+# ----------------------------
+# Thao tác DB (sync, gọi qua run_in_threadpool)
+# ----------------------------
+def claim_batch(worker_id: str, limit: int = EMAIL_BATCH_SIZE):
+    """Nhận tối đa `limit` email đến hạn. UPDATE có điều kiện → an toàn khi nhiều worker."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        claimable = or_(
+            (models.EmailOutbox.status == "pending") & (models.EmailOutbox.next_attempt_at <= now),
+            (models.EmailOutbox.status == "sending") & (models.EmailOutbox.locked_until < now),
+        )
+        ids = db.scalars(
+            select(models.EmailOutbox.id).where(claimable).order_by(models.EmailOutbox.id).limit(limit)
+        ).all()
+        if not ids:
+            return []
+
+        db.execute(
+            update(models.EmailOutbox)
+            .where(models.EmailOutbox.id.in_(ids), claimable)
+            .values(status="sending", locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS))
+        )
+        db.commit()
+
+        return db.execute(
+            select(models.EmailOutbox.id, models.EmailOutbox.recipient, models.EmailOutbox.subject,
+                   models.EmailOutbox.body, models.EmailOutbox.attempts)
+            .where(models.EmailOutbox.id.in_(ids), models.EmailOutbox.locked_by == worker_id,
+                   models.EmailOutbox.status == "sending")
+            .order_by(models.EmailOutbox.id)
+        ).all()
+    finally:
+        db.close()
+
+
+def record_results(worker_id: str, sent_ids, failures, released=(), release_error: str = "", release_delay: float = 0.0):
+    """
+    sent_ids: id đã gửi xong. failures: list (id, attempts trước lần gửi này, lỗi, permanent).
+    Lỗi tạm thời → pending lại với backoff luỹ thừa; lỗi vĩnh viễn / hết lượt → failed.
+    released: id chưa gửi thử (lỗi kết nối / đăng nhập SMTP của cả lô) → pending lại sau
+    `release_delay` giây, không tính lượt thử.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        mine = models.EmailOutbox.locked_by == worker_id
+        if sent_ids:
+            db.execute(
+                update(models.EmailOutbox)
+                .where(models.EmailOutbox.id.in_(sent_ids), mine)
+                .values(status="sent", attempts=models.EmailOutbox.attempts + 1, sent_at=now,
+                        last_error=None, locked_by=None, locked_until=None)
+            )
+        for email_id, attempts, error, permanent in failures:
+            attempts += 1
+            give_up = permanent or attempts >= EMAIL_MAX_ATTEMPTS
+            db.execute(
+                update(models.EmailOutbox)
+                .where(models.EmailOutbox.id == email_id, mine)
+                .values(status="failed" if give_up else "pending", attempts=attempts, last_error=error[:2000],
+                        next_attempt_at=now + timedelta(seconds=retry_delay(attempts)),
+                        locked_by=None, locked_until=None)
+            )
+        if released:
+            db.execute(
+                update(models.EmailOutbox)
+                .where(models.EmailOutbox.id.in_(released), mine)
+                .values(status="pending", last_error=release_error[:2000] or None,
+                        next_attempt_at=now + timedelta(seconds=release_delay),
+                        locked_by=None, locked_until=None)
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def build_message(recipient: str, subject: str, body: str):
+    message = EmailMessage()
+    message["From"] = formataddr((MAIL_FROM_NAME, MAIL_FROM))
+    message["To"] = recipient
+    message["Subject"] = subject
+    # domain cố định: make_msgid() mặc định gọi socket.getfqdn() cho mỗi email
+    message["Message-ID"] = make_msgid(domain=MAIL_FROM.rsplit("@", 1)[-1])
+    message.set_content(body, subtype="html")
+    return message
+
+
+# ----------------------------
+# Worker gửi email chạy nền trong event loop của app
+# ----------------------------
+class EmailOutboxWorker:
+    """
+    Lấy email đến hạn từ bảng email_outbox theo lô, gửi tuần tự trên 1 kết nối SMTP
+    giữ lâu dài (kết nối lại khi bị ngắt, đóng khi rảnh quá EMAIL_SMTP_IDLE_SECONDS).
+    Giao hàng at-least-once: worker chết sau khi gửi nhưng trước khi ghi kết quả
+    → email hết lease và được gửi lại.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._task = None
+        self._wakeup = None
+        self._smtp = None
+        self._last_used = 0.0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        if not MAIL_CONFIGURED:
+            # Email vẫn được ghi vào outbox, gửi khi process sau khởi động với đủ env
+            print("⚠️ Email outbox: chưa đặt MAIL_USERNAME / MAIL_PASSWORD → không chạy worker gửi email")
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    def stop(self):
+        """Huỷ task nền; trả về task đã huỷ (hoặc None) để caller await nếu cần đợi dọn dẹp xong."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+        return task
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _connection(self):
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+        smtp = aiosmtplib.SMTP(hostname=MAIL_SERVER, port=MAIL_PORT, use_tls=MAIL_SSL_TLS,
+                               start_tls=MAIL_STARTTLS, timeout=EMAIL_SMTP_TIMEOUT)
+        try:
+            await smtp.connect()
+            if USE_CREDENTIALS:
+                await smtp.login(MAIL_USERNAME, MAIL_PASSWORD)
+        except BaseException:
+            # Kết nối dở dang (vd. AUTH bị từ chối sau khi đã mở socket) → đóng luôn
+            smtp.close()
+            raise
+        metrics.inc("email_smtp_connections_total")
+        self._smtp = smtp
+        return smtp
+
+    async def _close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError):
+            smtp.close()
+
+    async def _run_forever(self):
+        try:
+            while True:
+                try:
+                    batch = await run_in_threadpool(claim_batch, self.worker_id, EMAIL_BATCH_SIZE)
+                except Exception as e:
+                    print(f"❌ Email outbox: {e!r}")
+                    batch = []
+
+                if batch:
+                    await self.deliver(batch)
+                    continue
+
+                if self._smtp is not None and time.monotonic() - self._last_used > EMAIL_SMTP_IDLE_SECONDS:
+                    await self._close()
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), EMAIL_OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._close()
+
+    async def deliver(self, batch):
+        """Gửi 1 lô email đã nhận, ghi kết quả cả lô trong 1 transaction."""
+        started = time.perf_counter()
+        sent_ids, failures = [], []
+        released, release_error, release_delay = [], "", 0.0
+
+        try:
+            smtp = await self._connection()
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+            # Không kết nối / đăng nhập được (server sập, 535 sai mật khẩu...): lỗi của cả lô chứ
+            # không phải của từng email → trả cả lô về pending, không tính lượt thử
+            print(f"❌ SMTP {MAIL_SERVER}:{MAIL_PORT}: {e!r}")
+            metrics.inc("email_smtp_connect_failures_total")
+            await self._close()
+            smtp = None
+            released, release_error, release_delay = [email.id for email in batch], repr(e), retry_delay(1)
+
+        for i, email in enumerate(batch if smtp is not None else ()):
+            try:
+                await smtp.send_message(build_message(email.recipient, email.subject, email.body))
+                sent_ids.append(email.id)
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                failures.append((email.id, email.attempts, repr(e), True))
+            except aiosmtplib.SMTPResponseException as e:
+                # 5xx: địa chỉ / nội dung bị từ chối hẳn; 4xx: thử lại sau
+                failures.append((email.id, email.attempts, f"{e.code} {e.message}", e.code >= 500))
+                if e.code == 421:
+                    # Server đóng kết nối: phần còn lại của lô được nhận lại ngay ở vòng sau (kết nối mới)
+                    await self._close()
+                    released, release_error = [rest.id for rest in batch[i + 1:]], f"{e.code} {e.message}"
+                    break
+            except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                # Mất kết nối giữa chừng: cả phần còn lại của lô thử lại sau
+                print(f"❌ SMTP {MAIL_SERVER}:{MAIL_PORT}: {e!r}")
+                await self._close()
+                failures.extend((rest.id, rest.attempts, repr(e), False) for rest in batch[i:])
+                break
+            self._last_used = time.monotonic()
+
+        await run_in_threadpool(record_results, self.worker_id, sent_ids, failures,
+                                released, release_error, release_delay)
+
+        metrics.inc("email_outbox_sent_total", len(sent_ids))
+        if failures:
+            metrics.inc("email_outbox_failures_total", len(failures))
+        metrics.observe("email_outbox_batch_seconds", time.perf_counter() - started)
+        if failures or released:
+            print(f"📧 Email outbox: gửi {len(sent_ids)}, lỗi {len(failures)}, trả lại {len(released)}")
+
+
+email_outbox_worker = EmailOutboxWorker()
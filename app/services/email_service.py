@@ -1,23 +1,41 @@
+import os
+
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from pathlib import Path
 
+# ----------------------------
+# SMTP config (ghi đè bằng env, ví dụ trỏ về SMTP stub local: MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_STARTTLS=0 USE_CREDENTIALS=0)
+# ----------------------------
+# Tài khoản gửi (Gmail: dùng App Password) chỉ lấy từ env, không để mặc định trong code
+MAIL_USERNAME = os.getenv("MAIL_USERNAME", "")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD", "")
+# Gmail: địa chỉ gửi phải là chính tài khoản đăng nhập → mặc định lấy theo MAIL_USERNAME
+MAIL_FROM = os.getenv("MAIL_FROM") or (MAIL_USERNAME if "@" in MAIL_USERNAME else "noreply@example.com")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+MAIL_FROM_NAME = os.getenv("MAIL_FROM_NAME", "Hệ thống đặt lịch khám")
+MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "1") == "1"
+MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS", "0") == "1"
+USE_CREDENTIALS = os.getenv("USE_CREDENTIALS", "1") == "1"
+# Thiếu MAIL_USERNAME / MAIL_PASSWORD khi server cần đăng nhập → không gửi được email nào
+MAIL_CONFIGURED = not USE_CREDENTIALS or bool(MAIL_USERNAME and MAIL_PASSWORD)
+
 conf = ConnectionConfig(
-    MAIL_USERNAME = "huyhuynh290423@gmail.com",
-    MAIL_PASSWORD = "ljlt adaz zjmb ekig",  # Gmail App Password
-    MAIL_FROM = "huyhuynh290423@gmail.com",
-    MAIL_PORT = 587,
-    MAIL_SERVER = "smtp.gmail.com",
-    MAIL_FROM_NAME = "Hệ thống đặt lịch khám",
-    MAIL_STARTTLS = True,
-    MAIL_SSL_TLS = False,
-    USE_CREDENTIALS = True,
+    MAIL_USERNAME = MAIL_USERNAME,
+    MAIL_PASSWORD = MAIL_PASSWORD,
+    MAIL_FROM = MAIL_FROM,
+    MAIL_PORT = MAIL_PORT,
+    MAIL_SERVER = MAIL_SERVER,
+    MAIL_FROM_NAME = MAIL_FROM_NAME,
+    MAIL_STARTTLS = MAIL_STARTTLS,
+    MAIL_SSL_TLS = MAIL_SSL_TLS,
+    USE_CREDENTIALS = USE_CREDENTIALS,
 )
 
 fast_mail = FastMail(conf)
 
 
-async def send_appointment_email(
-    email: str,
+def render_appointment_email(
     patient_name: str,
     doctor_name: str,
     appointment_date,
@@ -25,6 +43,7 @@ async def send_appointment_email(
     status: str,
     note: str = ""
 ):
+    """Nội dung email báo trạng thái lịch hẹn → (subject, body HTML)."""
     if status == "confirmed":
         subject = "Lịch khám của bạn đã được xác nhận"
         body = f"""
@@ -42,6 +61,22 @@ async def send_appointment_email(
         <p><b>Lý do:</b> {note or "Không có ghi chú"}</p>
         <p>Vui lòng đặt lịch khác.</p>
         """
+    return subject, body
+
+
+async def send_appointment_email(
+    email: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date,
+    appointment_time,
+    status: str,
+    note: str = ""
+):
+    """Gửi ngay (mỗi lần 1 kết nối SMTP). Luồng đặt lịch dùng email_outbox thay cho hàm này."""
+    subject, body = render_appointment_email(
+        patient_name, doctor_name, appointment_date, appointment_time, status, note
+    )
 
     message = MessageSchema(
         subject=subject,
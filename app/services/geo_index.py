@@ -0,0 +1,149 @@
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# Kích thước 1 ô lưới (độ). 0.05° ≈ 5.5 km theo vĩ độ
+GEO_CELL_DEG = float(os.getenv("GEO_CELL_DEG", "0.05"))
+# Rebuild toàn bộ định kỳ để nhận thay đổi từ worker/process khác (0 = không bao giờ)
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "600"))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """
+    Index không gian trong bộ nhớ: chia bản đồ thành lưới ô vuông GEO_CELL_DEG độ,
+    mỗi ô giữ tập id bệnh viện. Truy vấn bán kính chỉ duyệt các ô giao với
+    bounding box rồi lọc lại bằng haversine.
+
+    `entries`: id → (lat, lon, payload) với payload là dict trả thẳng cho client.
+    """
+
+    def __init__(self, cell_deg: float = GEO_CELL_DEG, refresh_seconds: float = GEO_INDEX_REFRESH_SECONDS):
+        self.cell_deg = cell_deg
+        self.refresh_seconds = refresh_seconds
+        self.entries = {}
+        self.cells = defaultdict(set)
+        self.loaded_at = None
+        self._lock = threading.RLock()
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    # ----------------------------
+    # Cập nhật
+    # ----------------------------
+    def upsert(self, id, lat, lon, payload=None):
+        with self._lock:
+            self._discard(id)
+            if lat is None or lon is None:
+                return
+            self.entries[id] = (lat, lon, payload or {"id": id})
+            self.cells[self._cell(lat, lon)].add(id)
+
+    def remove(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        old = self.entries.pop(id, None)
+        if old is None:
+            return
+        cell = self._cell(old[0], old[1])
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.discard(id)
+            if not bucket:
+                del self.cells[cell]
+
+    def rebuild(self, rows):
+        """rows: iterable (id, lat, lon, payload). Dựng index mới rồi mới thay thế."""
+        started = time.perf_counter()
+        entries = {}
+        cells = defaultdict(set)
+        for id, lat, lon, payload in rows:
+            if lat is None or lon is None:
+                continue
+            entries[id] = (lat, lon, payload)
+            cells[self._cell(lat, lon)].add(id)
+
+        with self._lock:
+            self.entries = entries
+            self.cells = cells
+            self.loaded_at = time.monotonic()
+        metrics.observe("geo_index_rebuild_seconds", time.perf_counter() - started)
+
+    def ensure_fresh(self, load_rows):
+        """Rebuild khi chưa load hoặc đã quá GEO_INDEX_REFRESH_SECONDS."""
+        loaded_at = self.loaded_at
+        if loaded_at is not None and (
+            self.refresh_seconds <= 0 or time.monotonic() - loaded_at < self.refresh_seconds
+        ):
+            return
+        with self._lock:
+            if self.loaded_at == loaded_at:
+                self.rebuild(load_rows())
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    # ----------------------------
+    # Truy vấn
+    # ----------------------------
+    def nearby(self, lat, lon, radius_km, limit=20):
+        """List (distance_km, payload) trong bán kính radius_km, gần nhất trước."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        # gần cực cos → 0: quét toàn bộ kinh độ
+        cos_lat = math.cos(math.radians(lat))
+        dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEG_LAT * cos_lat))
+
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+
+        results = []
+        with self._lock:
+            n_cells = (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+            if n_cells > len(self.cells):
+                # bbox lớn hơn số ô đang có dữ liệu → duyệt các ô có dữ liệu
+                keys = [k for k in self.cells if lat_lo <= k[0] <= lat_hi and lon_lo <= k[1] <= lon_hi]
+            else:
+                keys = [(i, j) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)]
+
+            for key in keys:
+                for id in self.cells.get(key, ()):
+                    h_lat, h_lon, payload = self.entries[id]
+                    distance = haversine_km(lat, lon, h_lat, h_lon)
+                    if distance <= radius_km:
+                        results.append((distance, payload))
+
+        results.sort(key=lambda r: r[0])
+        return results[:limit]
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "cells": len(self.cells),
+            "cell_deg": self.cell_deg,
+            "age_seconds": None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1),
+        }
+
+
+hospital_geo_index = GeoIndex()
+metrics.register_gauge("hospital_geo_index", hospital_geo_index.stats)
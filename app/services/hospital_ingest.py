@@ -0,0 +1,177 @@
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.geo_index import hospital_geo_index
+from app.services.metrics import metrics
+
+OSM_INSERT_BATCH = int(os.getenv("OSM_INSERT_BATCH", "500"))
+
+# Chênh lệch toạ độ nhỏ hơn ngưỡng này coi như không đổi (~1 cm)
+COORD_EPSILON = 1e-7
+
+GEO_PAYLOAD_FIELDS = ("id", "name", "address", "city", "phone", "latitude", "longitude")
+
+
+def parse_element(el: dict, province: str):
+    """1 element Overpass → dict cột Hospital, None nếu thiếu tên hoặc toạ độ."""
+    tags = el.get("tags", {})
+    name = tags.get("name")
+    if not name:
+        return None
+
+    lat = el.get("lat") or el.get("center", {}).get("lat")
+    lon = el.get("lon") or el.get("center", {}).get("lon")
+    if not lat or not lon:
+        return None
+
+    return {
+        "name": name,
+        "address": tags.get("addr:full") or tags.get("addr:street") or "Không rõ địa chỉ",
+        "city": province,
+        "phone": tags.get("phone") or tags.get("contact:phone") or "",
+        "email": tags.get("email") or tags.get("contact:email") or "",
+        "specialties": tags.get("healthcare:speciality") or "",
+        "latitude": lat,
+        "longitude": lon,
+        "osm_type": el.get("type"),
+        "osm_id": el.get("id"),
+        "osm_version": el.get("version"),
+    }
+
+
+def _changed_fields(existing, row: dict):
+    # Cùng element OSM, version không đổi → dữ liệu không đổi
+    if (
+        row["osm_id"] is not None and existing.osm_id == row["osm_id"]
+        and existing.osm_version is not None and existing.osm_version == row["osm_version"]
+    ):
+        return {}
+
+    changes = {}
+    if existing.name != row["name"]:
+        changes["name"] = row["name"]
+    if (
+        existing.latitude is None or existing.longitude is None
+        or abs(existing.latitude - row["latitude"]) > COORD_EPSILON
+        or abs(existing.longitude - row["longitude"]) > COORD_EPSILON
+    ):
+        changes["latitude"] = row["latitude"]
+        changes["longitude"] = row["longitude"]
+    # OSM không có số điện thoại → giữ số đang lưu (có thể nhập tay)
+    if row["phone"] and row["phone"] != existing.phone:
+        changes["phone"] = row["phone"]
+    for field in ("osm_type", "osm_id", "osm_version"):
+        if row[field] is not None and getattr(existing, field) != row[field]:
+            changes[field] = row[field]
+    return changes
+
+
+def _geo_row(id, name, address, city, phone, lat, lon):
+    return id, lat, lon, dict(zip(GEO_PAYLOAD_FIELDS, (id, name, address, city, phone, lat, lon)))
+
+
+def upsert_province_hospitals(db: Session, province: str, elements: list):
+    """
+    Ghi các element Overpass của 1 tỉnh vào bảng hospitals:
+    - 1 query lấy sẵn toàn bộ bệnh viện của tỉnh, khớp theo (osm_type, osm_id),
+      bản ghi cũ chưa có osm_id thì khớp theo name + city
+    - bệnh viện mới → INSERT theo lô OSM_INSERT_BATCH dòng
+    - bệnh viện đã có mà đổi toạ độ / số điện thoại → UPDATE theo lô
+    Commit 1 lần, sau đó cập nhật geo index.
+    """
+    started = time.perf_counter()
+
+    rows = {}
+    for el in elements:
+        row = parse_element(el, province)
+        if row is not None:
+            rows.setdefault(row["name"], row)  # trùng tên trong cùng tỉnh → giữ bản đầu
+
+    existing = db.execute(
+        select(
+            models.Hospital.id,
+            models.Hospital.name,
+            models.Hospital.address,
+            models.Hospital.phone,
+            models.Hospital.latitude,
+            models.Hospital.longitude,
+            models.Hospital.osm_type,
+            models.Hospital.osm_id,
+            models.Hospital.osm_version,
+        ).where(models.Hospital.city == province)
+    ).all()
+    by_osm = {(h.osm_type, h.osm_id): h for h in existing if h.osm_id is not None}
+    by_name = {h.name: h for h in existing}
+
+    to_insert, to_update, geo_rows = [], [], []
+    for name, row in rows.items():
+        current = by_osm.get((row["osm_type"], row["osm_id"])) or by_name.get(name)
+        if current is None:
+            to_insert.append(row)
+            continue
+
+        changes = _changed_fields(current, row)
+        if changes:
+            to_update.append({"id": current.id, **changes})
+            geo_rows.append(_geo_row(
+                current.id, changes.get("name", current.name), current.address, province,
+                changes.get("phone", current.phone),
+                changes.get("latitude", current.latitude),
+                changes.get("longitude", current.longitude),
+            ))
+
+    for i in range(0, len(to_insert), OSM_INSERT_BATCH):
+        batch = to_insert[i:i + OSM_INSERT_BATCH]
+        db.execute(insert(models.Hospital), batch)
+        # executemany + RETURNING theo thứ tham số không được mọi dialect hỗ trợ
+        # (SQLite sẽ tách ra từng dòng) → đọc lại id theo (city, name)
+        ids = dict(db.execute(
+            select(models.Hospital.name, models.Hospital.id).where(
+                models.Hospital.city == province,
+                models.Hospital.name.in_([r["name"] for r in batch]),
+            )
+        ).all())
+        geo_rows.extend(
+            _geo_row(ids[r["name"]], r["name"], r["address"], province, r["phone"], r["latitude"], r["longitude"])
+            for r in batch
+        )
+
+    for i in range(0, len(to_update), OSM_INSERT_BATCH):
+        db.execute(update(models.Hospital), to_update[i:i + OSM_INSERT_BATCH])
+
+    db.commit()
+
+    for id, lat, lon, payload in geo_rows:
+        hospital_geo_index.upsert(id, lat, lon, payload)
+
+    metrics.observe("osm_upsert_seconds", time.perf_counter() - started)
+    return {
+        "added": len(to_insert),
+        "updated": len(to_update),
+        "unchanged": len(rows) - len(to_insert) - len(to_update),
+    }
+
+
+# ----------------------------
+# Checkpoint đồng bộ incremental
+# ----------------------------
+def load_checkpoints(db: Session, province_names):
+    rows = db.execute(
+        select(models.OsmSyncCheckpoint.province, models.OsmSyncCheckpoint.synced_until)
+        .where(models.OsmSyncCheckpoint.province.in_(list(province_names)))
+    ).all()
+    return dict(rows)
+
+
+def save_checkpoint(db: Session, province: str, synced_until: datetime):
+    checkpoint = db.get(models.OsmSyncCheckpoint, province)
+    if checkpoint is None:
+        db.add(models.OsmSyncCheckpoint(province=province, synced_until=synced_until))
+    else:
+        checkpoint.synced_until = synced_until
+    db.commit()
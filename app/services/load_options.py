@@ -0,0 +1,27 @@
+from sqlalchemy.orm import joinedload, load_only, raiseload
+
+from app import models, schemas
+
+# ----------------------------
+# Chiến lược load cho từng endpoint
+# ----------------------------
+# Mỗi bộ option load đúng những gì response cần trong 1 câu SELECT; raiseload("*") biến
+# mọi truy cập quan hệ chưa load thành lỗi ngay (thay vì lazy load âm thầm → N+1 query).
+
+
+def _schema_columns(model, schema):
+    return [getattr(model, name) for name in schema.model_fields if hasattr(model, name)]
+
+
+# schemas.Doctor: chỉ các cột của bảng doctors (bỏ search_text, user_id...)
+DOCTOR_CARD = (
+    load_only(*_schema_columns(models.Doctor, schemas.Doctor)),
+    raiseload("*"),
+)
+
+# GET /api/profile: user + hồ sơ bệnh nhân + hồ sơ bác sĩ (quan hệ 1-1) → 1 SELECT có 2 LEFT JOIN
+PROFILE = (
+    joinedload(models.User.patient).raiseload("*"),
+    joinedload(models.User.doctor).raiseload("*"),
+    raiseload("*"),
+)
@@ -0,0 +1,82 @@
+import threading
+from collections import defaultdict, deque
+
+# Số mẫu giữ lại cho mỗi histogram để tính percentile
+RESERVOIR_SIZE = 2048
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def _percentile(sorted_values, q: float):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class Metrics:
+    """
+    Registry metrics in-process (counter, histogram, gauge callback), an toàn đa luồng.
+    Xem snapshot qua endpoint /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {
+                    "count": 0, "sum": 0.0, "max": None,
+                    "samples": deque(maxlen=RESERVOIR_SIZE),
+                }
+            h["count"] += 1
+            h["sum"] += value
+            h["max"] = value if h["max"] is None else max(h["max"], value)
+            h["samples"].append(value)
+
+    def register_gauge(self, name: str, fn):
+        """fn() trả về số hoặc dict, được gọi mỗi lần lấy snapshot."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {}
+            for key, h in self._histograms.items():
+                samples = sorted(h["samples"])
+                histograms[key] = {
+                    "count": h["count"],
+                    "avg": h["sum"] / h["count"],
+                    "p50": _percentile(samples, 0.50),
+                    "p95": _percentile(samples, 0.95),
+                    "max": h["max"],
+                }
+            gauges = dict(self._gauges)
+
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "gauges": {name: fn() for name, fn in gauges.items()},
+        }
+
+
+metrics = Metrics()
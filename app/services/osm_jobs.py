@@ -0,0 +1,273 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.database import SessionLocal
+from app.services.metrics import metrics
+from app.services.osm_provinces import provinces_variants
+from app.services.overpass_client import OSM_SYNC_CONCURRENCY, sync_provinces
+
+# ----------------------------
+# Config
+# ----------------------------
+OSM_JOB_POLL_SECONDS = float(os.getenv("OSM_JOB_POLL_SECONDS", "5"))
+# Job "running" không có heartbeat quá lâu → coi worker đã chết, worker khác nhận chạy tiếp
+OSM_JOB_LEASE_SECONDS = float(os.getenv("OSM_JOB_LEASE_SECONDS", "60"))
+
+
+# ----------------------------
+# Thao tác DB (sync, gọi qua run_in_threadpool)
+# ----------------------------
+def create_job(mode: str, province_names, concurrency: int, full_sync: bool = False):
+    db = SessionLocal()
+    try:
+        job = models.OsmSyncJob(mode=mode, status="queued", concurrency=concurrency, full_sync=full_sync)
+        job.provinces = [models.OsmSyncJobProvince(province=p, status="pending") for p in province_names]
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def claim_next_job(worker_id: str):
+    """Nhận 1 job queued (hoặc running nhưng hết lease). UPDATE có điều kiện → an toàn khi nhiều worker."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=OSM_JOB_LEASE_SECONDS)
+        claimable = or_(
+            models.OsmSyncJob.status == "queued",
+            (models.OsmSyncJob.status == "running") & (models.OsmSyncJob.heartbeat_at < stale),
+        )
+
+        candidates = db.query(models.OsmSyncJob.id).filter(claimable).order_by(models.OsmSyncJob.id).limit(5).all()
+        for (job_id,) in candidates:
+            claimed = db.execute(
+                update(models.OsmSyncJob)
+                .where(models.OsmSyncJob.id == job_id, claimable)
+                .values(status="running", worker_id=worker_id, heartbeat_at=now,
+                        started_at=func.coalesce(models.OsmSyncJob.started_at, now))
+            ).rowcount
+            db.commit()
+            if claimed:
+                return job_id
+        return None
+    finally:
+        db.close()
+
+
+def load_pending(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.get(models.OsmSyncJob, job_id)
+        pending = [
+            p.province for p in db.query(models.OsmSyncJobProvince.province)
+            .filter(models.OsmSyncJobProvince.job_id == job_id, models.OsmSyncJobProvince.status == "pending")
+            .order_by(models.OsmSyncJobProvince.id)
+        ]
+        return job.concurrency or 1, bool(job.full_sync), pending
+    finally:
+        db.close()
+
+
+def heartbeat(job_id: int, worker_id: str):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.OsmSyncJob)
+            .where(models.OsmSyncJob.id == job_id, models.OsmSyncJob.worker_id == worker_id)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def record_province(job_id: int, worker_id: str, result: dict):
+    db = SessionLocal()
+    try:
+        errors = result.get("errors")
+        # Tỉnh lỗi toàn bộ (không tải được biến thể nào) → failed; lỗi một phần vẫn tính done.
+        # fetch_province bỏ biến thể trùng trước khi tải → so với số biến thể khác nhau
+        variants = dict.fromkeys(provinces_variants.get(result["province"], [result["province"]]))
+        failed = bool(errors) and not (result["added"] or result["updated"]) and len(errors) >= len(variants)
+        db.execute(
+            update(models.OsmSyncJobProvince)
+            .where(models.OsmSyncJobProvince.job_id == job_id,
+                   models.OsmSyncJobProvince.province == result["province"])
+            .values(status="failed" if failed else "done", added=result["added"], updated=result["updated"],
+                    errors="\n".join(errors) if errors else None, finished_at=datetime.utcnow())
+        )
+        db.execute(
+            update(models.OsmSyncJob)
+            .where(models.OsmSyncJob.id == job_id, models.OsmSyncJob.worker_id == worker_id)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def finish_job(job_id: int, status: str, error: str = None):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.OsmSyncJob)
+            .where(models.OsmSyncJob.id == job_id)
+            .values(status=status, error=error, finished_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+    metrics.inc("osm_sync_jobs_total", status=status)
+
+
+def job_status(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.get(models.OsmSyncJob, job_id)
+        if job is None:
+            return None
+
+        rows = (
+            db.query(models.OsmSyncJobProvince)
+            .filter(models.OsmSyncJobProvince.job_id == job_id)
+            .order_by(models.OsmSyncJobProvince.id)
+            .all()
+        )
+        progress = {"total": len(rows), "pending": 0, "done": 0, "failed": 0}
+        for r in rows:
+            progress[r.status] = progress.get(r.status, 0) + 1
+
+        return {
+            "id": job.id,
+            "mode": job.mode,
+            "full_sync": bool(job.full_sync),
+            "status": job.status,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "heartbeat_at": job.heartbeat_at,
+            "finished_at": job.finished_at,
+            "total_added": sum(r.added or 0 for r in rows),
+            "total_updated": sum(r.updated or 0 for r in rows),
+            "progress": progress,
+            "provinces": [
+                {
+                    "province": r.province,
+                    "status": r.status,
+                    "added": r.added,
+                    "updated": r.updated,
+                    "errors": r.errors.split("\n") if r.errors else [],
+                    "finished_at": r.finished_at,
+                }
+                for r in rows
+            ],
+        }
+    finally:
+        db.close()
+
+
+# ----------------------------
+# Runner chạy nền trong event loop của app
+# ----------------------------
+class OsmJobRunner:
+    """
+    Vòng lặp nền: nhận job từ bảng osm_sync_jobs, chạy sync_provinces cho các tỉnh
+    còn pending, ghi tiến độ từng tỉnh + heartbeat. Process chết giữa chừng → job
+    hết lease và được chạy tiếp từ các tỉnh chưa xong (ở process này hoặc khác).
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._task = None
+        self._wakeup = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    def stop(self):
+        """Huỷ task nền; trả về task đã huỷ (hoặc None) để caller await nếu cần đợi dọn dẹp xong."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+        return task
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue(self, mode: str, province_names, concurrency: int = OSM_SYNC_CONCURRENCY, full_sync: bool = False):
+        # Chỉ ghi job + đánh thức runner nếu process này có chạy runner (OSM_JOB_RUNNER, main.py);
+        # không thì runner ở process khác sẽ nhận job khi poll
+        job_id = await run_in_threadpool(create_job, mode, province_names, concurrency, full_sync)
+        self.notify()
+        return job_id
+
+    async def _run_forever(self):
+        while True:
+            job_id = None
+            try:
+                job_id = await run_in_threadpool(claim_next_job, self.worker_id)
+                if job_id is not None:
+                    await self._run_job(job_id)
+                    continue
+            except Exception as e:
+                # Lỗi DB / mạng không được làm chết runner: ghi lỗi job, chờ 1 nhịp poll rồi chạy tiếp
+                print(f"❌ OSM job runner{f' (job #{job_id})' if job_id is not None else ''}: {e!r}")
+                if job_id is not None:
+                    await self._fail_job(job_id, e)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OSM_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fail_job(self, job_id: int, error: Exception):
+        try:
+            await run_in_threadpool(finish_job, job_id, "failed", repr(error))
+        except Exception as e:
+            # Không ghi được (DB vẫn lỗi): job giữ "running", hết lease sẽ được nhận chạy lại
+            print(f"❌ OSM job #{job_id}: không ghi được trạng thái failed: {e!r}")
+
+    async def _heartbeat_loop(self, job_id: int):
+        while True:
+            await asyncio.sleep(OSM_JOB_LEASE_SECONDS / 3)
+            await run_in_threadpool(heartbeat, job_id, self.worker_id)
+
+    async def _run_job(self, job_id: int):
+        concurrency, full_sync, pending = await run_in_threadpool(load_pending, job_id)
+        print(f"🚀 OSM job #{job_id}: {len(pending)} tỉnh còn lại ({self.worker_id})")
+
+        async def on_result(result):
+            await run_in_threadpool(record_province, job_id, self.worker_id, result)
+
+        beat = asyncio.create_task(self._heartbeat_loop(job_id))
+        try:
+            await sync_provinces(pending, provinces_variants, concurrency=concurrency,
+                                 on_result=on_result, incremental=not full_sync)
+        except asyncio.CancelledError:
+            # app tắt: để nguyên "running", hết lease sẽ được chạy tiếp
+            raise
+        except Exception as e:
+            print(f"❌ OSM job #{job_id} lỗi: {e!r}")
+            await self._fail_job(job_id, e)
+        else:
+            await run_in_threadpool(finish_job, job_id, "done")
+            print(f"🎉 OSM job #{job_id} hoàn tất")
+        finally:
+            beat.cancel()
+
+
+osm_job_runner = OsmJobRunner()
@@ -0,0 +1,50 @@
+# =========================================================
+# 🗺️ Danh sách 34 tỉnh/thành sau sáp nhập
+# =========================================================
+provinces = [
+    "TP Hà Nội", "TP Huế", "Quảng Ninh", "Cao Bằng", "Lạng Sơn", "Lai Châu", "Điện Biên", "Sơn La",
+    "Thanh Hóa", "Nghệ An", "Hà Tĩnh", "Tuyên Quang", "Lào Cai", "Thái Nguyên", "Phú Thọ", "Bắc Ninh",
+    "Hưng Yên", "TP Hải Phòng", "Ninh Bình", "Quảng Trị", "TP Đà Nẵng", "Quảng Ngãi", "Gia Lai",
+    "Khánh Hòa", "Lâm Đồng", "Đắk Lắk", "TPHCM", "Đồng Nai", "Tây Ninh", "TP Cần Thơ",
+    "Vĩnh Long", "Đồng Tháp", "Cà Mau", "An Giang"
+]
+
+# =========================================================
+# 🌐 Biến thể tên để tìm dữ liệu OSM chính xác hơn
+# =========================================================
+provinces_variants = {
+    "TP Hà Nội": ["Hà Nội", "Ha Noi"],
+    "TP Huế": ["Huế", "Thừa Thiên Huế", "Hue", "Thua Thien Hue"],
+    "Quảng Ninh": ["Quảng Ninh", "Quang Ninh"],
+    "Cao Bằng": ["Cao Bằng", "Cao Bang"],
+    "Lạng Sơn": ["Lạng Sơn", "Lang Son"],
+    "Lai Châu": ["Lai Châu", "Lai Chau"],
+    "Điện Biên": ["Điện Biên", "Dien Bien"],
+    "Sơn La": ["Sơn La", "Son La"],
+    "Thanh Hóa": ["Thanh Hóa", "Thanh Hoa"],
+    "Nghệ An": ["Nghệ An", "Nghe An"],
+    "Hà Tĩnh": ["Hà Tĩnh", "Ha Tinh"],
+    "Tuyên Quang": ["Tuyên Quang", "Hà Giang", "Ha Giang", "Tuyen Quang"],
+    "Lào Cai": ["Lào Cai", "Yên Bái", "Lao Cai", "Yen Bai"],
+    "Thái Nguyên": ["Thái Nguyên", "Bắc Kạn", "Thai Nguyen", "Bac Kan"],
+    "Phú Thọ": ["Phú Thọ", "Hòa Bình", "Vĩnh Phúc", "Phu Tho", "Hoa Binh", "Vinh Phuc"],
+    "Bắc Ninh": ["Bắc Ninh", "Bắc Giang", "Bac Ninh", "Bac Giang"],
+    "Hưng Yên": ["Hưng Yên", "Thái Bình", "Hung Yen", "Thai Binh"],
+    "TP Hải Phòng": ["Hải Phòng", "Hải Dương", "Hai Phong", "Hai Duong"],
+    "Ninh Bình": ["Ninh Bình", "Hà Nam", "Nam Định", "Ninh Binh", "Ha Nam", "Nam Dinh"],
+    "Quảng Trị": ["Quảng Trị", "Quảng Bình", "Quang Tri", "Quang Binh"],
+    "TP Đà Nẵng": ["Đà Nẵng", "Quảng Nam", "Da Nang", "Quang Nam"],
+    "Quảng Ngãi": ["Quảng Ngãi", "Kon Tum", "Quang Ngai", "Kon Tum"],
+    "Gia Lai": ["Gia Lai", "Bình Định", "Gia Lai", "Binh Dinh"],
+    "Khánh Hòa": ["Khánh Hòa", "Ninh Thuận", "Khanh Hoa", "Ninh Thuan"],
+    "Lâm Đồng": ["Lâm Đồng", "Đắk Nông", "Bình Thuận", "Lam Dong", "Dak Nong", "Binh Thuan"],
+    "Đắk Lắk": ["Đắk Lắk", "Phú Yên", "Dak Lak", "Phu Yen"],
+    "TPHCM": ["TP Hồ Chí Minh", "Thành phố Hồ Chí Minh", "Ho Chi Minh City", "Bình Dương", "Bà Rịa - Vũng Tàu", "Ba Ria - Vung Tau", "Binh Duong"],
+    "Đồng Nai": ["Đồng Nai", "Bình Phước", "Dong Nai", "Binh Phuoc"],
+    "Tây Ninh": ["Tây Ninh", "Long An", "Tay Ninh", "Long An"],
+    "TP Cần Thơ": ["Cần Thơ", "Hậu Giang", "Sóc Trăng", "Can Tho", "Hau Giang", "Soc Trang"],
+    "Vĩnh Long": ["Vĩnh Long", "Bến Tre", "Trà Vinh", "Vinh Long", "Ben Tre", "Tra Vinh"],
+    "Đồng Tháp": ["Đồng Tháp", "Tiền Giang", "Dong Thap", "Tien Giang"],
+    "Cà Mau": ["Cà Mau", "Bạc Liêu", "Ca Mau", "Bac Lieu"],
+    "An Giang": ["An Giang", "Kiên Giang", "An Giang", "Kien Giang"],
+}
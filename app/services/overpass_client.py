@@ -0,0 +1,311 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+from app.services.cache import catalog_cache
+from app.services.hospital_ingest import load_checkpoints, save_checkpoint, upsert_province_hospitals
+from app.services.metrics import metrics
+from app.services.search_index import doctor_search_index
+
+# ----------------------------
+# Config
+# ----------------------------
+DEFAULT_OVERPASS_URLS = [
+    "https://z.overpass-api.de/api/interpreter",
+    "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
+    "https://overpass.nchc.org.tw/api/interpreter",
+    "https://overpass.openstreetmap.fr/api/interpreter",
+]
+# Ghi đè danh sách mirror, ví dụ trỏ về stub server local: OVERPASS_URLS=http://127.0.0.1:9000/api/interpreter
+OVERPASS_URLS = [u.strip() for u in os.getenv("OVERPASS_URLS", "").split(",") if u.strip()] or DEFAULT_OVERPASS_URLS
+
+OVERPASS_RATE_PER_MIRROR = float(os.getenv("OVERPASS_RATE_PER_MIRROR", "1"))  # request / giây / mirror
+OVERPASS_BURST = float(os.getenv("OVERPASS_BURST", "2"))
+OVERPASS_TIMEOUT = float(os.getenv("OVERPASS_TIMEOUT", "30"))
+OVERPASS_MAX_ATTEMPTS = int(os.getenv("OVERPASS_MAX_ATTEMPTS", "4"))
+OVERPASS_BREAKER_THRESHOLD = int(os.getenv("OVERPASS_BREAKER_THRESHOLD", "3"))
+OVERPASS_BREAKER_COOLDOWN = float(os.getenv("OVERPASS_BREAKER_COOLDOWN", "60"))
+OSM_SYNC_CONCURRENCY = int(os.getenv("OSM_SYNC_CONCURRENCY", "6"))
+
+EWMA_ALPHA = 0.3
+OSM_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class OverpassError(Exception):
+    pass
+
+
+def build_query(variant: str, since: datetime = None):
+    """`since` → chỉ lấy element thay đổi sau mốc đó (filter newer:). `out meta` để có version."""
+    newer = f'(newer:"{since.strftime(OSM_TIMESTAMP_FORMAT)}")' if since else ""
+    return f"""
+    [out:json][timeout:25];
+    (
+        node["amenity"="hospital"]["addr:country"="VN"]["addr:city"~"{variant}", i]{newer};
+        way["amenity"="hospital"]["addr:city"~"{variant}", i]{newer};
+        relation["amenity"="hospital"]["addr:city"~"{variant}", i]{newer};
+    );
+    out center meta;
+    """
+
+
+def parse_osm_base(data: dict):
+    """Mốc dữ liệu của response (osm3s.timestamp_osm_base), None nếu không có."""
+    value = data.get("osm3s", {}).get("timestamp_osm_base")
+    try:
+        return datetime.strptime(value, OSM_TIMESTAMP_FORMAT) if value else None
+    except ValueError:
+        return None
+
+
+# ----------------------------
+# Rate limit + sức khoẻ từng mirror
+# ----------------------------
+class TokenBucket:
+    """
+    Token bucket kiểu "đặt chỗ": mỗi lần acquire trừ 1 token (có thể âm) rồi ngủ
+    đúng phần thiếu. Chỉ dùng trong 1 event loop nên không cần lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    async def acquire(self):
+        self._refill()
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class Mirror:
+    def __init__(self, url: str, rate: float = OVERPASS_RATE_PER_MIRROR, burst: float = OVERPASS_BURST):
+        self.url = url
+        self.bucket = TokenBucket(rate, burst)
+        self.latency_ewma = None
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def is_open(self):
+        """Circuit breaker đang mở (tạm bỏ qua mirror)? Hết cooldown → cho thử lại."""
+        return time.monotonic() < self.open_until
+
+    def score(self):
+        # Ước lượng thời gian chờ + thời gian trả lời; mirror chưa đo được ưu tiên thử
+        return self.bucket.wait_time() + (self.latency_ewma or 0.0)
+
+    def record_success(self, latency: float):
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency_ewma
+        )
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= OVERPASS_BREAKER_THRESHOLD:
+            self.open_until = time.monotonic() + OVERPASS_BREAKER_COOLDOWN
+
+    def stats(self):
+        return {
+            "latency_ewma": None if self.latency_ewma is None else round(self.latency_ewma, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "open": self.is_open(),
+        }
+
+
+mirrors = [Mirror(url) for url in OVERPASS_URLS]
+metrics.register_gauge("overpass_mirrors", lambda: {m.url: m.stats() for m in mirrors})
+
+
+def pick_mirror(exclude=()):
+    candidates = [m for m in mirrors if not m.is_open() and m.url not in exclude]
+    if not candidates:
+        # mọi mirror đều lỗi / đã thử → lấy mirror sắp hết cooldown nhất
+        candidates = [m for m in mirrors if m.url not in exclude] or mirrors
+        return min(candidates, key=lambda m: m.open_until)
+    return min(candidates, key=Mirror.score)
+
+
+# ----------------------------
+# HTTP client
+# ----------------------------
+class OverpassClient:
+    """httpx.AsyncClient dùng chung (pool kết nối) cho 1 lần đồng bộ."""
+
+    def __init__(self, max_connections: int = OSM_SYNC_CONCURRENCY * 2, timeout: float = OVERPASS_TIMEOUT):
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def fetch(self, query: str):
+        """
+        Chạy 1 query Overpass, tự chọn mirror và thử lại mirror khác khi lỗi.
+        Trả về (elements, osm_base).
+        """
+        tried = set()
+        last_error = None
+        for attempt in range(OVERPASS_MAX_ATTEMPTS):
+            mirror = pick_mirror(exclude=tried)
+            tried.add(mirror.url)
+            if len(tried) == len(mirrors):
+                tried.clear()
+
+            await mirror.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                resp = await self.client.post(mirror.url, data={"data": query})
+                if resp.status_code != 200:
+                    raise OverpassError(f"HTTP {resp.status_code}")
+                data = resp.json()
+            except (httpx.HTTPError, ValueError, OverpassError) as e:
+                mirror.record_failure()
+                metrics.inc("overpass_requests_total", mirror=mirror.url, outcome="error")
+                last_error = e
+                print(f"❌ Overpass {mirror.url}: {e!r}")
+                # backoff ngắn, tăng dần; các mirror khác vẫn được dùng song song
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 8))
+                continue
+
+            latency = time.perf_counter() - started
+            mirror.record_success(latency)
+            metrics.inc("overpass_requests_total", mirror=mirror.url, outcome="ok")
+            metrics.observe("overpass_request_seconds", latency, mirror=mirror.url)
+            metrics.inc("overpass_response_bytes_total", len(resp.content))
+            return data.get("elements", []), parse_osm_base(data)
+
+        raise OverpassError(f"Overpass failed after {OVERPASS_MAX_ATTEMPTS} attempts: {last_error!r}")
+
+    async def fetch_province(self, variants, since: datetime = None):
+        """
+        Gộp kết quả của mọi biến thể tên tỉnh, bỏ trùng theo (type, id).
+        Trả về (elements, errors, osm_base) — osm_base là mốc cũ nhất trong các response.
+        """
+        merged = {}
+        errors = []
+        bases = []
+        for variant in dict.fromkeys(variants):
+            try:
+                elements, osm_base = await self.fetch(build_query(variant, since))
+            except OverpassError as e:
+                errors.append(f"{variant}: {e}")
+                continue
+            if osm_base is not None:
+                bases.append(osm_base)
+            for el in elements:
+                merged.setdefault((el.get("type"), el.get("id")), el)
+        return list(merged.values()), errors, min(bases) if bases else None
+
+
+# ----------------------------
+# Engine đồng bộ: N task tải song song → 1 task ghi DB
+# ----------------------------
+async def _writer(queue: asyncio.Queue, session_factory, on_result):
+    """Task duy nhất giữ Session; mọi thao tác DB chạy tuần tự trên 1 thread riêng."""
+    loop = asyncio.get_running_loop()
+    results = []
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="osm-writer") as executor:
+        db = await loop.run_in_executor(executor, session_factory)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                province, elements, errors, osm_base = item
+
+                result = {"province": province, "added": 0, "updated": 0}
+                try:
+                    if elements:
+                        counts = await loop.run_in_executor(executor, upsert_province_hospitals, db, province, elements)
+                        result.update(added=counts["added"], updated=counts["updated"])
+                        if counts["added"] or counts["updated"]:
+                            await catalog_cache.invalidate("hospitals")
+                        if counts["updated"]:
+                            # Tên bệnh viện nằm trong index tìm kiếm bác sĩ
+                            doctor_search_index.invalidate()
+                    # Chỉ lưu checkpoint khi mọi biến thể đều tải được
+                    if osm_base is not None and not errors:
+                        await loop.run_in_executor(executor, save_checkpoint, db, province, osm_base)
+                except Exception as e:
+                    await loop.run_in_executor(executor, db.rollback)
+                    errors = errors + [f"db: {e}"]
+                if errors:
+                    result["errors"] = errors
+
+                print(f"✅ {province}: +{result['added']} bệnh viện, cập nhật {result['updated']}"
+                      + (f" ({len(errors)} lỗi)" if errors else ""))
+                results.append(result)
+                if on_result is not None:
+                    await on_result(result)
+        finally:
+            await loop.run_in_executor(executor, db.close)
+    return results
+
+
+def _load_checkpoints(session_factory, province_names):
+    db = session_factory()
+    try:
+        return load_checkpoints(db, province_names)
+    finally:
+        db.close()
+
+
+async def sync_provinces(provinces, variants_map, concurrency: int = OSM_SYNC_CONCURRENCY,
+                         session_factory=None, on_result=None, incremental: bool = True):
+    """
+    Đồng bộ danh sách tỉnh: tải Overpass song song (tối đa `concurrency` tỉnh),
+    đẩy kết quả qua hàng đợi có giới hạn cho 1 writer duy nhất.
+    `incremental` → tỉnh đã có checkpoint chỉ tải element thay đổi sau checkpoint.
+    `on_result(result)` (async, tuỳ chọn) được gọi sau khi ghi xong mỗi tỉnh.
+    """
+    if session_factory is None:
+        from app.database import SessionLocal
+        session_factory = SessionLocal
+
+    checkpoints = {}
+    if incremental:
+        checkpoints = await asyncio.get_running_loop().run_in_executor(
+            None, _load_checkpoints, session_factory, provinces
+        )
+
+    queue = asyncio.Queue(maxsize=max(1, concurrency))
+    writer = asyncio.create_task(_writer(queue, session_factory, on_result))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async with OverpassClient() as client:
+        async def fetch_one(province):
+            async with semaphore:
+                print(f"🛰️ Bắt đầu đồng bộ {province}...")
+                elements, errors, osm_base = await client.fetch_province(
+                    variants_map.get(province, [province]), since=checkpoints.get(province)
+                )
+            await queue.put((province, elements, errors, osm_base))
+
+        try:
+            await asyncio.gather(*(fetch_one(p) for p in provinces))
+        finally:
+            await queue.put(None)
+            results = await writer
+    return results
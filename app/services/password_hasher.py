@@ -0,0 +1,113 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "process")  # process | thread
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Số request hash được phép xếp hàng thêm khi mọi worker đang bận; vượt quá → 503 ngay
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+HASH_RETRY_AFTER = os.getenv("HASH_RETRY_AFTER", "1")
+
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+
+# ----------------------------
+# Hàm chạy trong worker (phải ở module-level để pickle được)
+# ----------------------------
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    """(ok, hash_mới) — hash_mới khác None khi hash cũ dùng scheme deprecated (bcrypt)."""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+def _noop():
+    return None
+
+
+class PasswordHasher:
+    """
+    Executor riêng cho argon2/bcrypt, tách khỏi threadpool chung của FastAPI.
+    Process pool (spawn) để argon2 chạy song song trên nhiều core; giới hạn
+    tổng số việc đang chạy + chờ, vượt ngưỡng thì từ chối bằng 503.
+    """
+
+    def __init__(self, workers: int = HASH_POOL_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT, kind: str = HASH_POOL_KIND):
+        self.workers = max(1, workers)
+        self.limit = self.workers + max(0, queue_limit)
+        self.kind = kind
+        self.in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "thread":
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+                    else:
+                        # spawn: không fork process đang có event loop + thread
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                        )
+        return self._executor
+
+    def warm_up(self):
+        """Khởi động sẵn các worker để request login đầu tiên không phải chờ spawn."""
+        executor = self._get_executor()
+        for future in [executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    async def _run(self, op: str, fn, *args):
+        if self.in_flight >= self.limit:
+            metrics.inc("hash_pool_rejected_total", op=op)
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": HASH_RETRY_AFTER},
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            metrics.observe("password_hash_seconds", time.perf_counter() - started, op=op)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        return await self._run("verify", _verify_and_update, password, hashed_password)
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+        }
+
+
+password_hasher = PasswordHasher()
+metrics.register_gauge("hash_pool", password_hasher.stats)
@@ -0,0 +1,69 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from cachetools import TTLCache
+
+from app.services.metrics import metrics
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Thông tin tối thiểu của user đang đăng nhập, đủ cho phân quyền ở các router."""
+    id: int
+    username: str
+    role: int
+    is_active: bool
+    patient_id: Optional[int] = None
+    doctor_id: Optional[int] = None
+
+
+class PrincipalCache:
+    """
+    Cache principal theo `sub` của JWT, TTL ngắn. Cache nằm trong từng process nên
+    với nhiều worker, thay đổi ở worker khác chỉ có hiệu lực sau tối đa TTL giây.
+    """
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self._lock = threading.Lock()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl) if ttl > 0 else None
+
+    def get(self, subject: str) -> Optional[Principal]:
+        if self._cache is None:
+            return None
+        with self._lock:
+            principal = self._cache.get(subject)
+        metrics.inc("principal_cache_hits_total" if principal else "principal_cache_misses_total")
+        return principal
+
+    def put(self, principal: Principal):
+        if self._cache is None:
+            return
+        with self._lock:
+            self._cache[principal.username] = principal
+
+    def invalidate(self, subject: str):
+        if self._cache is None:
+            return
+        with self._lock:
+            self._cache.pop(subject, None)
+
+    def invalidate_user(self, user_id: int):
+        if self._cache is None:
+            return
+        with self._lock:
+            for subject in [s for s, p in self._cache.items() if p.id == user_id]:
+                self._cache.pop(subject, None)
+
+    def clear(self):
+        if self._cache is None:
+            return
+        with self._lock:
+            self._cache.clear()
+
+
+principal_cache = PrincipalCache()
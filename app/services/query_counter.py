@@ -0,0 +1,99 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# Số câu SQL tối đa cho 1 request (0 = tắt đếm). Đặt khi chạy thử / CI để bắt N+1 query.
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+# 1 → request vượt ngân sách trả 500 thay vì chỉ in cảnh báo + tăng metric
+SQL_QUERY_BUDGET_STRICT = os.getenv("SQL_QUERY_BUDGET_STRICT", "0") == "1"
+
+_current = ContextVar("sql_query_counter", default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+@contextmanager
+def count_queries():
+    """
+    Đếm câu SQL chạy trong khối `with` (cả Session sync trong threadpool lẫn AsyncSession:
+    threadpool / greenlet của SQLAlchemy kế thừa context của request).
+    """
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+def install(*engines):
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _on_execute):
+            event.listen(engine, "before_cursor_execute", _on_execute)
+
+
+# ----------------------------
+# Middleware: ngân sách số câu SQL mỗi request
+# ----------------------------
+class QueryBudgetMiddleware:
+    """
+    Gắn header X-SQL-Queries vào response; request chạy quá `budget` câu SQL → cảnh báo
+    + metric sql_query_budget_exceeded_total, hoặc 500 khi strict (dùng khi test).
+    """
+
+    def __init__(self, app, budget: int = SQL_QUERY_BUDGET, strict: bool = SQL_QUERY_BUDGET_STRICT):
+        self.app = app
+        self.budget = budget
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.budget <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        error_body = None  # strict + vượt ngân sách: body lỗi thay cho body của route
+
+        async def send_with_count(message):
+            nonlocal error_body
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if counter.count > self.budget:
+                    # Route đã match ("/api/doctors/{doctor_id}") → label metric không nổ theo id
+                    path = getattr(scope.get("route"), "path", scope["path"])
+                    metrics.inc("sql_query_budget_exceeded_total", path=path)
+                    print(f"⚠️ {scope['method']} {path}: {counter.count} câu SQL (ngân sách {self.budget})")
+                    if self.strict:
+                        error = JSONResponse(status_code=500, content={
+                            "detail": f"SQL query budget exceeded: {counter.count} > {self.budget}",
+                            "statements": counter.statements,
+                        })
+                        error_body = error.body
+                        message, headers = {"type": "http.response.start", "status": 500}, list(error.raw_headers)
+                message = {**message, "headers": [*headers, (b"x-sql-queries", str(counter.count).encode())]}
+            elif message["type"] == "http.response.body" and error_body is not None:
+                if error_body == b"":
+                    return  # đã gửi body lỗi, bỏ phần còn lại
+                message, error_body = {"type": "http.response.body", "body": error_body}, b""
+            await send(message)
+
+        with count_queries() as counter:
+            await self.app(scope, receive, send_with_count)
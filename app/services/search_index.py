@@ -0,0 +1,359 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.database import SessionLocal
+from app.services.metrics import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# Rebuild toàn bộ định kỳ để nhận thay đổi từ worker/process khác (0 = không bao giờ)
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "600"))
+# Độ giống trigram (Jaccard 0..1) tối thiểu để 1 từ gõ sai khớp với từ trong từ điển
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.4"))
+# Số từ tối đa khớp theo tiền tố cho mỗi từ của câu tìm kiếm ("user1" → user1, user10, ...)
+SEARCH_MAX_VARIANTS = int(os.getenv("SEARCH_MAX_VARIANTS", "50"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(*values):
+    """"Nguyễn Văn Đức", "Tim mạch" → "nguyen van duc tim mach": bỏ dấu, đ → d, chữ thường, chỉ giữ chữ / số."""
+    joined = " ".join(v for v in values if v)
+    decomposed = unicodedata.normalize("NFD", joined.replace("đ", "d").replace("Đ", "D"))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", stripped.lower()).strip()
+
+
+def trigrams(normalized: str):
+    """Trigram theo từng từ, đệm 2 khoảng trắng đầu + 1 cuối như pg_trgm: "an" → {"  a", " an", "an "}."""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TextSearchIndex:
+    """
+    Inverted index theo từ (đã normalize) trong bộ nhớ cho tìm kiếm không dấu, gần đúng.
+
+    `postings`: từ → tập id; `vocab`: các từ đã sắp xếp (tìm theo tiền tố bằng bisect);
+    `vocab_grams`: trigram → các từ chứa nó (sửa lỗi gõ, chỉ quét từ điển chứ không quét
+    văn bản). Mỗi từ của câu tìm kiếm khớp: đúng từ (1.0), tiền tố ("hoa" → "hoai", 0.8–1.0)
+    hoặc gần giống khi không có từ trùng ("nguyn" → "nguyen", 0.8 × độ giống trigram).
+    Kết quả phải khớp mọi từ; điểm = trung bình điểm các từ, hoà điểm → văn bản ngắn hơn trước.
+    """
+
+    def __init__(self, name: str, refresh_seconds: float = SEARCH_INDEX_REFRESH_SECONDS):
+        self.name = name
+        self.refresh_seconds = refresh_seconds
+        self.entries = {}
+        self.postings = {}
+        self.vocab = []
+        self.vocab_grams = defaultdict(set)
+        self.loaded_at = None
+        self._lock = threading.RLock()
+
+    # ----------------------------
+    # Cập nhật
+    # ----------------------------
+    def upsert(self, id, normalized: str, payload=None):
+        with self._lock:
+            self._remove(id)
+            tokens = tuple(normalized.split())
+            self.entries[id] = (tokens, payload or {"id": id})
+            for token in set(tokens):
+                bucket = self.postings.get(token)
+                if bucket is None:
+                    bucket = self.postings[token] = set()
+                    bisect.insort(self.vocab, token)
+                    for gram in trigrams(token):
+                        self.vocab_grams[gram].add(token)
+                bucket.add(id)
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        old = self.entries.pop(id, None)
+        if old is None:
+            return
+        for token in set(old[0]):
+            bucket = self.postings[token]
+            bucket.discard(id)
+            if bucket:
+                continue
+            del self.postings[token]
+            del self.vocab[bisect.bisect_left(self.vocab, token)]
+            for gram in trigrams(token):
+                self.vocab_grams[gram].discard(token)
+
+    def rebuild(self, rows):
+        """rows: iterable (id, text đã normalize, payload). Dựng index mới rồi mới thay thế."""
+        started = time.perf_counter()
+        entries = {}
+        postings = defaultdict(set)
+        for id, normalized, payload in rows:
+            tokens = tuple((normalized or "").split())
+            entries[id] = (tokens, payload)
+            for token in tokens:
+                postings[token].add(id)
+
+        vocab_grams = defaultdict(set)
+        for token in postings:
+            for gram in trigrams(token):
+                vocab_grams[gram].add(token)
+
+        with self._lock:
+            self.entries = entries
+            self.postings = dict(postings)
+            self.vocab = sorted(postings)
+            self.vocab_grams = vocab_grams
+            self.loaded_at = time.monotonic()
+        metrics.observe(f"{self.name}_rebuild_seconds", time.perf_counter() - started)
+
+    def ensure_fresh(self, load_rows):
+        """Rebuild khi chưa load hoặc đã quá SEARCH_INDEX_REFRESH_SECONDS."""
+        loaded_at = self.loaded_at
+        if loaded_at is not None and (
+            self.refresh_seconds <= 0 or time.monotonic() - loaded_at < self.refresh_seconds
+        ):
+            return
+        with self._lock:
+            if self.loaded_at == loaded_at:
+                self.rebuild(load_rows())
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    # ----------------------------
+    # Truy vấn
+    # ----------------------------
+    def _variants(self, word: str):
+        """Các từ trong từ điển khớp với `word` → {từ: điểm}."""
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+
+        start = bisect.bisect_left(self.vocab, word)
+        for token in self.vocab[start:start + SEARCH_MAX_VARIANTS + 1]:
+            if not token.startswith(word):
+                break
+            if token != word:
+                matches[token] = 0.8 + 0.2 * len(word) / len(token)
+
+        if word not in self.postings and len(word) >= 3:
+            # Sửa lỗi gõ: Jaccard trigram >= ngưỡng ⇒ có ít nhất `needed` trigram chung
+            # ⇒ phải chứa 1 trong (n - needed + 1) trigram hiếm nhất (nguyên lý chuồng bồ câu)
+            grams = trigrams(word)
+            needed = max(1, math.ceil(SEARCH_MIN_SIMILARITY * len(grams)))
+            rarest = sorted(grams, key=lambda g: len(self.vocab_grams.get(g, ())))[:len(grams) - needed + 1]
+            for token in set().union(*(self.vocab_grams.get(g, ()) for g in rarest)):
+                token_grams = trigrams(token)
+                similarity = len(grams & token_grams) / len(grams | token_grams)
+                if similarity >= SEARCH_MIN_SIMILARITY:
+                    matches[token] = max(matches.get(token, 0.0), 0.8 * similarity)
+        return matches
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, where=None):
+        """
+        → (tổng số kết quả, list (score, payload) của trang [offset, offset + limit)).
+        `where(payload)` (tuỳ chọn) lọc thêm trước khi xếp hạng.
+        """
+        started = time.perf_counter()
+        words = list(dict.fromkeys(normalize_text(query).split()))
+        if not words:
+            return 0, []
+
+        with self._lock:
+            per_word = [self._variants(word) for word in words]
+            matched = [set().union(*(self.postings[t] for t in variants)) for variants in per_word]
+            candidates = set.intersection(*sorted(matched, key=len))
+            if where is not None:
+                candidates = {id for id in candidates if where(self.entries[id][1])}
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for variants in per_word:
+                # Điểm tăng dần → từ khớp tốt nhất của mỗi văn bản ghi đè sau cùng
+                best = {}
+                for token, score in sorted(variants.items(), key=lambda kv: kv[1]):
+                    best.update(dict.fromkeys(self.postings[token] & candidates, score))
+                for id, score in best.items():
+                    scores[id] += score / len(words)
+
+            entries = self.entries
+            top = heapq.nsmallest(offset + limit, scores.items(),
+                                  key=lambda kv: (-kv[1], len(entries[kv[0]][0]), kv[0]))
+            page = [(round(score, 4), entries[id][1]) for id, score in top[offset:]]
+
+        metrics.observe(f"{self.name}_search_seconds", time.perf_counter() - started)
+        return len(scores), page
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "words": len(self.vocab),
+            "age_seconds": None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1),
+        }
+
+
+user_search_index = TextSearchIndex("user_search_index")
+doctor_search_index = TextSearchIndex("doctor_search_index")
+metrics.register_gauge("user_search_index", user_search_index.stats)
+metrics.register_gauge("doctor_search_index", doctor_search_index.stats)
+
+
+# ----------------------------
+# Nội dung được index
+# ----------------------------
+def user_search_text(user):
+    local_part = (user.email or "").split("@")[0]
+    # username thường trùng phần trước @ của email → bỏ từ lặp
+    return " ".join(dict.fromkeys(normalize_text(user.full_name, user.username, local_part).split()))
+
+
+def doctor_search_text(doctor):
+    return normalize_text(doctor.full_name, doctor.specialty)
+
+
+def _load(loader):
+    db = SessionLocal()
+    try:
+        return loader(db)
+    finally:
+        db.close()
+
+
+def load_user_rows(db):
+    rows = db.query(models.User.id, models.User.search_text, models.User.role).all()
+    return [(r.id, r.search_text or "", {"id": r.id, "role": r.role}) for r in rows]
+
+
+def load_doctor_rows(db):
+    # Tên bệnh viện chỉ có ở bảng hospitals → ghép vào văn bản index lúc dựng
+    rows = (
+        db.query(models.Doctor.id, models.Doctor.search_text, models.Doctor.specialty,
+                 models.Doctor.hospital_id, models.Hospital.name.label("hospital_name"))
+        .outerjoin(models.Hospital, models.Hospital.id == models.Doctor.hospital_id)
+        .all()
+    )
+    return [
+        (r.id, normalize_text(r.search_text, r.hospital_name),
+         {"id": r.id, "specialty": normalize_text(r.specialty), "hospital_id": r.hospital_id})
+        for r in rows
+    ]
+
+
+def search_users(query: str, limit: int, offset: int = 0):
+    """Sync (gọi trong threadpool): dựng index nếu cần rồi tìm → (total, [(score, payload)])."""
+    user_search_index.ensure_fresh(lambda: _load(load_user_rows))
+    return user_search_index.search(query, limit, offset)
+
+
+def search_doctors(query: str, limit: int, offset: int = 0, specialty: str | None = None,
+                   hospital_id: int | None = None):
+    doctor_search_index.ensure_fresh(lambda: _load(load_doctor_rows))
+    specialty = normalize_text(specialty) if specialty else None
+
+    def where(payload):
+        return ((specialty is None or specialty in payload["specialty"])
+                and (hospital_id is None or payload["hospital_id"] == hospital_id))
+
+    return doctor_search_index.search(query, limit, offset, where=where if specialty or hospital_id else None)
+
+
+# ----------------------------
+# Giữ search_text + index đồng bộ khi ghi qua ORM
+# ----------------------------
+@event.listens_for(models.User, "before_insert")
+@event.listens_for(models.User, "before_update")
+def _set_user_search_text(mapper, connection, target):
+    target.search_text = user_search_text(target)
+
+
+@event.listens_for(models.Doctor, "before_insert")
+@event.listens_for(models.Doctor, "before_update")
+def _set_doctor_search_text(mapper, connection, target):
+    target.search_text = doctor_search_text(target)
+
+
+# Thay đổi index ghi tạm vào session.info lúc flush, chỉ áp dụng khi transaction commit
+# (rollback → bỏ, index không có dòng "ma" chưa từng được lưu)
+_PENDING_KEY = "search_index_ops"
+
+
+def _stage(target, op):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, []).append(op)
+
+
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_update")
+def _index_user(mapper, connection, target):
+    _stage(target, ("upsert_user", target.id, target.search_text, {"id": target.id, "role": target.role}))
+
+
+@event.listens_for(models.User, "after_delete")
+def _unindex_user(mapper, connection, target):
+    _stage(target, ("remove_user", target.id))
+
+
+@event.listens_for(models.Doctor, "after_insert")
+@event.listens_for(models.Doctor, "after_update")
+@event.listens_for(models.Doctor, "after_delete")
+def _doctor_changed(mapper, connection, target):
+    # Cần tên bệnh viện (bảng khác) → dựng lại khi tìm kiếm lần tới; số bác sĩ nhỏ nên rẻ
+    _stage(target, ("invalidate_doctors",))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged(session):
+    for op in session.info.pop(_PENDING_KEY, ()):
+        if op[0] == "upsert_user":
+            if user_search_index.loaded_at is not None:
+                user_search_index.upsert(*op[1:])
+        elif op[0] == "remove_user":
+            user_search_index.remove(op[1])
+        else:
+            doctor_search_index.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ----------------------------
+# Khởi động: điền search_text cho dữ liệu tạo trước khi có cột
+# ----------------------------
+def backfill_search_text(db, batch_size: int = 1000):
+    """Điền search_text cho các dòng tạo trước khi có cột (search_text IS NULL)."""
+    total = 0
+    for model, make_text in ((models.User, user_search_text), (models.Doctor, doctor_search_text)):
+        while True:
+            rows = db.query(model).filter(model.search_text.is_(None)).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                row.search_text = make_text(row) or ""
+            db.commit()
+            total += len(rows)
+    if total:
+        print(f"🔎 Điền search_text cho {total} dòng")
+    return total
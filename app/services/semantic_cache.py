@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services.metrics import metrics
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class SemanticCache:
+    """
+    Cache câu trả lời theo 2 tầng:
+      - exact: câu hỏi (đã chuẩn hoá khoảng trắng / chữ thường) trùng khớp
+      - semantic: cosine(embedding câu hỏi, embedding đã lưu) >= threshold
+    Có TTL, loại bỏ theo LRU khi vượt max_size. max_size=0 → tắt cache.
+    """
+
+    def __init__(self, name: str, max_size: int = 1000, ttl: float = 3600, threshold: float = 0.92):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        # key → (slot, reply, expires_at), thứ tự = LRU (cũ nhất ở đầu)
+        self._entries = OrderedDict()
+        # Ma trận embedding đã chuẩn hoá, mỗi entry chiếm 1 slot
+        self._vectors = None
+        self._slot_keys = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+
+        self._lookups = 0
+        self._exact_hits = 0
+        self._semantic_hits = 0
+
+        metrics.register_gauge(f"{name}_cache", self.stats)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    # ---------- lookup ----------
+    def get_exact(self, text: str):
+        if not self.enabled:
+            return None
+        key = normalize_query(text)
+        with self._lock:
+            self._lookups += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._exact_hits += 1
+        metrics.inc(f"{self.name}_cache_hits_total", kind="exact")
+        return entry[1]
+
+    def get_similar(self, vector):
+        """Gọi sau get_exact (không đếm thêm lookup)."""
+        if not self.enabled:
+            return None
+        vec = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            while self._entries and self._vectors is not None:
+                scores = self._vectors @ vec
+                slot = int(np.argmax(scores))
+                key = self._slot_keys[slot]
+                if key is None or scores[slot] < self.threshold:
+                    break
+                entry = self._entries[key]
+                if entry[2] < now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                self._semantic_hits += 1
+                metrics.inc(f"{self.name}_cache_hits_total", kind="semantic")
+                return entry[1]
+        metrics.inc(f"{self.name}_cache_misses_total")
+        return None
+
+    # ---------- store ----------
+    def put(self, text: str, vector, reply: str):
+        if not self.enabled:
+            return
+        key = normalize_query(text)
+        vec = self._unit(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vec.shape[0]), dtype=np.float32)
+            if key in self._entries:
+                self._remove(key)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vec
+            self._slot_keys[slot] = key
+            self._entries[key] = (slot, reply, time.monotonic() + self.ttl)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._lookups or 1
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "lookups": self._lookups,
+                "exact_hits": self._exact_hits,
+                "semantic_hits": self._semantic_hits,
+                "exact_hit_rate": self._exact_hits / lookups,
+                "semantic_hit_rate": self._semantic_hits / lookups,
+            }
+
+    # ---------- internal ----------
+    def _remove(self, key):
+        slot, _, _ = self._entries.pop(key)
+        self._vectors[slot] = 0
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+
+    @staticmethod
+    def _unit(vector):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
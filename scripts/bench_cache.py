@@ -0,0 +1,210 @@
+"""
+Benchmark cache danh mục bác sĩ / bệnh viện: không cache, cache memory (LRU + TTL)
+và cache Redis (mặc định: fake server nói giao thức Redis chạy local, cần fakeredis).
+
+    python scripts/bench_cache.py                                  # off / memory / redis (fakeredis)
+    python scripts/bench_cache.py --redis-url redis://localhost:6379/15   # Redis thật (DB test)
+    python scripts/bench_cache.py --requests 5000 --doctors 2000 --hospitals 5000
+
+fakeredis là dependency dev: pip install -r requirements-dev.txt
+
+Các router doctors + hospitals chạy trong process (httpx + ASGITransport). Với mỗi
+backend: bắn --requests request GET ngẫu nhiên vào các endpoint danh mục, đếm số query
+SQL, tỉ lệ hit và thông lượng; sau đó sửa + xoá bác sĩ, tạo bệnh viện qua API và kiểm
+tra các endpoint đọc thấy dữ liệu mới ngay (invalidation khi ghi).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def seed(n_doctors, n_hospitals, rng):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        admin = models.User(email="admin@example.com", username="bench_admin", role=2, hashed_password="-")
+        db.add(admin)
+        db.flush()
+        db.add_all(
+            models.Hospital(name=f"Bệnh viện {i}", address="Không rõ địa chỉ", city=f"Tỉnh {i % 34}",
+                            phone="", email="", specialties=rng.choice(["Nội", "Ngoại", "Nhi", "Sản"]),
+                            latitude=10 + rng.random(), longitude=106 + rng.random())
+            for i in range(n_hospitals)
+        )
+        for i in range(n_doctors):
+            user = models.User(email=f"d{i}@example.com", username=f"bench_d{i}", role=1, hashed_password="-")
+            db.add(user)
+            db.flush()
+            db.add(models.Doctor(full_name=f"Bác sĩ {i}", email=f"d{i}@example.com", specialty=rng.choice(["Nội", "Ngoại", "Nhi", "Sản"]),
+                                 user_id=user.id, hospital_id=rng.randint(1, n_hospitals)))
+        db.commit()
+        return admin.username
+    finally:
+        db.close()
+
+
+def random_request(rng, n_doctors):
+    """Phân bố request giống dashboard: phần lớn là vài trang danh sách phổ biến."""
+    roll = rng.random()
+    if roll < 0.3:
+        return "/api/doctors/", {"skip": rng.choice([0, 0, 0, 100]), "limit": 100}
+    if roll < 0.45:
+        return "/api/doctors/", {"specialty": rng.choice(["Nội", "Ngoại", "Nhi", "Sản"])}
+    if roll < 0.65:
+        return f"/api/doctors/{rng.randint(1, min(n_doctors, 200))}", {}
+    if roll < 0.75:
+        return "/api/doctors/count-all", {}
+    if roll < 0.85:
+        return "/api/hospitals/count", {}
+    return "/api/hospitals/", {"limit": 200, "fields": "id,name,latitude,longitude"}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def listener(self, *args):
+        self.count += 1
+
+
+def count_queries():
+    counter = QueryCounter()
+    for e in (engine, async_engine.sync_engine):
+        event.listen(e, "before_cursor_execute", counter.listener)
+    return counter
+
+
+async def run_backend(name, backend, args, token, victim_id):
+    import httpx
+    from fastapi import FastAPI
+
+    from app.routers import doctors, hospitals
+
+    catalog_cache.backend = backend
+    app = FastAPI()
+    app.include_router(doctors.router)
+    app.include_router(hospitals.router)
+
+    rng = random.Random(args.seed)
+    plan = [random_request(rng, args.doctors) for _ in range(args.requests)]
+    statuses = Counter()
+    queries = count_queries()
+    hits_before, misses_before = cache_counter("hit"), cache_counter("miss")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def get(path, params):
+            async with semaphore:
+                resp = await client.get(path, params=params)
+                statuses[resp.status_code] += 1
+
+        queries.count = 0
+        started = time.perf_counter()
+        await asyncio.gather(*(get(path, params) for path, params in plan))
+        elapsed = time.perf_counter() - started
+        read_queries = queries.count
+
+        # Ghi qua API → đọc lại phải thấy dữ liệu mới
+        headers = {"Authorization": f"Bearer {token}"}
+        before = (await client.get("/api/doctors/count-all")).json()["total_doctors"]
+        hospitals_before = (await client.get("/api/hospitals/count")).json()["total_hospitals"]
+        new_name = f"Bác sĩ {name} đã sửa"
+        await client.put("/api/doctors/1", headers=headers, json={
+            "full_name": new_name, "specialty": "Nội", "email": "d0@example.com",
+        })
+        await client.delete(f"/api/doctors/{victim_id}", headers=headers)
+        await client.post("/api/hospitals/", json={"name": f"Bệnh viện mới {name}", "city": "Tỉnh 0"})
+        after = (await client.get("/api/doctors/count-all")).json()["total_doctors"]
+        hospitals_after = (await client.get("/api/hospitals/count")).json()["total_hospitals"]
+        detail = (await client.get("/api/doctors/1")).json()
+
+    fresh = after == before - 1 and hospitals_after == hospitals_before + 1 and detail["full_name"] == new_name
+    for e in (engine, async_engine.sync_engine):
+        event.remove(e, "before_cursor_execute", queries.listener)
+
+    hits = int(cache_counter("hit") - hits_before)
+    misses = int(cache_counter("miss") - misses_before)
+    print(f"{name:>7}: {args.requests} request trong {elapsed:.2f}s → {args.requests / elapsed:.0f} req/s, "
+          f"{read_queries} query SQL, hit {hits} / miss {misses}, status {dict(statuses)}, "
+          f"{'✅ đọc thấy dữ liệu mới sau khi ghi' if fresh else '❌ dữ liệu cũ sau khi ghi'}")
+    return fresh
+
+
+def cache_counter(result):
+    from app.services.metrics import metrics
+
+    return sum(
+        value for key, value in metrics.snapshot()["counters"].items()
+        if key.startswith("response_cache_requests_total{") and f"result={result}" in key
+    )
+
+
+def start_fake_redis():
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"redis://{host}:{port}/0"
+
+
+async def main(args):
+    from app.auth import create_access_token
+    from app.services.cache import MemoryBackend, RedisBackend
+
+    username = seed(args.doctors, args.hospitals, random.Random(args.seed))
+    token = create_access_token({"sub": username})
+
+    fake_server = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        fake_server, redis_url = start_fake_redis()
+
+    ok = True
+    backends = (("off", None), ("memory", MemoryBackend()), ("redis", RedisBackend(redis_url)))
+    for i, (name, backend) in enumerate(backends):
+        ok &= await run_backend(name, backend, args, token, victim_id=args.doctors - i)
+        if isinstance(backend, RedisBackend):
+            await backend.client.aclose()
+
+    await async_engine.dispose()
+    if fake_server is not None:
+        fake_server.shutdown()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=1000)
+    parser.add_argument("--hospitals", type=int, default=2000)
+    parser.add_argument("--redis-url", help="mặc định: fake Redis server local (fakeredis)")
+    parser.add_argument("--database-url", help="mặc định: SQLite file tạm")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir.name}/bench_cache.db"
+    os.environ.setdefault("SESSION_SECRET", "bench-cache")
+
+    from sqlalchemy import event
+
+    from app import models
+    from app.database import Base, SessionLocal, async_engine, engine
+    from app.services.cache import catalog_cache
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
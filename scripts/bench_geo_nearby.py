@@ -0,0 +1,97 @@
+"""
+Benchmark /nearby: GeoIndex (lưới ô vuông) so với quét toàn bộ bảng + haversine.
+
+    python scripts/bench_geo_nearby.py                      # 10k và 100k bệnh viện
+    python scripts/bench_geo_nearby.py --sizes 100000 --queries 500 --radius 10
+
+Điểm ngẫu nhiên trong bounding box Việt Nam, dày hơn quanh Hà Nội / TPHCM giống
+dữ liệu OSM thật. Kiểm tra 2 cách trả về cùng kết quả trước khi in thời gian.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.geo_index import GeoIndex, haversine_km
+
+VN_BBOX = (8.5, 23.4, 102.1, 109.5)  # lat_min, lat_max, lon_min, lon_max
+CITY_CENTERS = [(21.0278, 105.8342), (10.7769, 106.7009), (16.0544, 108.2022)]
+
+
+def random_point(rng):
+    if rng.random() < 0.5:
+        lat, lon = rng.choice(CITY_CENTERS)
+        return lat + rng.gauss(0, 0.15), lon + rng.gauss(0, 0.15)
+    lat_min, lat_max, lon_min, lon_max = VN_BBOX
+    return rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(1, n + 1):
+        lat, lon = random_point(rng)
+        rows.append((i, lat, lon, {"id": i, "name": f"Bệnh viện {i}", "latitude": lat, "longitude": lon}))
+    return rows
+
+
+def naive_nearby(rows, lat, lon, radius_km, limit):
+    results = []
+    for _, h_lat, h_lon, payload in rows:
+        distance = haversine_km(lat, lon, h_lat, h_lon)
+        if distance <= radius_km:
+            results.append((distance, payload))
+    results.sort(key=lambda r: r[0])
+    return results[:limit]
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        started = time.perf_counter()
+        fn(*q)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(n, n_queries, radius, limit, seed):
+    rng = random.Random(seed)
+    rows = make_rows(n, rng)
+    queries = [(*random_point(rng), radius, limit) for _ in range(n_queries)]
+
+    index = GeoIndex()
+    started = time.perf_counter()
+    index.rebuild(rows)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    for q in queries[:50]:
+        expected = [p["id"] for _, p in naive_nearby(rows, *q)]
+        got = [p["id"] for _, p in index.nearby(*q)]
+        assert got == expected, f"kết quả khác nhau tại {q}"
+
+    naive_mean, naive_p95 = timed(lambda *q: naive_nearby(rows, *q), queries)
+    index_mean, index_p95 = timed(index.nearby, queries)
+
+    print(f"\n{n:,} bệnh viện — {n_queries} truy vấn, bán kính {radius} km, limit {limit}")
+    print(f"  build index: {build_ms:.1f} ms ({index.stats()['cells']} ô)")
+    print(f"  {'':<12} {'mean (ms)':>10} {'p95 (ms)':>10}")
+    print(f"  {'full scan':<12} {naive_mean:>10.3f} {naive_p95:>10.3f}")
+    print(f"  {'geo index':<12} {index_mean:>10.3f} {index_p95:>10.3f}")
+    print(f"  speedup: x{naive_mean / index_mean:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=5.0)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.queries, args.radius, args.limit, args.seed)
@@ -0,0 +1,132 @@
+"""
+Benchmark serialize JSON trên các payload lớn nhất: đường cũ (jsonable_encoder + json stdlib
+qua JSONResponse) so với FastJSONResponse (orjson, model Pydantic serialize bằng pydantic-core).
+
+    python scripts/bench_json.py                               # 5000 bệnh viện, 2000 bác sĩ, ~550 triệu chứng
+    python scripts/bench_json.py --hospitals 20000 --requests 50
+
+Payload:
+- hospitals: GET /api/hospitals/ đủ cột (dict theo dòng, có datetime / float)
+- doctors:   GET /api/doctors/ (list schemas.Doctor)
+- symptoms:  GET /api/predict-disease/all (app/AI/symptom_list.json)
+
+In 2 mức: chỉ bước encode (ms / lần) và cả request qua 1 app FastAPI trong process
+(route cũ trả dict / model để FastAPI tự encode với response_class=JSONResponse, route mới
+trả thẳng FastJSONResponse). Kiểm tra 2 đường cho ra cùng dữ liệu JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import schemas
+from app.responses import FastJSONResponse, dumps
+
+SYMPTOM_PATH = Path(__file__).resolve().parent.parent / "app" / "AI" / "symptom_list.json"
+
+
+def make_payloads(n_hospitals, n_doctors, rng):
+    created = datetime(2025, 1, 1)
+    hospitals = [
+        {"id": i, "name": f"Bệnh viện Đa khoa {i}", "address": f"{i} Đường Lê Lợi, Phường Bến Thành",
+         "city": f"Tỉnh {i % 34}", "phone": "028 3829 1234", "email": f"bv{i}@example.com",
+         "specialties": "Nội, Ngoại, Nhi, Sản", "description": "Bệnh viện tuyến tỉnh, khám chữa bệnh đa khoa.",
+         "created_at": created + timedelta(minutes=i), "latitude": 10 + rng.random(), "longitude": 106 + rng.random()}
+        for i in range(1, n_hospitals + 1)
+    ]
+    doctors = [
+        schemas.Doctor(id=i, full_name=f"Bác sĩ Nguyễn Văn {i}", specialty=rng.choice(["Tim mạch", "Nhi khoa", "Da liễu"]),
+                       email=f"doctor{i}@example.com", phone="0901234567", hospital_id=rng.randint(1, n_hospitals),
+                       bio="Hơn 10 năm kinh nghiệm khám và điều trị.", years_experience=rng.randint(1, 30),
+                       education="Đại học Y Dược TP.HCM", created_at=created + timedelta(hours=i))
+        for i in range(1, n_doctors + 1)
+    ]
+    symptoms = {"related": sorted(json.loads(SYMPTOM_PATH.read_text(encoding="utf-8")))}
+    return {"hospitals": hospitals, "doctors": doctors, "symptoms": symptoms}
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def bench_encode(payloads, repeat):
+    print(f"{'encode':<10} {'cũ (ms)':>10} {'orjson (ms)':>12} {'nhanh hơn':>10} {'KB':>8}")
+    for name, content in payloads.items():
+        legacy = JSONResponse(jsonable_encoder(content)).body
+        fast = dumps(content)
+        assert json.loads(legacy) == json.loads(fast), f"{name}: JSON khác nhau"
+
+        legacy_ms = timed(lambda: JSONResponse(jsonable_encoder(content)).body, repeat)
+        fast_ms = timed(lambda: dumps(content), repeat)
+        print(f"{name:<10} {legacy_ms:>10.2f} {fast_ms:>12.2f} {legacy_ms / fast_ms:>9.1f}x {len(fast) / 1024:>8.0f}")
+
+
+def build_app(payloads):
+    app = FastAPI()
+
+    @app.get("/legacy/hospitals", response_class=JSONResponse)
+    def legacy_hospitals():
+        return payloads["hospitals"]
+
+    @app.get("/legacy/doctors", response_model=List[schemas.Doctor], response_class=JSONResponse)
+    def legacy_doctors():
+        return payloads["doctors"]
+
+    @app.get("/legacy/symptoms", response_class=JSONResponse)
+    def legacy_symptoms():
+        return payloads["symptoms"]
+
+    @app.get("/fast/{name}")
+    def fast(name: str):
+        return FastJSONResponse(payloads[name])
+
+    return app
+
+
+async def bench_requests(payloads, n_requests):
+    import httpx
+
+    app = build_app(payloads)
+    print(f"\n{'request':<10} {'cũ (ms)':>10} {'orjson (ms)':>12} {'nhanh hơn':>10}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name in payloads:
+            results = {}
+            for path in (f"/legacy/{name}", f"/fast/{name}"):
+                resp = await client.get(path)  # warm-up
+                results[path] = resp.json()
+                started = time.perf_counter()
+                for _ in range(n_requests):
+                    await client.get(path)
+                results[path + ":ms"] = (time.perf_counter() - started) / n_requests * 1000
+            same = results[f"/legacy/{name}"] == results[f"/fast/{name}"]
+            legacy_ms, fast_ms = results[f"/legacy/{name}:ms"], results[f"/fast/{name}:ms"]
+            print(f"{name:<10} {legacy_ms:>10.2f} {fast_ms:>12.2f} {legacy_ms / fast_ms:>9.1f}x"
+                  f"{'' if same else '   ❌ JSON khác nhau'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hospitals", type=int, default=5000)
+    parser.add_argument("--doctors", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20, help="số lần encode mỗi payload")
+    parser.add_argument("--requests", type=int, default=20, help="số request mỗi route")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.hospitals, args.doctors, random.Random(args.seed))
+    bench_encode(payloads, args.repeat)
+    asyncio.run(bench_requests(payloads, args.requests))
@@ -0,0 +1,155 @@
+"""
+Benchmark ghi dữ liệu OSM vào bảng hospitals: cách cũ (1 SELECT / element rồi add_all)
+so với upsert_province_hospitals (prefetch + INSERT/UPDATE theo lô).
+
+    python scripts/bench_osm_upsert.py                                   # fixture sinh ngẫu nhiên
+    python scripts/bench_osm_upsert.py --fixture overpass_hcm.json       # JSON Overpass đã ghi lại
+    python scripts/bench_osm_upsert.py --database-url postgresql://...   # DB Postgres test (bảng sẽ bị xoá!)
+
+Mỗi lần chạy: DB có sẵn --existing phần trăm bệnh viện của fixture (một số đã đổi
+toạ độ), sau đó ghi toàn bộ fixture bằng từng cách trên một DB được dựng lại y hệt.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROVINCE = "TPHCM"
+
+
+def make_fixture(n, rng):
+    """JSON cùng định dạng response Overpass `out center;`."""
+    elements = []
+    for i in range(n):
+        el = {
+            "type": rng.choice(["node", "way"]),
+            "id": 10_000_000 + i,
+            "tags": {
+                "amenity": "hospital",
+                "name": f"Bệnh viện {i}",
+                "addr:street": f"{i} Nguyễn Trãi",
+                "phone": f"028 {rng.randint(1000000, 9999999)}",
+            },
+        }
+        lat, lon = 10.7769 + rng.gauss(0, 0.1), 106.7009 + rng.gauss(0, 0.1)
+        if el["type"] == "node":
+            el["lat"], el["lon"] = lat, lon
+        else:
+            el["center"] = {"lat": lat, "lon": lon}
+        elements.append(el)
+    return {"elements": elements}
+
+
+def legacy_ingest(db, province, elements):
+    """Logic cũ trong sync_one_province: 1 query kiểm tra trùng cho mỗi element."""
+    hospitals_to_add = []
+    for el in elements:
+        row = parse_element(el, province)
+        if row is None:
+            continue
+        exists = db.query(models.Hospital).filter(
+            models.Hospital.name == row["name"],
+            models.Hospital.city == province
+        ).first()
+        if exists:
+            continue
+        hospitals_to_add.append(models.Hospital(**row))
+
+    if hospitals_to_add:
+        db.add_all(hospitals_to_add)
+        db.commit()
+    return {"added": len(hospitals_to_add)}
+
+
+def seed(existing_ratio, elements, rng):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    rows = [parse_element(el, PROVINCE) for el in elements]
+    rows = [r for r in rows if r is not None]
+    seeded = rng.sample(rows, int(len(rows) * existing_ratio))
+    for row in seeded:
+        row = dict(row)
+        if rng.random() < 0.1:
+            row["latitude"] += 0.001  # toạ độ cũ → upsert phải cập nhật
+        db.add(models.Hospital(**row))
+    db.commit()
+    db.close()
+
+
+def measure(fn, elements, existing_ratio, seed_value):
+    seed(existing_ratio, elements, random.Random(seed_value))
+
+    queries = [0]
+
+    def on_execute(*args):
+        queries[0] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        result = fn(db, PROVINCE, elements)
+    finally:
+        elapsed = time.perf_counter() - started
+        db.close()
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+    total = db_count()
+    return elapsed, queries[0], result, total
+
+
+def db_count():
+    db = SessionLocal()
+    try:
+        return db.query(models.Hospital).count()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="file JSON Overpass đã ghi lại (mặc định: sinh ngẫu nhiên)")
+    parser.add_argument("--elements", type=int, default=2000, help="số element khi sinh fixture")
+    parser.add_argument("--existing", type=float, default=0.5, help="tỉ lệ bệnh viện đã có sẵn trong DB")
+    parser.add_argument("--database-url", help="mặc định: SQLite file tạm")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir.name}/bench_osm.db"
+
+    from sqlalchemy import event
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.services.hospital_ingest import parse_element, upsert_province_hospitals
+
+    if args.fixture:
+        data = json.loads(Path(args.fixture).read_text(encoding="utf-8"))
+    else:
+        data = make_fixture(args.elements, random.Random(args.seed))
+    elements = data.get("elements", [])
+
+    print(f"{len(elements)} element, {args.existing:.0%} đã có trong DB ({engine.url.get_backend_name()})\n")
+    print(f"{'cách ghi':<10} {'thời gian (ms)':>15} {'số query':>10} {'số dòng sau':>12}  kết quả")
+    print("-" * 80)
+
+    timings = {}
+    for label, fn in (("cũ", legacy_ingest), ("upsert", upsert_province_hospitals)):
+        elapsed, n_queries, result, total = measure(fn, elements, args.existing, args.seed)
+        timings[label] = elapsed
+        print(f"{label:<10} {elapsed * 1000:>15.1f} {n_queries:>10} {total:>12}  {result}")
+
+    print(f"\nspeedup: x{timings['cũ'] / timings['upsert']:.1f}")
+
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    tmp_dir.cleanup()
@@ -0,0 +1,174 @@
+"""
+Load test cho /api/chatbot với 1 LLM server giả lập (OpenAI-compatible) chạy local.
+
+    python scripts/loadtest_chatbot.py --requests 50 --llm-delay 1.0 [--skip-rag] [--stream]
+
+In ra tổng thời gian của N request đồng thời so với N x độ trễ LLM, và độ trễ
+/health trong lúc các request chatbot đang chờ LLM (event loop không bị chặn).
+Với --stream, gọi /api/chatbot/stream và đo thêm time-to-first-token.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+# ----------------------------
+# Stub LLM server
+# ----------------------------
+def make_stub_llm(delay: float):
+    stub = FastAPI()
+
+    reply = "Đây là câu trả lời giả lập."
+
+    async def stream_chunks(model):
+        # Token đầu tiên sau `delay`, các token sau đến nhanh
+        await asyncio.sleep(delay)
+        for word in reply.split():
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(0.01)
+        yield "data: [DONE]\n\n"
+
+    @stub.post("/v1/chat/completions")
+    async def completions(body: dict):
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(body.get("model", "stub")), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    return stub
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ----------------------------
+# Load test
+# ----------------------------
+async def run(args):
+    port = free_port()
+    start_server(make_stub_llm(args.llm_delay), port)
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    if not args.cache:
+        os.environ["CHATBOT_CACHE_SIZE"] = "0"
+
+    from app.routers import chatbot
+
+    if args.skip_rag:
+        import numpy as np
+        rng = np.random.default_rng(0)
+        chatbot.embed_query = lambda query: rng.standard_normal(384)
+        chatbot.query_context = lambda query_vec: "Bệnh: Cảm cúm\nTriệu chứng: sốt, đau đầu"
+
+    app = FastAPI()
+    app.include_router(chatbot.router)
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as c:
+        # Warm-up: load embedding model + Chroma trước khi đo
+        await c.post("/api/chatbot", json={"message": "đau đầu sốt thì sao"})
+
+        health_latencies = []
+        done = asyncio.Event()
+
+        async def probe_health():
+            while not done.is_set():
+                t = time.perf_counter()
+                await c.get("/health")
+                health_latencies.append(time.perf_counter() - t)
+                await asyncio.sleep(0.05)
+
+        ttfts = []
+
+        async def one_chat(i):
+            payload = {"message": f"đau đầu sốt thì sao ({i})"}
+            if not args.stream:
+                r = await c.post("/api/chatbot", json=payload)
+                r.raise_for_status()
+                return
+
+            t = time.perf_counter()
+            async with c.stream("POST", "/api/chatbot/stream", json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if t is not None and line == "event: token":
+                        ttfts.append(time.perf_counter() - t)
+                        t = None
+
+        prober = asyncio.create_task(probe_health())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_chat(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - t0
+        done.set()
+        await prober
+
+    serial = args.requests * args.llm_delay
+    print(f"requests            : {args.requests}")
+    print(f"LLM delay           : {args.llm_delay:.2f}s")
+    print(f"total (concurrent)  : {elapsed:.2f}s")
+    print(f"total (serial est.) : {serial:.2f}s")
+    print(f"speedup             : {serial / elapsed:.1f}x")
+    if ttfts:
+        print(f"TTFT p50 / max      : {statistics.median(ttfts) * 1000:.1f}ms / {max(ttfts) * 1000:.1f}ms")
+    if health_latencies:
+        print(f"/health p50 / max   : {statistics.median(health_latencies) * 1000:.1f}ms"
+              f" / {max(health_latencies) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    parser.add_argument("--stream", action="store_true", help="dùng endpoint SSE /api/chatbot/stream")
+    parser.add_argument("--cache", action="store_true", help="bật semantic cache (mặc định tắt khi đo)")
+    parser.add_argument("--skip-rag", action="store_true", help="bỏ qua embedding/Chroma, chỉ đo phần LLM")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,180 @@
+"""
+Stress test đặt lịch đồng thời: nhiều bệnh nhân cùng đặt 1 slot của 1 bác sĩ.
+
+    python scripts/stress_booking.py                                   # SQLite file tạm, 300 request
+    python scripts/stress_booking.py --requests 500 --slots 20         # 500 request chia đều cho 20 slot
+    python scripts/stress_booking.py --database-url postgresql://...   # DB Postgres test (bảng sẽ bị xoá!)
+
+Router appointments chạy trong process (httpx + ASGITransport, không cần uvicorn),
+mọi request được bắn cùng lúc. Kiểm tra mỗi slot có đúng 1 request thành công
+(các request còn lại nhận 400 "Bác sĩ đang bận vào thời gian này") và DB chỉ có
+đúng 1 lịch hẹn chưa huỷ mỗi slot; in thông lượng và phân bố độ trễ.
+
+Sau đó kiểm tra bác sĩ xác nhận lại 1 lịch đã huỷ mà slot đã có người khác đặt:
+phải nhận 400 (không phải 500) và slot vẫn chỉ có 1 lịch hẹn chưa huỷ.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def seed(n_patients):
+    """1 bác sĩ + n bệnh nhân, ghi thẳng vào DB (bỏ qua hash mật khẩu cho nhanh)."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        doctor_user = models.User(email="doctor@stress.local", username="stress_doctor", role=1, hashed_password="-")
+        db.add(doctor_user)
+        db.flush()
+        doctor = models.Doctor(full_name="Bác sĩ Stress", specialty="Nội", user_id=doctor_user.id)
+        db.add(doctor)
+
+        usernames = []
+        for i in range(n_patients):
+            user = models.User(email=f"p{i}@stress.local", username=f"stress_p{i}", role=0, hashed_password="-")
+            db.add(user)
+            db.flush()
+            db.add(models.Patient(user_id=user.id, full_name=f"Bệnh nhân {i}"))
+            usernames.append(user.username)
+        db.commit()
+        return doctor.id, usernames
+    finally:
+        db.close()
+
+
+async def check_reconfirm(client, doctor_id, day, slot, doctor_token, patient_token):
+    """Huỷ lịch đang giữ `slot`, bệnh nhân khác đặt lại slot, rồi thử xác nhận lại lịch cũ → phải 400."""
+    db = SessionLocal()
+    try:
+        old_id = db.query(models.Appointment.id).filter(
+            models.Appointment.doctor_id == doctor_id,
+            models.Appointment.appointment_date == day,
+            models.Appointment.status != "cancelled",
+        ).order_by(models.Appointment.appointment_time).first()[0]
+    finally:
+        db.close()
+
+    doctor = {"Authorization": f"Bearer {doctor_token}"}
+    cancel = await client.put(f"/api/appointments/{old_id}/status", params={"status": "cancelled"}, headers=doctor)
+    rebook = await client.post(
+        "/api/appointments/",
+        json={"doctor_id": doctor_id, "appointment_date": day.isoformat(), "appointment_time": slot},
+        headers={"Authorization": f"Bearer {patient_token}"},
+    )
+    reconfirm = await client.put(f"/api/appointments/{old_id}/status", params={"status": "confirmed"}, headers=doctor)
+
+    ok = (cancel.status_code, rebook.status_code, reconfirm.status_code) == (200, 200, 400)
+    print(f"{'✅' if ok else '❌'} Xác nhận lại lịch đã huỷ sau khi slot bị đặt lại: huỷ {cancel.status_code}, "
+          f"đặt lại {rebook.status_code}, xác nhận lại {reconfirm.status_code} {reconfirm.text[:120]}")
+    return ok
+
+
+async def run(args):
+    import httpx
+    from fastapi import FastAPI
+
+    from app.auth import create_access_token
+    from app.routers import appointments
+
+    doctor_id, usernames = seed(args.requests)
+    tokens = [create_access_token({"sub": u}) for u in usernames]
+
+    app = FastAPI()
+    app.include_router(appointments.router, prefix="/api/appointments")
+
+    day = date.today() + timedelta(days=1)
+    slots = [f"{8 + i // 2:02d}:{30 * (i % 2):02d}" for i in range(args.slots)]
+
+    latencies = []
+    statuses = Counter()
+    winners = Counter()
+    losers = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                                 base_url="http://stress") as client:
+        # làm nóng: resolve principal + pool kết nối, không tính vào kết quả
+        await client.get("/api/appointments/me", headers={"Authorization": f"Bearer {tokens[0]}"})
+
+        start_gate = asyncio.Event()
+
+        async def book(i):
+            slot = slots[i % len(slots)]
+            await start_gate.wait()
+            started = time.perf_counter()
+            resp = await client.post(
+                "/api/appointments/",
+                json={"doctor_id": doctor_id, "appointment_date": day.isoformat(), "appointment_time": slot},
+                headers={"Authorization": f"Bearer {tokens[i]}"},
+            )
+            latencies.append(time.perf_counter() - started)
+            statuses[resp.status_code] += 1
+            if resp.status_code == 200:
+                winners[slot] += 1
+            elif slot == slots[0]:
+                losers.append(i)
+            if resp.status_code not in (200, 400):
+                print(f"⚠️ {resp.status_code}: {resp.text[:200]}")
+
+        tasks = [asyncio.create_task(book(i)) for i in range(args.requests)]
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        reconfirm_ok = bool(losers) and await check_reconfirm(
+            client, doctor_id, day, slots[0], create_access_token({"sub": "stress_doctor"}), tokens[losers[0]])
+    await async_engine.dispose()
+
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Appointment.appointment_time).filter(
+            models.Appointment.doctor_id == doctor_id,
+            models.Appointment.appointment_date == day,
+            models.Appointment.status != "cancelled",
+        ).all()
+    finally:
+        db.close()
+    stored = Counter(t.strftime("%H:%M") for (t,) in rows)
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{args.requests} request / {len(slots)} slot trong {elapsed:.2f}s "
+          f"→ {args.requests / elapsed:.0f} req/s (p50 {p(0.5):.1f} ms, p95 {p(0.95):.1f} ms, p99 {p(0.99):.1f} ms)")
+    print(f"HTTP status: {dict(statuses)}")
+
+    ok = all(winners[s] == 1 and stored[s] == 1 for s in slots) and sum(stored.values()) == len(slots)
+    if ok:
+        print(f"✅ Mỗi slot đúng 1 người đặt thành công, DB có {sum(stored.values())} lịch hẹn")
+    else:
+        print(f"❌ Sai: thành công theo slot {dict(winners)}, DB theo slot {dict(stored)}")
+    return ok and reconfirm_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="số request đặt lịch bắn cùng lúc")
+    parser.add_argument("--slots", type=int, default=1, help="số slot khác nhau (request chia đều)")
+    parser.add_argument("--database-url", help="mặc định: SQLite file tạm")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir.name}/stress_booking.db"
+    os.environ.setdefault("SESSION_SECRET", "stress-booking")
+    # đủ kết nối cho mọi request đang chờ ghi, tránh đo nhầm thời gian chờ pool
+    os.environ.setdefault("DB_MAX_OVERFLOW", str(args.requests))
+
+    from app import models
+    from app.database import Base, SessionLocal, async_engine, engine
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
@@ -0,0 +1,181 @@
+"""
+Stub Overpass server local để chạy thử engine đồng bộ OSM không cần internet.
+
+    python scripts/stub_overpass.py                          # 3 mirror, đồng bộ 34 tỉnh vào SQLite tạm
+    python scripts/stub_overpass.py --mirrors 3 --fail-rate 0.5,0,0 --latency 0.2,0.05,0.5
+    python scripts/stub_overpass.py --serve                  # chỉ chạy stub, in OVERPASS_URLS để trỏ app vào
+
+Mỗi mirror trả về dữ liệu cố định theo biến thể tên tỉnh, có thể cấu hình độ trễ,
+tỉ lệ lỗi 5xx và giới hạn request/giây (vượt quá → 429) để kiểm tra rate limit,
+circuit breaker và chọn mirror theo độ trễ. Hỗ trợ filter newer: — với --repeat 2,
+lần đồng bộ thứ 2 (incremental) gần như không tải dữ liệu.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+VARIANT_RE = re.compile(r'"addr:city"~"(.+?)"')
+NEWER_RE = re.compile(r'\(newer:"(.+?)"\)')
+# Mọi element giả lập được sửa lần cuối tại mốc này
+ELEMENT_TIMESTAMP = "2024-01-01T00:00:00Z"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fake_elements(variant: str, per_variant: int):
+    seed = int(hashlib.md5(variant.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    lat0, lon0 = rng.uniform(9, 22), rng.uniform(103, 109)
+    return [
+        {
+            "type": "node",
+            "id": seed * 1000 + i,
+            "lat": lat0 + rng.gauss(0, 0.05),
+            "lon": lon0 + rng.gauss(0, 0.05),
+            "version": 1,
+            "timestamp": ELEMENT_TIMESTAMP,
+            "tags": {"amenity": "hospital", "name": f"Bệnh viện {variant} {i}", "phone": f"0{rng.randint(10**8, 10**9)}"},
+        }
+        for i in range(per_variant)
+    ]
+
+
+def make_stub(name, latency, fail_rate, max_rps, per_variant, hits: Counter):
+    stub = FastAPI()
+    recent = deque()
+
+    @stub.post("/api/interpreter")
+    async def interpreter(data: str = Form(...)):
+        now = time.monotonic()
+        while recent and now - recent[0] > 1:
+            recent.popleft()
+        recent.append(now)
+        if max_rps and len(recent) > max_rps:
+            hits[(name, 429)] += 1
+            return JSONResponse(status_code=429, content={"error": "rate limited"})
+
+        await asyncio.sleep(latency)
+        if random.random() < fail_rate:
+            hits[(name, 504)] += 1
+            return JSONResponse(status_code=504, content={"error": "gateway timeout"})
+
+        match = VARIANT_RE.search(data)
+        elements = fake_elements(match.group(1) if match else "?", per_variant)
+        newer = NEWER_RE.search(data)
+        if newer:
+            elements = [el for el in elements if el["timestamp"] > newer.group(1)]
+
+        body = {
+            "osm3s": {"timestamp_osm_base": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+            "elements": elements,
+        }
+        response = JSONResponse(body)
+        hits[(name, 200)] += 1
+        hits[(name, "bytes")] += len(response.body)
+        return response
+
+    return stub
+
+
+def start_server(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def per_mirror(value: str, n: int, cast=float):
+    values = [cast(v) for v in value.split(",")]
+    return (values * n)[:n] if len(values) < n else values[:n]
+
+
+async def run_sync(concurrency, repeat, full, hits: Counter):
+    from app.database import Base, SessionLocal, engine
+    from app import models
+    from app.services.osm_provinces import provinces, provinces_variants
+    from app.services.overpass_client import mirrors, sync_provinces
+
+    Base.metadata.create_all(bind=engine)
+
+    for run in range(1, repeat + 1):
+        bytes_before = sum(v for (_, kind), v in hits.items() if kind == "bytes")
+        started = time.perf_counter()
+        results = await sync_provinces(provinces, provinces_variants, concurrency=concurrency, incremental=not full)
+        elapsed = time.perf_counter() - started
+        transferred = sum(v for (_, kind), v in hits.items() if kind == "bytes") - bytes_before
+
+        db = SessionLocal()
+        total = db.query(models.Hospital).count()
+        db.close()
+
+        print(f"\nLần {run}: đồng bộ {len(results)} tỉnh trong {elapsed:.2f}s — "
+              f"tải {transferred / 1024:.1f} KB, +{sum(r['added'] for r in results)} / "
+              f"cập nhật {sum(r['updated'] for r in results)}, {total} bệnh viện trong DB, "
+              f"{sum(1 for r in results if r.get('errors'))} tỉnh có lỗi")
+
+    for m in mirrors:
+        print(f"  {m.url}: {m.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mirrors", type=int, default=3)
+    parser.add_argument("--latency", default="0.05", help="độ trễ (giây) mỗi mirror, phân tách bằng dấu phẩy")
+    parser.add_argument("--fail-rate", default="0", help="tỉ lệ trả 504 mỗi mirror")
+    parser.add_argument("--max-rps", default="0", help="số request/giây tối đa mỗi mirror (0 = không giới hạn)")
+    parser.add_argument("--per-variant", type=int, default=20, help="số bệnh viện mỗi biến thể tên tỉnh")
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=1, help="số lần đồng bộ liên tiếp (lần sau dùng checkpoint)")
+    parser.add_argument("--full", action="store_true", help="bỏ qua checkpoint, lần nào cũng tải toàn bộ")
+    parser.add_argument("--database-url", help="mặc định: SQLite file tạm")
+    parser.add_argument("--serve", action="store_true", help="chỉ chạy stub server")
+    args = parser.parse_args()
+
+    hits = Counter()
+    latencies = per_mirror(args.latency, args.mirrors)
+    fail_rates = per_mirror(args.fail_rate, args.mirrors)
+    max_rps = per_mirror(args.max_rps, args.mirrors, int)
+
+    urls = []
+    for i in range(args.mirrors):
+        port = free_port()
+        start_server(make_stub(f"mirror{i}", latencies[i], fail_rates[i], max_rps[i], args.per_variant, hits), port)
+        urls.append(f"http://127.0.0.1:{port}/api/interpreter")
+    os.environ["OVERPASS_URLS"] = ",".join(urls)
+    print("OVERPASS_URLS=" + os.environ["OVERPASS_URLS"])
+
+    if args.serve:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir.name}/stub_overpass.db"
+    asyncio.run(run_sync(args.concurrency, args.repeat, args.full, hits))
+
+    print("\nRequest tới stub:")
+    for (name, status), count in sorted(hits.items(), key=str):
+        print(f"  {name} {status}: {count}")
@@ -0,0 +1,196 @@
+"""
+SMTP stub local (aiosmtpd) để chạy thử outbox email không cần Gmail.
+
+    python scripts/stub_smtp.py                              # 500 email qua worker outbox vào SQLite tạm
+    python scripts/stub_smtp.py --legacy                     # so sánh: fast_mail, mỗi email 1 kết nối SMTP
+    python scripts/stub_smtp.py --fail-rate 0.2              # 20% email bị 451 → thử lại với backoff
+    python scripts/stub_smtp.py --handshake 0.3 --legacy     # giả lập chi phí TLS + AUTH của SMTP thật
+    python scripts/stub_smtp.py --serve                      # chỉ chạy stub, in env MAIL_* để trỏ app vào
+    python scripts/stub_smtp.py --reject-auth                # stub từ chối AUTH (535) → email phải còn pending
+
+Stub đếm số kết nối (EHLO) và số email nhận được; có thể cấu hình độ trễ mỗi
+kết nối mới (stub không có TLS / AUTH nên mở kết nối rẻ hơn nhiều so với Gmail),
+độ trễ mỗi email và tỉ lệ trả lỗi tạm thời 451. In thời gian gửi hết outbox, số kết nối
+SMTP đã mở và phân bố số lần thử.
+
+--reject-auth: stub bắt AUTH và luôn trả 535; worker nhận 1 lô và gửi, sau đó kiểm tra mọi email
+vẫn "pending" với attempts = 0 (lỗi đăng nhập là lỗi của cả lô, không tính vào từng email).
+Exit 1 nếu không đúng.
+
+Cần dependency dev: pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class StubHandler:
+    def __init__(self, handshake: float, latency: float, fail_rate: float, hits: Counter):
+        self.handshake = handshake
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.hits = hits
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.hits["connections"] += 1
+        await asyncio.sleep(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.hits["451"] += 1
+            return "451 4.3.0 Temporary failure, try again later"
+        self.hits["delivered"] += 1
+        return "250 Message accepted for delivery"
+
+
+def reject_auth(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=False, handled=False)
+
+
+def start_stub(port, handshake, latency, fail_rate, hits, require_auth=False):
+    auth = {"authenticator": reject_auth, "auth_required": True, "auth_require_tls": False} if require_auth else {}
+    controller = Controller(StubHandler(handshake, latency, fail_rate, hits), hostname="127.0.0.1", port=port, **auth)
+    controller.start()
+    return controller
+
+
+def seed_outbox(n):
+    from app.database import Base, SessionLocal, engine
+    from app.services.email_outbox import enqueue_email
+    from app.services.email_service import render_appointment_email
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for i in range(n):
+            subject, body = render_appointment_email(f"Bệnh nhân {i}", "Bác sĩ Stub", "2026-01-01", "08:00", "confirmed")
+            enqueue_email(db, f"patient{i}@example.com", subject, body)
+        db.commit()
+    finally:
+        db.close()
+
+
+def outbox_counts():
+    from sqlalchemy import func
+
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        by_status = dict(db.query(models.EmailOutbox.status, func.count()).group_by(models.EmailOutbox.status).all())
+        attempts = dict(db.query(models.EmailOutbox.attempts, func.count()).group_by(models.EmailOutbox.attempts).all())
+        return by_status, attempts
+    finally:
+        db.close()
+
+
+async def run_outbox(n):
+    from app.services.email_outbox import email_outbox_worker
+
+    seed_outbox(n)
+    started = time.perf_counter()
+    email_outbox_worker.start()
+    while True:
+        by_status, _ = outbox_counts()
+        if by_status.get("sent", 0) + by_status.get("failed", 0) >= n:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    email_outbox_worker.stop()
+    await asyncio.sleep(0.1)
+    return elapsed
+
+
+async def run_rejected_auth(n):
+    from app.services.email_outbox import claim_batch, email_outbox_worker
+
+    seed_outbox(n)
+    batch = claim_batch(email_outbox_worker.worker_id, n)
+    await email_outbox_worker.deliver(batch)
+
+
+async def run_legacy(n):
+    from app.services.email_service import send_appointment_email
+
+    started = time.perf_counter()
+    for i in range(n):
+        try:
+            await send_appointment_email(f"patient{i}@example.com", f"Bệnh nhân {i}", "Bác sĩ Stub",
+                                         "2026-01-01", "08:00", "confirmed")
+        except Exception as e:
+            print(f"❌ {e!r}")
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--handshake", type=float, default=0.05, help="độ trễ (giây) mỗi kết nối SMTP mới")
+    parser.add_argument("--latency", type=float, default=0.0, help="độ trễ (giây) stub xử lý mỗi email")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="tỉ lệ email bị trả 451")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--legacy", action="store_true", help="gửi trực tiếp bằng fast_mail thay vì outbox")
+    parser.add_argument("--database-url", help="mặc định: SQLite file tạm")
+    parser.add_argument("--serve", action="store_true", help="chỉ chạy stub server")
+    parser.add_argument("--reject-auth", action="store_true", help="stub từ chối AUTH, kiểm tra email còn pending")
+    args = parser.parse_args()
+
+    hits = Counter()
+    controller = start_stub(args.port, args.handshake, args.latency, args.fail_rate, hits, args.reject_auth)
+    mail_env = {"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(args.port), "MAIL_STARTTLS": "0", "USE_CREDENTIALS": "0"}
+    if args.reject_auth:
+        mail_env.update(USE_CREDENTIALS="1", MAIL_USERNAME="stub", MAIL_PASSWORD="wrong-password")
+    os.environ.update(mail_env)
+    print(" ".join(f"{k}={v}" for k, v in mail_env.items()))
+
+    if args.serve:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            controller.stop()
+            sys.exit(0)
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir.name}/stub_smtp.db"
+    os.environ.setdefault("SESSION_SECRET", "stub-smtp")
+    # backoff ngắn để lỗi 451 được thử lại ngay trong lần chạy
+    os.environ.setdefault("EMAIL_RETRY_BASE_SECONDS", "0.05")
+    os.environ.setdefault("EMAIL_RETRY_MAX_SECONDS", "0.5")
+    os.environ.setdefault("EMAIL_OUTBOX_POLL_SECONDS", "0.05")
+
+    if args.reject_auth:
+        asyncio.run(run_rejected_auth(args.emails))
+        by_status, attempts = outbox_counts()
+        ok = by_status == {"pending": args.emails} and attempts == {0: args.emails}
+        print(f"\nAUTH bị từ chối: trạng thái {by_status}, số lần thử {attempts}, "
+              f"stub nhận {hits['delivered']} email → {'✅' if ok else '❌'}")
+        controller.stop()
+        sys.exit(0 if ok else 1)
+    elif args.legacy:
+        elapsed = asyncio.run(run_legacy(args.emails))
+        print(f"\nfast_mail: {args.emails} email trong {elapsed:.2f}s → {args.emails / elapsed:.0f} email/s")
+    else:
+        elapsed = asyncio.run(run_outbox(args.emails))
+        by_status, attempts = outbox_counts()
+        print(f"\nOutbox: {args.emails} email trong {elapsed:.2f}s → {args.emails / elapsed:.0f} email/s")
+        print(f"  trạng thái: {by_status}")
+        print(f"  số lần thử: {dict(sorted(attempts.items()))}")
+
+    print(f"  stub: {hits['connections']} kết nối SMTP, nhận {hits['delivered']} email, trả 451 {hits['451']} lần")
+    controller.stop()